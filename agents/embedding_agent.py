@@ -54,20 +54,24 @@ class EmbeddingAgent(BaseAgent, ReActMixin):
             return "No documents to embed."
 
         embedded_documents = []
-        for i, chunk in enumerate(document_chunks):
-            try:
-                logger.debug(f"正在嵌入文档块 {i+1}/{len(document_chunks)}: {chunk['content'][:50]}...")
-                embedding = self.llm.embed(chunk["content"])
+        try:
+            logger.debug(f"正在批量嵌入 {len(document_chunks)} 个文档块。")
+            batch = await self.llm.aembed_batch([chunk["content"] for chunk in document_chunks])
+        except Exception as e:
+            logger.error(f"批量嵌入文档块失败: {e}")
+            batch = None
+
+        if batch is not None:
+            for i, (chunk, embedding) in enumerate(zip(document_chunks, batch.embeddings)):
+                if embedding is None:
+                    logger.error(f"嵌入文档块 {i+1} 失败: {batch.errors.get(i)}")
+                    continue
                 embedded_documents.append({
                     "id": chunk.get("id"),
                     "content": chunk["content"],
                     "embedding": embedding,
                     "metadata": chunk.get("metadata", {})
                 })
-                logger.debug(f"文档块 {i+1} 嵌入成功。向量维度: {len(embedding)}")
-            except Exception as e:
-                logger.error(f"嵌入文档块 {i+1} 失败: {e}")
-                continue
         
         logger.info(f"成功嵌入 {len(embedded_documents)} 个文档块。准备存储到向量数据库。")
         if embedded_documents:
@@ -1,8 +1,8 @@
 import importlib
-from typing import Dict, Any, Type
-import tomli
+from typing import Type
 
 from agents.base_agent import BaseAgent # 导入BaseAgent，用于类型提示
+from utils.settings import get_settings
 
 class ToolCall:
     """AI代理调用管理类"""
@@ -14,13 +14,8 @@ class ToolCall:
         Args:
             config_path: 配置文件路径
         """
-        self.config = self._load_config(config_path)
-        self.agent_map = self.config.get("agents", {}).get("supported_agents", {})
-
-    def _load_config(self, config_path: str) -> Dict[str, Any]:
-        """加载配置文件"""
-        with open(config_path, "rb") as f:
-            return tomli.load(f)
+        self.config = get_settings(config_path)
+        self.agent_map = self.config.agents.supported_agents
 
     def get_agent_class(self, agent_type: str) -> Type[BaseAgent]:
         """
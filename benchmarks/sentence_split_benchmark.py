@@ -0,0 +1,94 @@
+"""
+句子切分微基准：对比旧的逐结束符 str.find 实现与单遍扫描的 SentenceSplitter。
+
+用法:
+    python benchmarks/sentence_split_benchmark.py [--sizes 1,2,4,8] [--legacy-max-kb 512]
+
+构造只使用一种标点（中文句号）的超长段落，这是旧实现的最坏情况：每切出一个句子，
+其余 5 种结束符的 str.find 都会扫描到文本末尾，总耗时随文本长度近似平方增长；
+SentenceSplitter 的耗时应随文本长度线性增长（每 MB 耗时基本不变）。
+"""
+import os
+import sys
+import time
+import argparse
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rules.sentence_splitter import SentenceSplitter
+
+
+def legacy_split(text: str) -> List[str]:
+    """旧版 TxtSplitRule._split_by_sentences 的实现，仅用于对比"""
+    sentence_endings = ['. ', '。', '！', '？', '! ', '? ']
+    sentences = []
+    current_pos = 0
+
+    while current_pos < len(text):
+        next_pos = len(text)
+        for ending in sentence_endings:
+            pos = text.find(ending, current_pos)
+            if pos != -1 and pos < next_pos:
+                next_pos = pos + len(ending)
+
+        if next_pos > current_pos:
+            sentence = text[current_pos:next_pos].strip()
+            if sentence:
+                sentences.append(sentence)
+
+        current_pos = next_pos
+
+    if current_pos < len(text):
+        remaining = text[current_pos:].strip()
+        if remaining:
+            sentences.append(remaining)
+
+    return sentences
+
+
+def make_paragraph(size_bytes: int) -> str:
+    """构造约 size_bytes 字节（UTF-8）、只含中文句号的单个段落"""
+    sentence = "这是一个用于测试句子切分性能的中文句子。"
+    repeat = max(1, size_bytes // len(sentence.encode("utf-8")))
+    return sentence * repeat
+
+
+def measure(func: Callable[[str], List[str]], text: str, repeat: int = 3) -> float:
+    """返回多次运行中的最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="句子切分微基准")
+    parser.add_argument("--sizes", default="1,2,4,8", help="段落大小（MB），逗号分隔")
+    parser.add_argument("--legacy-max-kb", type=int, default=512,
+                        help="旧实现只在不超过该大小（KB）的段落上运行，避免耗时过长")
+    args = parser.parse_args()
+
+    splitter = SentenceSplitter()
+
+    print("== 旧实现（str.find 逐结束符扫描）==")
+    print(f"{'大小':>10} {'句子数':>10} {'耗时(s)':>10} {'每MB耗时(s)':>12}")
+    size_kb = 64
+    while size_kb <= args.legacy_max_kb:
+        text = make_paragraph(size_kb * 1024)
+        elapsed = measure(legacy_split, text, repeat=1)
+        print(f"{size_kb:>8}KB {len(legacy_split(text)):>10} {elapsed:>10.3f} {elapsed / (size_kb / 1024):>12.3f}")
+        size_kb *= 2
+
+    print("== SentenceSplitter（单遍扫描）==")
+    print(f"{'大小':>10} {'句子数':>10} {'耗时(s)':>10} {'每MB耗时(s)':>12}")
+    for size_mb in (float(size) for size in args.sizes.split(",")):
+        text = make_paragraph(int(size_mb * 1024 * 1024))
+        elapsed = measure(splitter.split, text)
+        print(f"{size_mb:>8g}MB {len(splitter.split(text)):>10} {elapsed:>10.3f} {elapsed / size_mb:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
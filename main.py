@@ -1,5 +1,84 @@
+import logging
+
+# 配置日志
+logging.basicConfig(
+    level=logging.WARNING, # 问答输出到终端，默认只显示警告和错误，可以修改为 logging.INFO 查看各阶段日志
+    format='[%(asctime)s] - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+import sys
+import json
+import asyncio
+import argparse
+from typing import Any, Dict, Optional
+
+from tools.query_engine import QueryEngine
+
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数，不带问题时进入交互模式"""
+    parser = argparse.ArgumentParser(description="基于已入库文档的问答")
+    parser.add_argument("question", nargs="?", help="问题；省略时进入交互模式")
+    parser.add_argument("--config", default="config/config.toml", help="配置文件路径")
+    parser.add_argument("--collection", help="集合名称，默认使用配置中的集合")
+    parser.add_argument("-k", "--n-results", type=int, help="检索的文本块数")
+    parser.add_argument("--mode", choices=["dense", "lexical", "hybrid"], help="检索模式")
+    parser.add_argument("--where", type=json.loads, help="元数据过滤条件（JSON），例如 '{\"file_type\": \"md\"}'")
+    parser.add_argument("--quiet", action="store_true", help="不输出来源和各阶段耗时")
+    return parser.parse_args()
+
+async def answer(engine: QueryEngine, question: str, args: argparse.Namespace) -> None:
+    """
+    流式输出一个问题的回答，随后输出来源和各阶段耗时。
+    Args:
+        engine: 问答引擎。
+        question: 问题。
+        args: 命令行参数。
+    """
+    where: Optional[Dict[str, Any]] = args.where
+    stream = engine.stream(question, collection_name=args.collection, n_results=args.n_results,
+                           mode=args.mode, where=where)
+    async for delta in stream:
+        print(delta, end="", flush=True)
+    print()
+    if args.quiet:
+        return
+    result = stream.result
+    if result.sources:
+        print("\n来源:")
+        for index, source in enumerate(result.sources, start=1):
+            metadata = source.get("metadata") or {}
+            print(f"  [{index}] {metadata.get('relative_path') or metadata.get('file_name') or source['id']}"
+                  f" (score={source['score']:.4f})")
+    print(f"\n耗时: {result.timing_summary()}")
+
+async def interactive(engine: QueryEngine, args: argparse.Namespace) -> None:
+    """交互模式：逐行读取问题，空行或 EOF 退出"""
+    print("请输入问题（空行退出）:")
+    while True:
+        try:
+            question = (await asyncio.to_thread(input, "> ")).strip()
+        except EOFError:
+            break
+        if not question:
+            break
+        try:
+            await answer(engine, question, args)
+        except Exception as e:
+            print(f"回答失败: {e}")
+
 if __name__ == '__main__':
     """
         RAG 入口
     """
-    print("yes")
+    args = parse_args()
+    engine = QueryEngine.from_config(args.config)
+    try:
+        if args.question:
+            asyncio.run(answer(engine, args.question, args))
+        else:
+            asyncio.run(interactive(engine, args))
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -1,8 +1,38 @@
 import os
 import importlib
-from typing import Dict, Any, List, Generator
-import tomli
+from typing import Dict, Any, List, Generator, Optional, Tuple
 from .file_base_reader import FileBaseReader
+from utils.settings import get_settings
+
+def read_with_reader(file_path: str, relative_path: str, reader_spec: Tuple[str, str], encoding: str,
+                     stream: bool = False, block_size: int = FileBaseReader.DEFAULT_BLOCK_SIZE) -> Dict[str, Any]:
+    """
+    使用指定的读取器类读取文件。定义为模块级函数，以便在子进程中调用。
+
+    Args:
+        file_path: 文件路径
+        relative_path: 相对路径，写入元数据
+        reader_spec: (读取器模块名, 读取器类名)
+        encoding: 默认编码
+        stream: 是否流式读取，为 True 时返回文本块迭代器（blocks）而不是完整内容（content）
+        block_size: 流式读取时每块的字符数
+
+    Returns:
+        Dict[str, Any]: 文件内容和元数据
+    """
+    module_name, class_name = reader_spec
+    # 从readers包中导入对应的读取器类
+    module = importlib.import_module(module_name)
+    reader_class = getattr(module, class_name)
+
+    # 创建读取器实例并读取文件
+    reader = reader_class(file_path, encoding=encoding)
+    result = reader.stream(block_size) if stream else reader.read()
+
+    # 添加相对路径信息，以及查询时取上下文用的源文件路径
+    result["metadata"]["relative_path"] = relative_path
+    result["metadata"]["source_path"] = os.path.abspath(file_path)
+    return result
 
 class DirReader:
     """目录文件读取器"""
@@ -14,17 +44,13 @@ class DirReader:
         Args:
             config_path: 配置文件路径
         """
-        self.config = self._load_config(config_path)
-        self.supported_types = self.config["reader"]["supported_types"]
-        self.default_encoding = self.config["reader"]["default_encoding"]
-        self.recursive = self.config["reader"]["recursive"]
-        self.skip_hidden = self.config["reader"]["skip_hidden"]
-        self.max_file_size = self.config["rag"]["document"]["max_file_size"]
-    
-    def _load_config(self, config_path: str) -> Dict[str, Any]:
-        """加载配置文件"""
-        with open(config_path, "rb") as f:
-            return tomli.load(f)
+        self.config = get_settings(config_path)
+        self.supported_types = self.config.reader.supported_types
+        self.default_encoding = self.config.reader.default_encoding
+        self.recursive = self.config.reader.recursive
+        self.skip_hidden = self.config.reader.skip_hidden
+        self.max_file_size = self.config.rag.document.max_file_size
+        self.block_size = self.config.reader.block_size
     
     def _is_hidden(self, path: str) -> bool:
         """判断是否为隐藏文件"""
@@ -52,15 +78,15 @@ class DirReader:
         file_type = os.path.splitext(file_path)[1][1:].lower()
         return file_type in self.supported_types
     
-    def read_directory(self, directory: str) -> Generator[Dict[str, Any], None, None]:
+    def iter_files(self, directory: str) -> Generator[Tuple[str, str], None, None]:
         """
-        读取目录中的所有支持的文件
+        遍历目录中所有需要处理的文件，不读取文件内容
         
         Args:
             directory: 目录路径
             
         Yields:
-            Dict[str, Any]: 文件内容和元数据
+            Tuple[str, str]: (文件路径, 相对于 directory 的路径)
         """
         if not os.path.exists(directory):
             raise FileNotFoundError(f"目录不存在: {directory}")
@@ -76,27 +102,75 @@ class DirReader:
                 # 检查是否应该处理该文件
                 if not self._should_process_file(file_path):
                     continue
-                    
-                # 获取文件类型和对应的读取器类名
-                file_type = os.path.splitext(file_path)[1][1:].lower()
-                reader_class_name = self.supported_types.get(file_type)
-                
-                if reader_class_name:
-                    try:
-                        # 从readers包中导入对应的读取器类
-                        module = importlib.import_module(f"readers.{file_type}_reader")
-                        reader_class = getattr(module, reader_class_name)
-                        
-                        # 创建读取器实例并读取文件
-                        reader = reader_class(file_path, encoding=self.default_encoding)
-                        result = reader.read()
-                        
-                        # 添加相对路径信息
-                        result["metadata"]["relative_path"] = os.path.relpath(file_path, directory)
-                        
-                        yield result
-                    except Exception as e:
-                        print(f"处理文件 {file_path} 时出错: {str(e)}")
+
+                yield file_path, os.path.relpath(file_path, directory)
+
+    def get_reader_spec(self, file_path: str) -> Optional[Tuple[str, str]]:
+        """
+        获取文件对应的读取器模块名和类名
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            Optional[Tuple[str, str]]: (模块名, 类名)，不支持的文件类型返回 None
+        """
+        file_type = os.path.splitext(file_path)[1][1:].lower()
+        reader_class_name = self.supported_types.get(file_type)
+        if not reader_class_name:
+            return None
+        return f"readers.{file_type}_reader", reader_class_name
+
+    def read_file(self, file_path: str, relative_path: str) -> Optional[Dict[str, Any]]:
+        """
+        读取单个文件
+        
+        Args:
+            file_path: 文件路径
+            relative_path: 相对路径，写入元数据
+            
+        Returns:
+            Optional[Dict[str, Any]]: 文件内容和元数据，不支持的文件类型返回 None
+        """
+        reader_spec = self.get_reader_spec(file_path)
+        if not reader_spec:
+            return None
+        return read_with_reader(file_path, relative_path, reader_spec, self.default_encoding)
+
+    def stream_file(self, file_path: str, relative_path: str) -> Optional[Dict[str, Any]]:
+        """
+        流式读取单个文件，内容按块解码，内存占用与文件大小无关
+        
+        Args:
+            file_path: 文件路径
+            relative_path: 相对路径，写入元数据
+            
+        Returns:
+            Optional[Dict[str, Any]]: 文本块迭代器（blocks）和元数据，不支持的文件类型返回 None
+        """
+        reader_spec = self.get_reader_spec(file_path)
+        if not reader_spec:
+            return None
+        return read_with_reader(file_path, relative_path, reader_spec, self.default_encoding,
+                                stream=True, block_size=self.block_size)
+    
+    def read_directory(self, directory: str) -> Generator[Dict[str, Any], None, None]:
+        """
+        读取目录中的所有支持的文件
+        
+        Args:
+            directory: 目录路径
+            
+        Yields:
+            Dict[str, Any]: 文件内容和元数据
+        """
+        for file_path, relative_path in self.iter_files(directory):
+            try:
+                result = self.read_file(file_path, relative_path)
+                if result is not None:
+                    yield result
+            except Exception as e:
+                print(f"处理文件 {file_path} 时出错: {str(e)}")
     
     def read_all(self, directory: str) -> List[Dict[str, Any]]:
         """
@@ -4,6 +4,9 @@ import os
 
 class FileBaseReader(ABC):
     """文件读取基类"""
+
+    # 流式读取时每块的默认字符数
+    DEFAULT_BLOCK_SIZE = 1024 * 1024
     
     def __init__(self, file_path: str):
         """
@@ -26,6 +29,23 @@ class FileBaseReader(ABC):
             Dict[str, Any]: 包含文件内容和元数据的字典
         """
         pass
+
+    def stream(self, block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[str, Any]:
+        """
+        流式读取文件内容。默认实现读取全部内容后作为单个块返回，
+        支持按块解码的读取器应覆盖此方法，使内存占用与文件大小无关。
+        
+        Args:
+            block_size: 每块的字符数
+            
+        Returns:
+            Dict[str, Any]: 包含文本块迭代器（blocks）和元数据的字典
+        """
+        data = self.read()
+        return {
+            "blocks": iter([data["content"]]),
+            "metadata": data["metadata"]
+        }
     
     def get_metadata(self) -> Dict[str, Any]:
         """
@@ -1,78 +1,311 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import io
 import os
+import mmap
+import codecs
+import threading
 from .file_base_reader import FileBaseReader
 
+# 编码检测结果缓存: 绝对路径 -> (文件大小, 修改时间, 编码, 是否有BOM)
+_encoding_cache: Dict[str, Tuple[int, int, str, bool]] = {}
+_encoding_cache_lock = threading.Lock()
+
+# 简繁体中文最常用的字，用于在多个可解码的候选编码之间打分
+_COMMON_HANZI = set(
+    "的一是不了在人有我他这這个個们們中来來上大为為和国國地到以说說时時要就出会會可也你对對生能而子那得"
+    "于於着著下自之年过過发發后後作里裡用道行所然家种種事成方多经經么麼去法学學如都同现現当當没沒动動面"
+    "起看定天分还還进進好小部其些主样樣理心她本前开開但因只从從想实實"
+)
+
+
+def _score_text(text: str) -> float:
+    """
+    按解码结果中汉字和常用字的比例给候选编码打分，错误编码解码出的多为符号、假名或生僻字
+
+    Args:
+        text: 候选编码解码出的文本
+
+    Returns:
+        float: 分数，越高越可能是正确的编码
+    """
+    non_ascii = 0
+    hanzi = 0
+    common = 0
+    for char in text:
+        if char < '\x80':
+            continue
+        non_ascii += 1
+        # CJK 统一汉字、CJK 标点、全角字符
+        if '\u4e00' <= char <= '\u9fff' or '\u3000' <= char <= '\u303f' or '\uff00' <= char <= '\uffef':
+            hanzi += 1
+            if char in _COMMON_HANZI:
+                common += 1
+    if not non_ascii:
+        return 0.0
+    return (hanzi + 2 * common) / non_ascii
+
+
 class TxtReader(FileBaseReader):
     """TXT文件读取器"""
-    
+
+    # 默认编码解码失败时依次尝试的编码
+    FALLBACK_ENCODINGS = ['gbk', 'gb2312', 'gb18030', 'big5']
+    # 检测编码时读取的文件前缀字节数
+    SNIFF_BYTES = 64 * 1024
+
     def __init__(self, file_path: str, encoding: str = 'utf-8'):
         """
         初始化TXT文件读取器
-        
+
         Args:
             file_path: 文件路径
             encoding: 文件编码，默认utf-8
         """
         super().__init__(file_path)
         self.encoding = encoding
-    
-    def read(self) -> Dict[str, Any]:
+
+    def _candidate_encodings(self) -> List[str]:
+        """按尝试顺序返回候选编码"""
+        return [self.encoding] + [enc for enc in self.FALLBACK_ENCODINGS if enc != self.encoding]
+
+    def _sniff(self, prefix: bytes, complete: bool) -> Tuple[Optional[str], bool]:
         """
-        读取TXT文件内容
-        
+        根据文件前缀检测编码：先看BOM，再按候选顺序解码前缀，默认编码失败时按统计得分选择
+
+        Args:
+            prefix: 文件开头的字节
+            complete: prefix 是否就是完整的文件内容
+
         Returns:
-            Dict[str, Any]: 包含文件内容和元数据的字典
+            Tuple[Optional[str], bool]: (编码, 是否有BOM)；前缀为纯 ASCII 且文件更长时编码为 None，需要完整校验
+        """
+        if prefix.startswith(codecs.BOM_UTF8):
+            return 'utf-8', True
+
+        decoded = []
+        for enc in self._candidate_encodings():
+            try:
+                # 前缀末尾可能截断了一个多字节字符，非最终解码时会被保留而不是报错
+                text = codecs.getincrementaldecoder(enc)().decode(prefix, final=complete)
+            except UnicodeDecodeError:
+                continue
+            decoded.append((enc, text))
+
+        if not decoded:
+            raise ValueError(f"无法解码文件: {self.file_path}，请检查文件编码")
+        if not complete and prefix.isascii():
+            # 前缀中没有多字节字符，无法据此判断后面的内容
+            return None, False
+        if decoded[0][0] == self.encoding:
+            return self.encoding, False
+        # 默认编码无法解码，多个候选都能解码时取得分最高的（得分相同时保持候选顺序）
+        best = max(decoded, key=lambda item: _score_text(item[1]))
+        return best[0], False
+
+    def _validate(self, mm: mmap.mmap) -> Tuple[str, bool]:
+        """
+        按候选顺序分块完整校验编码（只在前缀无法判断时使用），不保留解码后的文本
+
+        Args:
+            mm: 文件的内存映射
+
+        Returns:
+            Tuple[str, bool]: (编码, 是否有BOM)
+        """
+        for enc in self._candidate_encodings():
+            decoder = codecs.getincrementaldecoder(enc)()
+            try:
+                for start in range(0, len(mm), self.DEFAULT_BLOCK_SIZE):
+                    decoder.decode(mm[start:start + self.DEFAULT_BLOCK_SIZE])
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                continue
+            return enc, False
+
+        raise ValueError(f"无法解码文件: {self.file_path}，请检查文件编码")
+
+    def _count_lines(self, mm: mmap.mmap, has_bom: bool) -> int:
+        """
+        直接在字节上统计行数，与 read() 统一换行符后的结果一致：\r\n、\r 和 \n 都算一个换行，
+        最后一行没有换行符时也计入
+
+        Args:
+            mm: 文件的内存映射
+            has_bom: 是否有BOM
+
+        Returns:
+            int: 行数
+        """
+        begin = len(codecs.BOM_UTF8) if has_bom else 0
+        if begin >= len(mm):
+            return 0
+        # 候选编码都兼容 ASCII，多字节字符中不会出现 \r、\n 字节，不需要解码
+        newline_count = 0
+        previous = b""
+        for start in range(begin, len(mm), self.DEFAULT_BLOCK_SIZE):
+            block = mm[start:start + self.DEFAULT_BLOCK_SIZE]
+            newline_count += block.count(b"\n") + block.count(b"\r") - block.count(b"\r\n")
+            if previous == b"\r" and block[:1] == b"\n":
+                # 跨块的 \r\n 被计了两次
+                newline_count -= 1
+            previous = block[-1:]
+        return newline_count + (0 if previous in (b"\r", b"\n") else 1)
+
+    def _detect_encoding(self, mm: mmap.mmap) -> Tuple[str, bool]:
         """
+        检测文件编码，结果按路径缓存，文件大小或修改时间变化后失效
+
+        Args:
+            mm: 文件的内存映射
+
+        Returns:
+            Tuple[str, bool]: (编码, 是否有BOM)
+        """
+        path = os.path.abspath(self.file_path)
+        stat = os.stat(path)
+        cached = _encoding_cache.get(path)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2], cached[3]
+
+        prefix = mm[:self.SNIFF_BYTES]
+        encoding, has_bom = self._sniff(prefix, complete=len(prefix) == len(mm))
+        if encoding is None:
+            encoding, has_bom = self._validate(mm)
+        self._remember_encoding(encoding, has_bom)
+        return encoding, has_bom
+
+    def _remember_encoding(self, encoding: str, has_bom: bool) -> None:
+        """缓存文件的编码，以文件大小和修改时间作为校验"""
+        path = os.path.abspath(self.file_path)
+        stat = os.stat(path)
+        with _encoding_cache_lock:
+            _encoding_cache[path] = (stat.st_size, stat.st_mtime_ns, encoding, has_bom)
+
+    def _forget_encoding(self) -> None:
+        """解码失败时删除缓存的编码"""
+        with _encoding_cache_lock:
+            _encoding_cache.pop(os.path.abspath(self.file_path), None)
+
+    def _open_mmap(self) -> mmap.mmap:
         if not self.validate():
             raise ValueError(f"无效的文件: {self.file_path}")
-        
+        with open(self.file_path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _build_metadata(self, encoding: str, has_bom: bool, line_count: int) -> Dict[str, Any]:
+        metadata = self.get_metadata()
+        # 添加TXT特有的元数据
+        metadata.update({
+            "line_count": line_count,
+            "encoding": encoding,
+            "has_bom": has_bom
+        })
+        return metadata
+
+    @staticmethod
+    def _decode(mm: mmap.mmap, encoding: str, has_bom: bool) -> str:
+        """直接从内存映射解码全部内容；如果文件有BOM标记，通过 memoryview 偏移跳过它，不复制内容"""
+        with memoryview(mm) as view:
+            body = view[len(codecs.BOM_UTF8) if has_bom else 0:]
+            try:
+                return str(body, encoding)
+            finally:
+                body.release()
+
+    def read(self) -> Dict[str, Any]:
+        """
+        读取TXT文件内容：检测编码后直接从内存映射一次解码
+
+        Returns:
+            Dict[str, Any]: 包含文件内容和元数据的字典
+        """
+        mm = self._open_mmap()
         try:
-            with open(self.file_path, 'r', encoding=self.encoding) as f:
-                content = f.read()
-            
-            # 获取文件元数据
-            metadata = self.get_metadata()
-            
-            # 添加TXT特有的元数据
-            metadata.update({
-                "line_count": len(content.splitlines()),
-                "encoding": self.encoding,
-                "has_bom": content.startswith('\ufeff')  # 检查是否有BOM标记
-            })
-            
-            # 如果文件有BOM标记，移除它
-            if metadata["has_bom"]:
-                content = content[1:]
-            
-            return {
-                "content": content,
-                "metadata": metadata
-            }
-            
-        except UnicodeDecodeError:
-            # 如果UTF-8解码失败，尝试其他编码
-            encodings = ['gbk', 'gb2312', 'gb18030', 'big5']
-            for enc in encodings:
+            encoding, has_bom = self._detect_encoding(mm)
+            try:
+                content = self._decode(mm, encoding, has_bom)
+            except UnicodeDecodeError:
+                # 前缀检测的结果对文件后部不成立，退回到按候选顺序完整校验
+                encoding, has_bom = self._validate(mm)
+                self._remember_encoding(encoding, has_bom)
+                content = self._decode(mm, encoding, has_bom)
+            has_cr = mm.find(b"\r") != -1
+        finally:
+            mm.close()
+
+        if has_cr:
+            # 与文本模式读取一致，统一换行符
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        line_count = content.count('\n') + (1 if content and not content.endswith('\n') else 0)
+
+        return {
+            "content": content,
+            "metadata": self._build_metadata(encoding, has_bom, line_count)
+        }
+
+    def _iter_blocks(self, mm: mmap.mmap, encoding: str, has_bom: bool, block_size: int,
+                     metadata: Dict[str, Any]) -> Iterator[str]:
+        """
+        按块解码内存映射，解码本身就是对编码的校验
+
+        前缀检测的结果对文件后部不成立时，与 read() 一致，按候选顺序完整校验出编码并缓存；
+        还没有返回任何文本块时换用该编码从头解码（同时更新 metadata），否则抛出异常，下次读取时直接使用该编码。
+        """
+        try:
+            restarted = False
+            while True:
+                # 与文本模式读取一致，统一换行符；跨块的 \r\n 由 IncrementalNewlineDecoder 处理
+                decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+                start = len(codecs.BOM_UTF8) if has_bom else 0
+                yielded = False
                 try:
-                    with open(self.file_path, 'r', encoding=enc) as f:
-                        content = f.read()
-                    
-                    # 更新元数据
-                    metadata = self.get_metadata()
-                    metadata.update({
-                        "line_count": len(content.splitlines()),
-                        "encoding": enc,
-                        "has_bom": content.startswith('\ufeff')
-                    })
-                    
-                    if metadata["has_bom"]:
-                        content = content[1:]
-                    
-                    return {
-                        "content": content,
-                        "metadata": metadata
-                    }
-                except UnicodeDecodeError:
+                    while start < len(mm):
+                        block = decoder.decode(mm[start:start + block_size])
+                        start += block_size
+                        if block:
+                            yielded = True
+                            yield block
+                    tail = decoder.decode(b"", final=True)
+                except UnicodeDecodeError as e:
+                    if restarted:
+                        self._forget_encoding()
+                        raise ValueError(f"文件 {self.file_path} 在偏移 {start} 附近无法按 {encoding} 解码") from e
+                    failed_encoding = encoding
+                    encoding, has_bom = self._validate(mm)
+                    self._remember_encoding(encoding, has_bom)
+                    if yielded:
+                        raise ValueError(f"文件 {self.file_path} 在偏移 {start} 附近无法按 {failed_encoding} 解码，"
+                                         f"已有部分内容按该编码返回，下次读取时将使用 {encoding}") from e
+                    metadata.update({"encoding": encoding, "has_bom": has_bom})
+                    restarted = True
                     continue
-            
-            raise ValueError(f"无法解码文件: {self.file_path}，请检查文件编码") 
\ No newline at end of file
+                if tail:
+                    yield tail
+                return
+        finally:
+            mm.close()
+
+    def stream(self, block_size: int = FileBaseReader.DEFAULT_BLOCK_SIZE) -> Dict[str, Any]:
+        """
+        流式读取TXT文件：检测编码后从内存映射中按块解码，行数直接在字节上统计，全文只解码一遍
+
+        Args:
+            block_size: 每块的字节数（解码后的字符数不超过该值）
+
+        Returns:
+            Dict[str, Any]: 包含文本块迭代器（blocks）和元数据的字典
+        """
+        mm = self._open_mmap()
+        try:
+            # 前缀无法判断编码时 _detect_encoding 已完整校验过；否则在解码文本块时校验
+            encoding, has_bom = self._detect_encoding(mm)
+            line_count = self._count_lines(mm, has_bom)
+        except BaseException:
+            mm.close()
+            raise
+
+        metadata = self._build_metadata(encoding, has_bom, line_count)
+        return {
+            "blocks": self._iter_blocks(mm, encoding, has_bom, block_size, metadata),
+            "metadata": metadata
+        }
@@ -0,0 +1,68 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+
+class Chunk(Mapping):
+    """以位置表示的文本块。
+
+    只保存文本块在原文中的位置 (source_id, start, end) 和对原文缓冲区的引用，文本在访问 text 时才切片生成，
+    切分过程中不再为段落、句子和拼接结果复制文本。start/end 是在整个文件解码后（换行符已统一）文本中的字符位置，
+    流式切分时缓冲区只是文件的一段，base 为其第一个字符在文件中的位置。
+
+    兼容原来字典形式的文本块，可以用 chunk["content"]、chunk["type"]、chunk["metadata"] 访问。
+    """
+
+    __slots__ = ("source_id", "start", "end", "type", "metadata", "_buffer", "_base")
+
+    _KEYS = ("content", "type", "metadata")
+
+    def __init__(self, buffer: str, base: int, start: int, end: int, file_type: str,
+                 metadata: Dict[str, Any], source_id: Optional[str] = None):
+        """
+        Args:
+            buffer: 包含该文本块的原文缓冲区
+            base: 缓冲区第一个字符在原文中的位置
+            start: 文本块在原文中的起始位置
+            end: 文本块在原文中的结束位置（不含）
+            file_type: 文件类型
+            metadata: 文本块元数据
+            source_id: 原文标识，例如文件的相对路径
+        """
+        self._buffer = buffer
+        self._base = base
+        self.start = start
+        self.end = end
+        self.type = file_type
+        self.metadata = metadata
+        self.source_id = source_id
+
+    @property
+    def text(self) -> str:
+        """文本块内容，每次访问时从缓冲区切片生成"""
+        return self._buffer[self.start - self._base:self.end - self._base]
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "content":
+            return self.text
+        if key == "type":
+            return self.type
+        if key == "metadata":
+            return self.metadata
+        raise KeyError(key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典形式的文本块（会生成文本）"""
+        return {"content": self.text, "type": self.type, "metadata": self.metadata}
+
+    def __reduce__(self):
+        # 序列化（例如从切分子进程返回）时只带上本块的文本，不带整个缓冲区
+        return (Chunk, (self.text, self.start, self.start, self.end, self.type, self.metadata, self.source_id))
+
+    def __repr__(self) -> str:
+        return f"Chunk(source_id={self.source_id!r}, start={self.start}, end={self.end}, type={self.type!r})"
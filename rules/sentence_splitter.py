@@ -0,0 +1,128 @@
+import re
+from typing import Iterator, List, Optional, Tuple
+
+# 句末标点：中文句号/叹号/问号、英文句点/叹号/问号以及省略号，连续出现时视为同一个结束符
+SENTENCE_TERMINATORS = "。！？!?.…"
+# 跟在句末标点之后、仍属于本句的右引号和右括号
+SENTENCE_CLOSERS = "\"'”’」』）》】)]"
+# 中文标点和省略号本身即可结束句子；只由英文标点组成的结束符后面必须是空白
+_CJK_TERMINATORS = frozenset("。！？…")
+
+
+def trim_span(text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+    """
+    去掉 text[start:end] 首尾的空白，只移动位置而不复制文本
+
+    Args:
+        text: 文本内容
+        start: 起始位置
+        end: 结束位置
+
+    Returns:
+        Optional[Tuple[int, int]]: 去掉空白后的 (起始位置, 结束位置)，全是空白时返回 None
+    """
+    while start < end and text[start].isspace():
+        start += 1
+    if start == end:
+        return None
+    while text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+class SentenceSplitter:
+    """单遍扫描的句子切分引擎。
+
+    用一个预编译的正则在文本上只扫描一次，找出所有句末标点串（含紧随的右引号/括号），
+    耗时与文本长度成线性关系，不会因为某种标点缺失而反复扫描到文本末尾。
+
+    规则：
+        - 中文的 。！？ 和省略号 … 直接结束句子，例如 "他说：“好。”" 在右引号之后结束
+        - 英文的 . ! ? 和 ... 只有后面跟空白时才结束句子，因此 "3.14"、"e.g.x" 不会被切开
+        - 切分出的句子去掉首尾空白，空句子被丢弃
+    """
+
+    _END_PATTERN = re.compile(
+        f"[{re.escape(SENTENCE_TERMINATORS)}]+[{re.escape(SENTENCE_CLOSERS)}]*"
+    )
+
+    def _is_boundary(self, text: str, match: "re.Match", end: int) -> bool:
+        """判断一个句末标点串是否真正结束句子，end 为扫描范围的结束位置"""
+        if not _CJK_TERMINATORS.isdisjoint(match.group()):
+            return True
+        position = match.end()
+        return position == end or text[position].isspace()
+
+    def iter_boundaries(self, text: str, start: int = 0, end: Optional[int] = None) -> Iterator[int]:
+        """
+        逐个产出句子结束的位置（句末标点串之后）
+
+        Args:
+            text: 文本内容
+            start: 扫描范围的起始位置
+            end: 扫描范围的结束位置，默认到文本末尾；范围之外的字符视为不存在
+
+        Yields:
+            int: 结束位置
+        """
+        if end is None:
+            end = len(text)
+        for match in self._END_PATTERN.finditer(text, start, end):
+            if self._is_boundary(text, match, end):
+                yield match.end()
+
+    def iter_spans(self, text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        """
+        逐个产出去掉首尾空白后的句子在文本中的位置
+
+        Args:
+            text: 文本内容
+            start: 切分范围的起始位置
+            end: 切分范围的结束位置，默认到文本末尾
+
+        Yields:
+            Tuple[int, int]: (起始位置, 结束位置)
+        """
+        if end is None:
+            end = len(text)
+        for boundary in self.iter_boundaries(text, start, end):
+            span = trim_span(text, start, boundary)
+            if span:
+                yield span
+            start = boundary
+        # 如果还有剩余文本，作为最后一个句子
+        span = trim_span(text, start, end)
+        if span:
+            yield span
+
+    def split(self, text: str) -> List[str]:
+        """
+        按句子切分文本
+
+        Args:
+            text: 文本内容
+
+        Returns:
+            List[str]: 去掉首尾空白的句子列表
+        """
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    def last_boundary(self, text: str, start: int = 0) -> int:
+        """
+        返回文本中最后一个不会因后续文本而改变的句子结束位置，没有时返回 0
+
+        流式切分时，位于文本末尾的句末标点串可能与下一块开头的标点或右引号连在一起，
+        英文标点是否结束句子也取决于下一个字符，因此只接受结束位置之后还有字符的边界。
+
+        Args:
+            text: 当前缓冲的文本
+            start: 从该位置开始查找
+
+        Returns:
+            int: 位置
+        """
+        last = 0
+        for end in self.iter_boundaries(text, start):
+            if end < len(text):
+                last = end
+        return last
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
 
 class SplitRule(ABC):
     """文本切分规则基类"""
@@ -30,4 +30,18 @@ class SplitRule(ABC):
         Returns:
             List[Dict[str, Any]]: 分割后的文本块列表，每个块包含内容和元数据
         """
-        pass 
\ No newline at end of file
+        pass
+
+    def iter_process(self, blocks: Iterable[str], file_type: str) -> Iterator[Dict[str, Any]]:
+        """
+        流式处理按块读取的内容，逐个产出文本块。默认实现先拼接全部内容再调用 process，
+        支持增量切分的规则应覆盖此方法，使内存占用与文件大小无关。
+        
+        Args:
+            blocks: 按顺序产出的文本块
+            file_type: 文件类型
+            
+        Yields:
+            Dict[str, Any]: 文本块，格式与 process 的返回值相同
+        """
+        yield from self.process("".join(blocks), file_type)
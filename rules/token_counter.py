@@ -0,0 +1,131 @@
+import os
+import re
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+class TokenCounter(ABC):
+    """文本 token 计数器，用于按嵌入模型的 token 预算打包文本块"""
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """
+        统计文本的 token 数
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            int: token 数
+        """
+        pass
+
+
+class HeuristicTokenCounter(TokenCounter):
+    """不依赖分词器的近似计数，只是估算，与嵌入模型的实际分词结果并不一致：
+    连续的汉字/假名/谚文每个字计 1.5（向上取整），英文单词和数字按每 4 个字符计 1，其余符号各计 1。
+
+    WordPiece 分词器每个汉字通常为 1 个 token，字节级 BPE 分词器中不常用的汉字会拆成 2~3 个 token，
+    按 1.5 计使中文文本多数情况下偏高估，用作预算时较为保守；需要准确计数时请配置分词器。
+    """
+
+    _TOKEN_PATTERN = re.compile(
+        r"(?P<cjk>[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+)"  # 汉字、假名、谚文
+        r"|(?P<word>[A-Za-z0-9]+)"
+        r"|[^\sA-Za-z0-9]"
+    )
+
+    def count(self, text: str) -> int:
+        total = 0
+        for match in self._TOKEN_PATTERN.finditer(text):
+            if match.lastgroup == "cjk":
+                total += (len(match.group()) * 3 + 1) // 2
+            elif match.lastgroup == "word":
+                total += (len(match.group()) + 3) // 4
+            else:
+                total += 1
+        return total
+
+
+class HFTokenCounter(TokenCounter):
+    """使用 Hugging Face 分词器计数，与嵌入模型的分词结果一致。分词器在首次使用时加载。"""
+
+    def __init__(self, tokenizer_name: str, trust_remote_code: bool = False):
+        """
+        Args:
+            tokenizer_name: 分词器名称或本地路径，通常与嵌入模型相同
+            trust_remote_code: 是否允许加载模型仓库中的自定义代码
+        """
+        self.tokenizer_name = tokenizer_name
+        self.trust_remote_code = trust_remote_code
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        """延迟加载的分词器"""
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+                    logger.info(f"加载分词器: {self.tokenizer_name}")
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name,
+                                                                    trust_remote_code=self.trust_remote_code)
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def __getstate__(self):
+        # 切分规则在读取/切分子进程启动时发送一次，分词器和锁不随之序列化，在子进程中首次使用时加载
+        return {"tokenizer_name": self.tokenizer_name, "trust_remote_code": self.trust_remote_code}
+
+    def __setstate__(self, state):
+        self.__init__(state["tokenizer_name"], state.get("trust_remote_code", False))
+
+
+def create_token_counter(tokenizer_name: str = "", trust_remote_code: bool = False) -> TokenCounter:
+    """
+    创建 token 计数器
+
+    Args:
+        tokenizer_name: Hugging Face 分词器名称或路径；为空时使用近似计数
+        trust_remote_code: 是否允许加载模型仓库中的自定义代码
+
+    Returns:
+        TokenCounter: token 计数器；未安装 transformers 时退回近似计数
+    """
+    if not tokenizer_name:
+        return HeuristicTokenCounter()
+    try:
+        import transformers  # noqa: F401
+    except ImportError:
+        logger.warning(f"未安装 transformers，无法加载分词器 {tokenizer_name}，使用近似 token 计数")
+        return HeuristicTokenCounter()
+    return HFTokenCounter(tokenizer_name, trust_remote_code=trust_remote_code)
+
+
+def create_token_counter_from_config(config: Any) -> TokenCounter:
+    """
+    按配置创建 token 计数器。[rag.splitter].tokenizer 优先；为空且嵌入后端为 sentence_transformers 时
+    使用本地嵌入模型自带的分词器，与实际嵌入时的分词一致；Ollama 后端无法取得分词器，使用近似计数。
+
+    Args:
+        config: 应用配置（AppSettings）
+
+    Returns:
+        TokenCounter: token 计数器
+    """
+    tokenizer_name = config.rag.splitter.tokenizer
+    embedding_config = config.llm.embedding
+    if tokenizer_name or embedding_config.backend != "sentence_transformers":
+        return create_token_counter(tokenizer_name)
+    local_config = embedding_config.local
+    model_name = local_config.model
+    if "/" not in model_name and not os.path.exists(model_name):
+        # 与 sentence-transformers 一致，不带组织名的模型名称指 sentence-transformers 组织下的模型
+        model_name = f"sentence-transformers/{model_name}"
+    return create_token_counter(model_name, trust_remote_code=local_config.trust_remote_code)
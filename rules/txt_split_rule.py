@@ -1,5 +1,9 @@
-from typing import List, Dict, Any
+import math
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from .split_base_rule import SplitRule
+from .chunk import Chunk
+from .sentence_splitter import SentenceSplitter, trim_span
+from .token_counter import TokenCounter, HeuristicTokenCounter
 
 class TxtSplitRule(SplitRule):
     """TXT文件切分规则"""
@@ -7,7 +11,10 @@ class TxtSplitRule(SplitRule):
     def __init__(self, 
                  max_chunk_size: int = 1000,    # 最大块大小
                  min_chunk_size: int = 200,     # 最小块大小
-                 sentence_threshold: int = 500): # 句子切分阈值
+                 sentence_threshold: int = 500, # 句子切分阈值
+                 max_tokens: Optional[int] = None,
+                 overlap_tokens: int = 0,
+                 token_counter: Optional[TokenCounter] = None):
         """
         初始化TXT文件切分规则
         
@@ -15,10 +22,17 @@ class TxtSplitRule(SplitRule):
             max_chunk_size: 文本块的最大字符数
             min_chunk_size: 文本块的最小字符数
             sentence_threshold: 触发句子切分的阈值
+            max_tokens: 文本块的 token 预算；设置后启用打包模式，相邻的段落和句子会合并到预算以内
+            overlap_tokens: 打包模式下相邻文本块之间重叠的 token 数（按整句重叠）
+            token_counter: 打包模式使用的 token 计数器，默认使用近似计数
         """
         self.max_chunk_size = max_chunk_size
         self.min_chunk_size = min_chunk_size
         self.sentence_threshold = sentence_threshold
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.token_counter = token_counter or HeuristicTokenCounter()
+        self.sentence_splitter = SentenceSplitter()
     
     def can_handle(self, content: str, file_type: str) -> bool:
         """
@@ -57,36 +71,99 @@ class TxtSplitRule(SplitRule):
         Returns:
             List[str]: 句子列表
         """
-        # 定义句子结束符
-        sentence_endings = ['. ', '。', '！', '？', '! ', '? ']
-        sentences = []
-        current_pos = 0
+        return self.sentence_splitter.split(text)
+    
+    def _new_builder(self, file_type: str) -> "_ChunkBuilder":
+        """按是否启用打包模式创建文本块构造器"""
+        if self.max_tokens:
+            return _TokenPacker(file_type, self.max_tokens, self.overlap_tokens, self.min_chunk_size,
+                                self.token_counter, self.sentence_splitter)
+        return _ChunkBuilder(file_type, self.max_chunk_size, self.sentence_splitter)
+    
+    def _finish_paragraph(self, start: int, end: int, builder: "_ChunkBuilder", in_long_paragraph: bool) -> Iterator[Chunk]:
+        """
+        处理一个完整段落（或长段落的最后一部分）
         
-        while current_pos < len(text):
-            # 查找最近的句子结束符
-            next_pos = len(text)
-            for ending in sentence_endings:
-                pos = text.find(ending, current_pos)
-                if pos != -1 and pos < next_pos:
-                    next_pos = pos + len(ending)
+        Args:
+            start: 段落在原文中的起始位置
+            end: 段落在原文中的结束位置
+            builder: 文本块构造器，其缓冲区包含该段落
+            in_long_paragraph: 该段落的前半部分是否已按句子切分输出
             
-            # 提取当前句子
-            if next_pos > current_pos:
-                sentence = text[current_pos:next_pos].strip()
-                if sentence:
-                    sentences.append(sentence)
+        Yields:
+            Chunk: 文本块
+        """
+        if in_long_paragraph:
+            yield from builder.add_sentences(builder.sentence_spans(start, end))
+            yield from builder.end_sentences()
+            return
+        
+        span = trim_span(builder.buffer, start - builder.base, end - builder.base)
+        if not span:
+            return
+        start, end = builder.base + span[0], builder.base + span[1]
+        # 如果段落长度超过阈值，按句子分割；否则直接作为一个块
+        if end - start > self.sentence_threshold:
+            yield from builder.add_sentences(builder.sentence_spans(start, end))
+            yield from builder.end_sentences()
+        else:
+            yield from builder.paragraph(start, end)
+    
+    def iter_process(self, blocks: Iterable[str], file_type: str) -> Iterator[Chunk]:
+        """
+        流式处理按块读取的TXT内容，切分结果与 process 相同
+        
+        段落和句子只以在原文中的位置表示，文本块引用缓冲区而不复制文本。缓冲区只保留尚未结束的段落
+        和尚未输出的文本块；段落超过句子切分阈值后，已结束的句子会立即归入文本块，
+        因此内存占用取决于文本块和单个句子的长度，而不是文件大小。
+        
+        Args:
+            blocks: 按顺序产出的文本块
+            file_type: 文件类型
             
-            current_pos = next_pos
+        Yields:
+            Chunk: 文本块，位置是在整个文件文本中的字符位置
+        """
+        builder = self._new_builder(file_type)
+        buffer = ""
+        base = 0                # buffer[0] 在原文中的位置
+        para_start = 0          # 未结束段落（剩余部分）的起始位置
+        scan_from = 0           # 查找段落分隔符的起始位置
+        in_long_paragraph = False
         
-        # 如果还有剩余文本，添加到最后一个句子
-        if current_pos < len(text):
-            remaining = text[current_pos:].strip()
-            if remaining:
-                sentences.append(remaining)
+        for block in blocks:
+            # 丢弃已处理、且不再被未输出文本块引用的文本；只有一个块时缓冲区就是原文本身
+            keep = builder.retain_from(para_start)
+            buffer = buffer[keep - base:] + block
+            base = keep
+            builder.set_buffer(buffer, base)
+            
+            # 1. 输出缓冲区中所有以空行结束的段落
+            while True:
+                index = buffer.find('\n\n', scan_from - base)
+                if index == -1:
+                    break
+                end = base + index
+                yield from self._finish_paragraph(para_start, end, builder, in_long_paragraph)
+                in_long_paragraph = False
+                para_start = scan_from = end + 2
+            # 分隔符可能跨块，下一块从当前最后一个字符开始查找
+            scan_from = max(para_start, base + len(buffer) - 1)
+            
+            # 2. 未结束的段落已超过阈值时，先输出其中已结束的句子
+            if not in_long_paragraph:
+                span = trim_span(buffer, para_start - base, len(buffer))
+                in_long_paragraph = bool(span) and span[1] - span[0] > self.sentence_threshold
+            if in_long_paragraph:
+                cut = self.sentence_splitter.last_boundary(buffer, para_start - base)
+                if cut:
+                    yield from builder.add_sentences(builder.sentence_spans(para_start, base + cut))
+                    para_start = base + cut
         
-        return sentences
+        yield from self._finish_paragraph(para_start, base + len(buffer), builder, in_long_paragraph)
+        yield from builder.finish()
     
-    def process(self, content: str, file_type: str) -> List[Dict[str, Any]]:
+    def process(self, content: str, file_type: str) -> List[Chunk]:
         """
         处理TXT文件内容，实现动态切分策略
         
@@ -95,62 +172,219 @@ class TxtSplitRule(SplitRule):
             file_type: 文件类型
             
         Returns:
-            List[Dict[str, Any]]: 分割后的文本块列表
+            List[Chunk]: 分割后的文本块列表，均引用 content 而不复制文本
         """
-        chunks = []
-        chunk_index = 0
-        
-        # 1. 首先按段落分割
-        paragraphs = self._split_by_paragraphs(content)
+        return list(self.iter_process([content], file_type))
+
+
+# 文本位置: (起始位置, 结束位置)
+Span = Tuple[int, int]
+
+
+class _ChunkBuilder:
+    """按顺序编号文本块，并将句子累积成不超过最大长度的文本块。
+
+    句子和段落都以在原文中的位置传入，生成的文本块引用当前缓冲区。
+    """
+    
+    def __init__(self, file_type: str, max_chunk_size: int, sentence_splitter: SentenceSplitter):
+        self.file_type = file_type
+        self.max_chunk_size = max_chunk_size
+        self.sentence_splitter = sentence_splitter
+        self.chunk_index = 0
+        self.buffer = ""
+        self.base = 0
+        self.current_chunk: List[Span] = []
+    
+    def set_buffer(self, buffer: str, base: int) -> None:
+        """更新缓冲区；base 为缓冲区第一个字符在原文中的位置"""
+        self.buffer = buffer
+        self.base = base
+    
+    def text(self, start: int, end: int) -> str:
+        return self.buffer[start - self.base:end - self.base]
+    
+    def sentence_spans(self, start: int, end: int) -> Iterator[Span]:
+        """按句子切分原文中的一段，产出各句子在原文中的位置"""
+        base = self.base
+        for sentence_start, sentence_end in self.sentence_splitter.iter_spans(self.buffer, start - base, end - base):
+            yield base + sentence_start, base + sentence_end
+    
+    def retain_from(self, position: int) -> int:
+        """缓冲区需要保留的起始位置：position 与尚未输出的文本块中较早的一个"""
+        if self.current_chunk:
+            return min(position, self.current_chunk[0][0])
+        return position
+    
+    def _make_chunk(self, start: int, end: int, metadata: Dict[str, Any]) -> Chunk:
+        metadata = {"chunk_index": self.chunk_index, **metadata, "start_offset": start, "end_offset": end}
+        self.chunk_index += 1
+        return Chunk(self.buffer, self.base, start, end, self.file_type, metadata)
+    
+    def paragraph(self, start: int, end: int) -> Iterator[Chunk]:
+        """整个段落作为一个块"""
+        yield self._make_chunk(start, end, {"split_type": "paragraph"})
+    
+    def _sentence_chunk(self) -> Chunk:
+        chunk = self._make_chunk(self.current_chunk[0][0], self.current_chunk[-1][1], {
+            "split_type": "sentence",
+            "sentence_count": len(self.current_chunk)
+        })
+        self.current_chunk = []
+        return chunk
+    
+    def add_sentences(self, sentences: Iterable[Span]) -> Iterator[Chunk]:
+        """累积句子，产出已达到最大长度的块（长度包含句子之间的原有空白）"""
+        for start, end in sentences:
+            # 如果当前块加上新句子超过最大长度，且当前块不为空，则保存当前块
+            if self.current_chunk and end - self.current_chunk[0][0] > self.max_chunk_size:
+                yield self._sentence_chunk()
+            self.current_chunk.append((start, end))
+    
+    def end_sentences(self) -> Iterator[Chunk]:
+        """段落结束，保存最后一个块"""
+        if self.current_chunk:
+            yield self._sentence_chunk()
+    
+    def finish(self) -> Iterator[Chunk]:
+        """全部内容处理完毕"""
+        return iter(())
+
+
+# 打包单元: (起始位置, 结束位置, token 数, 是否为段落开头)
+Unit = Tuple[int, int, int, bool]
+
+
+class _TokenPacker(_ChunkBuilder):
+    """打包模式：把相邻的段落和句子贪心地合并到 token 预算以内。
+
+    不超过预算的段落作为一个整体参与合并，超过预算的段落拆成句子，超过预算的单个句子再按长度硬切。
+    短于最小长度的文本块会并入前一个文本块（合并后不超过预算时）。
+    文本块是原文中从第一个单元到最后一个单元的连续片段，段落之间保留原有的空行。
+    """
+    
+    PARAGRAPH_SEPARATOR = "\n\n"
+    
+    def __init__(self, file_type: str, max_tokens: int, overlap_tokens: int, min_chunk_size: int,
+                 counter: TokenCounter, sentence_splitter: SentenceSplitter):
+        super().__init__(file_type, 0, sentence_splitter)
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.min_chunk_size = min_chunk_size
+        self.counter = counter
+        self.separator_tokens = counter.count(self.PARAGRAPH_SEPARATOR) or 1
+        # 当前文本块的单元，开头 overlap_count 个单元是上一块的重叠部分
+        self.units: List[Unit] = []
+        self.overlap_count = 0
+        # 暂缓输出的上一个文本块，以便把过短的文本块并入其中
+        self.held: Optional[List[Unit]] = None
+        self.new_paragraph = False
+        self.in_paragraph = False
+    
+    def retain_from(self, position: int) -> int:
+        for units in (self.held, self.units):
+            if units:
+                position = min(position, units[0][0])
+        return position
+    
+    def _cost(self, units: List[Unit]) -> int:
+        """文本块的 token 数：各单元之和，加上段落之间的分隔符"""
+        return sum(tokens + (self.separator_tokens if para_start and i else 0)
+                   for i, (_, _, tokens, para_start) in enumerate(units))
+    
+    def _hard_split(self, start: int, end: int, tokens: int) -> Iterator[Tuple[int, int, int]]:
+        """按长度比例切开超过预算的单个句子，剩余部分的 token 数按已切出部分递减估算"""
+        remaining_tokens = tokens
+        while start < end:
+            if remaining_tokens <= self.max_tokens:
+                remaining_tokens = self.counter.count(self.text(start, end))
+                if remaining_tokens <= self.max_tokens:
+                    yield start, end, remaining_tokens
+                    return
+            size = max(1, (end - start) * self.max_tokens // remaining_tokens)
+            piece_tokens = self.counter.count(self.text(start, start + size))
+            while piece_tokens > self.max_tokens and size > 1:
+                size = max(1, math.floor(size * 0.9))
+                piece_tokens = self.counter.count(self.text(start, start + size))
+            yield start, start + size, piece_tokens
+            start += size
+            remaining_tokens = max(1, remaining_tokens - piece_tokens)
+    
+    def _add(self, start: int, end: int, tokens: int) -> Iterator[Chunk]:
+        """加入一个单元，当前文本块放不下时先输出"""
+        if tokens > self.max_tokens:
+            for piece_start, piece_end, piece_tokens in self._hard_split(start, end, tokens):
+                yield from self._add(piece_start, piece_end, piece_tokens)
+            return
         
-        for para in paragraphs:
-            # 2. 如果段落长度超过阈值，按句子分割
-            if len(para) > self.sentence_threshold:
-                sentences = self._split_by_sentences(para)
-                current_chunk = []
-                current_length = 0
-                
-                for sentence in sentences:
-                    # 如果当前块加上新句子超过最大长度，且当前块不为空，则保存当前块
-                    if current_length + len(sentence) > self.max_chunk_size and current_chunk:
-                        chunks.append({
-                            "content": "".join(current_chunk),
-                            "type": file_type,
-                            "metadata": {
-                                "chunk_index": chunk_index,
-                                "split_type": "sentence",
-                                "sentence_count": len(current_chunk)
-                            }
-                        })
-                        chunk_index += 1
-                        current_chunk = []
-                        current_length = 0
-                    
-                    current_chunk.append(sentence)
-                    current_length += len(sentence)
-                
-                # 保存最后一个块
-                if current_chunk:
-                    chunks.append({
-                        "content": "".join(current_chunk),
-                        "type": file_type,
-                        "metadata": {
-                            "chunk_index": chunk_index,
-                            "split_type": "sentence",
-                            "sentence_count": len(current_chunk)
-                        }
-                    })
-                    chunk_index += 1
-            else:
-                # 3. 如果段落长度在合理范围内，直接作为一个块
-                chunks.append({
-                    "content": para,
-                    "type": file_type,
-                    "metadata": {
-                        "chunk_index": chunk_index,
-                        "split_type": "paragraph"
-                    }
-                })
-                chunk_index += 1
+        unit = (start, end, tokens, self.new_paragraph)
+        self.new_paragraph = False
+        if self.units and self._cost(self.units + [unit]) > self.max_tokens:
+            yield from self._close(tokens)
+            if self.units and self._cost(self.units + [unit]) > self.max_tokens:
+                self.units, self.overlap_count = [], 0
+        self.units.append(unit)
+    
+    def _close(self, next_tokens: int) -> Iterator[Chunk]:
+        """结束当前文本块，并保留末尾若干整句作为下一块的重叠部分"""
+        units = self.units
+        yield from self._emit(units[self.overlap_count:], units)
         
-        return chunks 
\ No newline at end of file
+        overlap: List[Unit] = []
+        total = 0
+        if self.overlap_tokens:
+            for unit in reversed(units[1:]):
+                tokens = unit[2]
+                if total + tokens > self.overlap_tokens or total + tokens + next_tokens > self.max_tokens:
+                    break
+                overlap.insert(0, unit)
+                total += tokens
+        self.units = overlap
+        self.overlap_count = len(overlap)
+    
+    def _emit(self, fresh: List[Unit], units: List[Unit]) -> Iterator[Chunk]:
+        """输出上一个暂缓的文本块并暂缓当前文本块；当前文本块过短时尝试并入上一个文本块"""
+        if self.held is not None:
+            if units[-1][1] - units[0][0] < self.min_chunk_size and self._cost(self.held + fresh) <= self.max_tokens:
+                self.held = self.held + fresh
+                return
+            yield self._packed_chunk(self.held)
+        self.held = list(units)
+    
+    def _packed_chunk(self, units: List[Unit]) -> Chunk:
+        return self._make_chunk(units[0][0], units[-1][1], {
+            "split_type": "packed",
+            "unit_count": len(units),
+            "token_count": self._cost(units)
+        })
+    
+    def paragraph(self, start: int, end: int) -> Iterator[Chunk]:
+        """不超过预算的段落整体加入，否则拆成句子"""
+        tokens = self.counter.count(self.text(start, end))
+        if tokens <= self.max_tokens:
+            self.new_paragraph = True
+            yield from self._add(start, end, tokens)
+        else:
+            yield from self.add_sentences(self.sentence_spans(start, end))
+            yield from self.end_sentences()
+    
+    def add_sentences(self, sentences: Iterable[Span]) -> Iterator[Chunk]:
+        """逐句加入；段落的第一句与前文之间使用段落分隔符"""
+        if not self.in_paragraph:
+            self.new_paragraph = True
+            self.in_paragraph = True
+        for start, end in sentences:
+            yield from self._add(start, end, self.counter.count(self.text(start, end)))
+    
+    def end_sentences(self) -> Iterator[Chunk]:
+        """段落结束"""
+        self.in_paragraph = False
+        return iter(())
+    
+    def finish(self) -> Iterator[Chunk]:
+        """输出剩余内容"""
+        if len(self.units) > self.overlap_count:
+            yield from self._emit(self.units[self.overlap_count:], self.units)
+        if self.held is not None:
+            yield self._packed_chunk(self.held)
+        self.units, self.overlap_count, self.held = [], 0, None
@@ -10,15 +10,14 @@ logging.basicConfig(
 )
 
 import os
-import tomli
-from typing import Dict, Any
+import argparse
 from tools.data_processor import DataProcessor
+from utils.settings import Settings, get_settings
 import asyncio
 
-def load_config() -> Dict[str, Any]:
-    """加载配置文件"""
-    with open("config/config.toml", "rb") as f:
-        return tomli.load(f)
+def load_config() -> Settings:
+    """加载配置文件（进程内只解析一次）"""
+    return get_settings("config/config.toml")
 
 def process_single_file(file_path: str) -> None:
     """
@@ -28,25 +27,58 @@ def process_single_file(file_path: str) -> None:
     """
     config = load_config()
     data_processor = DataProcessor(config_path="config/config.toml")
-    collection_name = config["rag"]["collection_name"]
+    collection_name = config.rag.collection_name
     data_processor.process_single_document(file_path, collection_name)
 
-def process_directory(directory_path: str) -> None:
+def process_directory(directory_path: str, resume: bool = False, rebuild: bool = False) -> None:
     """
     处理指定目录下的所有文档，并将其向量化后存储到向量数据库中。
     Args:
         directory_path: 待处理的目录路径。
+        resume: 是否从上次中断处继续。
+        rebuild: 嵌入配置变化后是否删除该目录已入库的文本块并全部重新入库。
     """
     config = load_config()
     data_processor = DataProcessor(config_path="config/config.toml")
-    collection_name = config["rag"]["collection_name"]
-    data_processor.process_document_directory(directory_path, collection_name)
+    collection_name = config.rag.collection_name
+    data_processor.process_document_directory(directory_path, collection_name, resume=resume, rebuild=rebuild)
+
+def resume_unfinished() -> None:
+    """
+    继续上次中断的目录入库（根据向量数据库目录中遗留的检查点日志）。
+    """
+    config = load_config()
+    data_processor = DataProcessor(config_path="config/config.toml")
+    data_processor.resume_unfinished(config.rag.collection_name)
+
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数，不带参数时进入交互模式"""
+    parser = argparse.ArgumentParser(description="文档向量化入库")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--file", help="处理单个文件")
+    group.add_argument("--dir", help="处理整个目录")
+    parser.add_argument("--resume", action="store_true",
+                        help="从上次中断处继续；未指定 --dir 时恢复所有未完成的目录入库")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="与 --dir 一起使用：嵌入配置变化后删除该目录已入库的文本块并全部重新入库")
+    return parser.parse_args()
 
 if __name__ == '__main__':
+    args = parse_args()
+    if args.file:
+        process_single_file(args.file)
+        raise SystemExit(0)
+    if args.dir:
+        process_directory(args.dir, resume=args.resume, rebuild=args.rebuild)
+        raise SystemExit(0)
+    if args.resume:
+        resume_unfinished()
+        raise SystemExit(0)
+
     # 加载配置，获取文档目录
     config = load_config()
-    doc_dir = config["rag"]["document"]["document_directory"]
-    collection_name = config["rag"]["collection_name"]
+    doc_dir = config.rag.document.document_directory
+    collection_name = config.rag.collection_name
 
     print("请选择操作模式:")
     print("1. 处理单个文件 (输入文件路径)")
@@ -0,0 +1,52 @@
+import logging
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO, # 可以根据需要修改为 logging.DEBUG, logging.WARNING, logging.ERROR, logging.CRITICAL
+    format='[%(asctime)s] - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()
+    ]
+)
+
+import asyncio
+import argparse
+
+from tools.query_engine import QueryEngine
+from tools.query_server import QueryServer
+from utils.settings import get_settings
+
+def parse_args() -> argparse.Namespace:
+    """解析命令行参数，未指定的项使用配置中的 [server]"""
+    parser = argparse.ArgumentParser(description="HTTP 问答服务")
+    parser.add_argument("--config", default="config/config.toml", help="配置文件路径")
+    parser.add_argument("--host", help="监听地址")
+    parser.add_argument("--port", type=int, help="监听端口")
+    return parser.parse_args()
+
+async def serve(args: argparse.Namespace) -> None:
+    """
+    创建问答引擎并运行 HTTP 服务。
+    Args:
+        args: 命令行参数。
+    """
+    server_config = get_settings(args.config).server
+    engine = QueryEngine.from_config(args.config)
+    server = QueryServer(
+        engine,
+        host=args.host or server_config.host,
+        port=args.port if args.port is not None else server_config.port,
+        max_concurrency=server_config.max_concurrency,
+        max_pending=server_config.max_pending,
+        request_timeout=server_config.request_timeout,
+        batch_max_size=server_config.batch_max_size,
+        batch_max_wait=server_config.batch_max_wait_ms / 1000,
+        max_body_bytes=server_config.max_body_bytes
+    )
+    await server.serve_forever()
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "..", "config", "config.toml")
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    """项目配置的副本：numpy 后端，向量数据库和嵌入缓存都放在临时目录中"""
+    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+        config = f.read()
+    config = config.replace('vector_store_type = "chroma"', 'vector_store_type = "numpy"')
+    config = config.replace('persist_directory = "data/vector_store"',
+                            f'persist_directory = "{(tmp_path / "vector_store").as_posix()}"')
+    config = config.replace('path = "data/embedding_cache.sqlite"', f'path = "{(tmp_path / "cache.sqlite").as_posix()}"')
+    path = tmp_path / "config.toml"
+    path.write_text(config, encoding="utf-8")
+    # LLM 等组件按 RAG_APP_CONFIG 读取配置
+    monkeypatch.setenv("RAG_APP_CONFIG", str(path))
+    return str(path)
@@ -0,0 +1,104 @@
+import os
+from typing import List
+
+import pytest
+
+from tools.chunk_index import ChunkIndex
+from tools.data_processor import DataProcessor
+from utils.llm import EmbeddingBatch
+
+SHARED = "两个文件共有的一段内容，例如许可证声明或页脚。"
+FILES = {
+    "a.txt": f"只出现在 a.txt 中的第一段。\n\n{SHARED}\n\n只出现在 a.txt 中的最后一段。",
+    "b.txt": f"只出现在 b.txt 中的段落。\n\n{SHARED}",
+}
+COLLECTION = "dedup_test"
+
+
+class FlakyLLM:
+    """向量化第一次遇到 fail_text 时失败的假 LLM"""
+    embedding_batch_size = 32
+
+    def __init__(self, fail_text: str):
+        self.fail_text = fail_text
+        self.failed = False
+
+    def embed_batch(self, texts: List[str]) -> EmbeddingBatch:
+        batch = EmbeddingBatch()
+        for index, text in enumerate(texts):
+            if text == self.fail_text and not self.failed:
+                self.failed = True
+                batch.embeddings.append(None)
+                batch.errors[index] = "模拟的向量化失败"
+            else:
+                batch.embeddings.append([float(len(text)), float(sum(map(ord, text)) % 997), 1.0])
+        return batch
+
+
+@pytest.fixture
+def processor(config_path):
+    processor = DataProcessor(config_path=config_path)
+    processor.llm = FlakyLLM(SHARED)
+    yield processor
+    processor.vector_store.close()
+    processor.chunk_index.close()
+
+
+@pytest.fixture
+def documents(tmp_path):
+    directory = tmp_path / "documents"
+    directory.mkdir()
+    for name, content in FILES.items():
+        (directory / name).write_text(content, encoding="utf-8")
+    return str(directory)
+
+
+def _refs(processor: DataProcessor, chunk_id: str) -> List[str]:
+    return [os.path.basename(source) for source in processor.chunk_index.sources(COLLECTION, chunk_id)]
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_duplicate_fails_with_original_and_is_stored_on_rerun(processor, documents, pipelined):
+    shared_id = ChunkIndex.chunk_id(SHARED)
+
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    # 原始文本块向量化失败，重复的文本块也不能记为已写入
+    assert processor.vector_store.get_documents(COLLECTION, [shared_id]) == []
+    assert _refs(processor, shared_id) == []
+
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    assert [doc["id"] for doc in processor.vector_store.get_documents(COLLECTION, [shared_id])] == [shared_id]
+    assert _refs(processor, shared_id) == ["a.txt", "b.txt"]
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_shared_chunk_metadata_follows_remaining_source(processor, documents, pipelined):
+    from tools.chunk_context import ChunkContextFetcher
+
+    shared_id = ChunkIndex.chunk_id(SHARED)
+    processor.llm = FlakyLLM("")
+    fetcher = ChunkContextFetcher(dir_reader=processor.dir_reader)
+
+    def shared_metadata():
+        return processor.vector_store.get_documents(COLLECTION, [shared_id])[0]["metadata"]
+
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    assert _refs(processor, shared_id) == ["a.txt", "b.txt"]
+    first_source = shared_metadata()["relative_path"]
+    other_source = "b.txt" if first_source == "a.txt" else "a.txt"
+
+    # 删除元数据所指的文件后，文本块仍被另一个文件引用，元数据改为指向它
+    os.remove(os.path.join(documents, first_source))
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    assert _refs(processor, shared_id) == [other_source]
+    assert shared_metadata()["relative_path"] == other_source
+    assert fetcher.fetch(shared_metadata())["content"] == SHARED
+
+    # 修改该文件使文本块的位置变化，元数据中的位置随之更新
+    path = os.path.join(documents, other_source)
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("新增在开头的一段内容。\n\n" + content)
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    assert fetcher.fetch(shared_metadata())["content"] == SHARED
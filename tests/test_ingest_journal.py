@@ -0,0 +1,83 @@
+from typing import List
+
+import pytest
+
+from tools.data_processor import DataProcessor
+from tools.ingest_journal import IngestJournal
+from utils.llm import EmbeddingBatch
+
+FILES = {
+    "a.txt": "第一个文件的第一段。\n\n第一个文件的第二段。",
+    "b.txt": "第二个文件的段落。",
+}
+COLLECTION = "journal_test"
+
+
+class FakeLLM:
+    embedding_batch_size = 1
+
+    def embed_batch(self, texts: List[str]) -> EmbeddingBatch:
+        return EmbeddingBatch(embeddings=[[float(len(text)), 1.0] for text in texts])
+
+
+@pytest.fixture
+def processor(config_path):
+    processor = DataProcessor(config_path=config_path)
+    processor.llm = FakeLLM()
+    # 只按显式 flush 写出，文本块会一直留在写缓冲区中
+    processor.vector_store.flush_interval = 0
+    yield processor
+    processor.vector_store.close()
+    processor.chunk_index.close()
+
+
+@pytest.fixture
+def documents(tmp_path):
+    directory = tmp_path / "documents"
+    directory.mkdir()
+    for name, content in FILES.items():
+        (directory / name).write_text(content, encoding="utf-8")
+    return str(directory)
+
+
+def _interrupt_after_first_file(processor: DataProcessor, monkeypatch) -> None:
+    iter_files = processor.dir_reader.iter_files
+
+    def interrupted(directory: str):
+        for index, item in enumerate(iter_files(directory)):
+            if index == 1:
+                raise RuntimeError("模拟的中断")
+            yield item
+
+    monkeypatch.setattr(processor.dir_reader, "iter_files", interrupted)
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_interrupted_ingest_discards_buffered_callbacks_and_resumes(processor, documents, monkeypatch, pipelined):
+    _interrupt_after_first_file(processor, monkeypatch)
+    with pytest.raises(RuntimeError):
+        processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+
+    # 缓冲的文本块连同回调一起丢弃，之后关闭不会再写已关闭的日志，后端正常关闭
+    assert processor.vector_store.discard_buffer(COLLECTION) == 0
+    processor.vector_store.flush()
+    assert IngestJournal.find_unfinished(processor.config.rag.persist_directory, COLLECTION)
+
+    monkeypatch.undo()
+    assert processor.resume_unfinished(COLLECTION)
+    assert processor.vector_store.count(COLLECTION) == 3
+    assert not IngestJournal.find_unfinished(processor.config.rag.persist_directory, COLLECTION)
+
+
+def test_flush_callback_error_does_not_skip_backend_close(processor, monkeypatch):
+    closed = []
+    processor.vector_store.create_collection(COLLECTION)
+    monkeypatch.setattr(processor.vector_store.backend, "close", lambda: closed.append(True))
+
+    def broken(ids: List[str]) -> None:
+        raise AttributeError("journal closed")
+
+    processor.vector_store.buffer_documents(COLLECTION, [{"id": "x", "content": "x", "vector": [1.0, 1.0]}],
+                                            on_written=broken)
+    processor.vector_store.close()
+    assert closed == [True]
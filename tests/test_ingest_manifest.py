@@ -0,0 +1,114 @@
+import os
+from typing import List
+
+import pytest
+
+from tools.data_processor import DataProcessor
+from tools.ingest_manifest import IngestManifest
+from utils.llm import EmbeddingBatch
+
+FILES = {
+    "a.txt": "第一个文件的第一句。第一个文件的第二句。\n\n第一个文件的第二段。",
+    "b.txt": "第二个文件的段落。",
+}
+COLLECTION = "manifest_test"
+
+
+class RecordingLLM:
+    """记录向量化过的文本的假 LLM"""
+    embedding_batch_size = 32
+
+    def __init__(self):
+        self.texts: List[str] = []
+
+    def embed_batch(self, texts: List[str]) -> EmbeddingBatch:
+        self.texts.extend(texts)
+        return EmbeddingBatch(embeddings=[[float(len(text)), 1.0] for text in texts])
+
+
+def _open(config_path: str) -> DataProcessor:
+    processor = DataProcessor(config_path=config_path)
+    processor.llm = RecordingLLM()
+    return processor
+
+
+def _close(processor: DataProcessor) -> None:
+    processor.vector_store.close()
+    processor.chunk_index.close()
+
+
+@pytest.fixture
+def processor(config_path):
+    processors = [_open(config_path)]
+
+    def reopen() -> DataProcessor:
+        # 修改配置后重新创建，切分规则按新配置构建
+        _close(processors[-1])
+        processors.append(_open(config_path))
+        return processors[-1]
+
+    processors[0].reopen = reopen
+    yield processors[0]
+    _close(processors[-1])
+
+
+@pytest.fixture
+def documents(tmp_path):
+    directory = tmp_path / "documents"
+    directory.mkdir()
+    for name, content in FILES.items():
+        (directory / name).write_text(content, encoding="utf-8")
+    return str(directory)
+
+
+def _manifest(processor: DataProcessor, documents: str) -> IngestManifest:
+    return IngestManifest.for_directory(processor.config.rag.persist_directory, COLLECTION, documents)
+
+
+def _stored_ids(processor: DataProcessor, documents: str) -> List[str]:
+    manifest = _manifest(processor, documents)
+    chunk_ids = sorted({chunk_id for entry in manifest.entries.values() for chunk_id in entry.chunk_ids})
+    assert processor.vector_store.count(COLLECTION) == len(chunk_ids)
+    assert sorted(processor.vector_store.stored_ids(COLLECTION, chunk_ids)) == chunk_ids
+    return chunk_ids
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_splitter_change_reingests_files_and_keeps_tombstones(processor, documents, pipelined):
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    os.remove(os.path.join(documents, "b.txt"))
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    before = _stored_ids(processor, documents)
+    assert _manifest(processor, documents).entries["b.txt"].deleted_at is not None
+
+    processor.config.rag.splitter.sentence_threshold = 5
+    processor.config.rag.splitter.max_chunk_size = 12
+    processor = processor.reopen()
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+
+    # 内容未变的文件也按新的切分配置重新入库，旧切分方式的文本块被删除，已删除的文件仍保持墓碑标记
+    manifest = _manifest(processor, documents)
+    after = _stored_ids(processor, documents)
+    assert processor.llm.texts and after != before
+    assert manifest.entries["b.txt"].deleted_at is not None and not manifest.entries["b.txt"].chunk_ids
+
+    processor.llm.texts.clear()
+    processor.process_document_directory(documents, COLLECTION, pipelined=pipelined, incremental=True)
+    assert processor.llm.texts == []
+
+
+def test_embedding_change_requires_rebuild(processor, documents):
+    processor.process_document_directory(documents, COLLECTION, incremental=True)
+    chunk_ids = _stored_ids(processor, documents)
+
+    processor.config.llm.embedding.model = "another-embedding-model"
+    processor = processor.reopen()
+    with pytest.raises(ValueError):
+        processor.process_document_directory(documents, COLLECTION, incremental=True)
+    assert processor.llm.texts == []
+
+    # 文本块ID不变，但全部用新模型重新向量化
+    processor.process_document_directory(documents, COLLECTION, incremental=True, rebuild=True)
+    assert _stored_ids(processor, documents) == chunk_ids
+    assert len(processor.llm.texts) == len(chunk_ids)
+    assert _manifest(processor, documents).fingerprint["embedding"]["model"] == "another-embedding-model"
@@ -0,0 +1,49 @@
+import os
+from typing import List
+
+from rules.token_counter import HeuristicTokenCounter
+from tools.data_processor import DataProcessor
+from utils.llm import EmbeddingBatch
+
+COLLECTION = "pipeline_test"
+
+
+class FakeLLM:
+    embedding_batch_size = 32
+
+    def embed_batch(self, texts: List[str]) -> EmbeddingBatch:
+        return EmbeddingBatch(embeddings=[[float(len(text)), 1.0] for text in texts])
+
+
+class CountingTokenCounter(HeuristicTokenCounter):
+    """每次反序列化（在读取/切分子进程中重建）时在 log_path 中记录一行"""
+
+    def __init__(self, log_path: str):
+        self.log_path = log_path
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(f"{os.getpid()}\n")
+
+
+def test_split_rules_are_sent_once_per_read_worker(config_path, tmp_path):
+    directory = tmp_path / "documents"
+    directory.mkdir()
+    for index in range(5):
+        (directory / f"{index}.txt").write_text(f"第 {index} 个文件的段落。", encoding="utf-8")
+    log_path = str(tmp_path / "unpickled.log")
+
+    processor = DataProcessor(config_path=config_path)
+    processor.llm = FakeLLM()
+    processor.config.rag.ingest.read_workers = 1
+    processor.split_rules["txt"].token_counter = CountingTokenCounter(log_path)
+    try:
+        processor.process_document_directory(str(directory), COLLECTION, pipelined=True, incremental=False)
+        assert processor.vector_store.count(COLLECTION) == 5
+    finally:
+        processor.vector_store.close()
+        processor.chunk_index.close()
+
+    with open(log_path, "r", encoding="utf-8") as f:
+        assert len(f.read().split()) == 1
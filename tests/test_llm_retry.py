@@ -0,0 +1,101 @@
+from typing import List
+
+import ollama
+import pytest
+
+from utils.concurrency import retry_sync
+from utils.llm import LLM, _retry_items
+
+
+class FakeEmbedClient:
+    """按顺序抛出预设异常的同步嵌入客户端，用完后正常返回"""
+
+    def __init__(self, errors=(), reject=None):
+        self.errors = list(errors)
+        self.reject = reject
+        self.calls: List[List[str]] = []
+
+    def embed(self, model, input):
+        self.calls.append(list(input))
+        if self.errors:
+            raise self.errors.pop(0)
+        if self.reject in input:
+            raise ollama.ResponseError("invalid input", 400)
+        return {"embeddings": [[float(len(text))] for text in input]}
+
+    def embeddings(self, model, prompt):
+        return {"embedding": self.embed(model, [prompt])["embeddings"][0]}
+
+
+@pytest.fixture
+def llm(config_path):
+    llm = LLM()
+    llm.embedding_cache = None
+    llm.concurrency.retry_base_delay = 0.001
+    llm.concurrency.retry_max_delay = 0.001
+    return llm
+
+
+def test_transient_error_retries_whole_batch(llm):
+    llm.ollama_embed_client = FakeEmbedClient([ConnectionError("connection reset"), ollama.ResponseError("busy", 503)])
+
+    result = llm.embed_batch(["a", "bb", "ccc"])
+
+    assert len(llm.ollama_embed_client.calls) == 3
+    assert result.errors == {}
+    assert result.embeddings == [[1.0], [2.0], [3.0]]
+
+
+def test_transient_error_fails_batch_after_retries(llm):
+    llm.concurrency.max_retries = 2
+    llm.ollama_embed_client = FakeEmbedClient([ConnectionError("connection reset")] * 5)
+
+    result = llm.embed_batch(["a", "bb"])
+
+    assert len(llm.ollama_embed_client.calls) == 3
+    assert result.embeddings == [None, None]
+    assert result.failed_indices == [0, 1]
+    assert "connection reset" in result.errors[0]
+
+
+def test_invalid_input_falls_back_to_single_items(llm):
+    llm.ollama_embed_client = FakeEmbedClient(reject="bad")
+
+    result = llm.embed_batch(["a", "bad", "ccc"])
+
+    assert result.embeddings == [[1.0], None, [3.0]]
+    assert result.failed_indices == [1]
+
+
+def test_missing_model_fails_batch_without_retry(llm):
+    llm.ollama_embed_client = FakeEmbedClient([ollama.ResponseError("model not found", 404)])
+
+    result = llm.embed_batch(["a", "bb"])
+
+    assert len(llm.ollama_embed_client.calls) == 1
+    assert result.failed_indices == [0, 1]
+
+
+@pytest.mark.parametrize("error, expected", [
+    (ollama.ResponseError("invalid input", 400), True),
+    (ValueError("unexpected response"), True),
+    (ConnectionError("connection reset"), False),
+    (ollama.ResponseError("busy", 503), False),
+    (ollama.ResponseError("unauthorized", 401), False),
+    (ollama.ResponseError("model not found", 404), False),
+])
+def test_retry_items(error, expected):
+    # 只有可能由个别输入引起的错误才逐条重新请求
+    assert _retry_items(error) is expected
+
+
+def test_retry_sync_does_not_retry_permanent_errors():
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        retry_sync(fail, max_retries=3, base_delay=0.001)
+    assert len(calls) == 1
@@ -0,0 +1,60 @@
+import pytest
+
+from readers.txt_reader import TxtReader
+
+
+def _stream(path: str, block_size: int = TxtReader.DEFAULT_BLOCK_SIZE):
+    result = TxtReader(path).stream(block_size)
+    return "".join(result["blocks"]), result["metadata"]
+
+
+@pytest.mark.parametrize("data", [
+    b"a\rb\rc",
+    b"a\r\nb\rc\n",
+    b"a\n\nb\r\n",
+    b"\xef\xbb\xbfa\rb",
+    b"\xef\xbb\xbf",
+])
+def test_stream_matches_read(tmp_path, monkeypatch, data):
+    # 块很小时跨块的 \r\n 也要与 read() 一致
+    monkeypatch.setattr(TxtReader, "DEFAULT_BLOCK_SIZE", 2)
+    path = tmp_path / "a.txt"
+    path.write_bytes(data)
+
+    content, metadata = _stream(str(path), block_size=2)
+    expected = TxtReader(str(path)).read()
+    assert content == expected["content"]
+    assert metadata["line_count"] == expected["metadata"]["line_count"]
+
+
+def test_stream_validates_file_when_prefix_is_ascii(tmp_path):
+    path = tmp_path / "gbk.txt"
+    path.write_bytes(b"a" * TxtReader.SNIFF_BYTES + "后面是中文内容。".encode("gbk"))
+
+    content, metadata = _stream(str(path))
+    assert metadata["encoding"] == "gbk"
+    assert content.endswith("后面是中文内容。")
+
+
+def test_stream_falls_back_when_prefix_misleads(tmp_path, monkeypatch):
+    # 前缀 C3 A9 能按 UTF-8 解码，但文件整体只能按 GBK 解码
+    monkeypatch.setattr(TxtReader, "SNIFF_BYTES", 2)
+    path = tmp_path / "mixed.txt"
+    path.write_bytes("é".encode("utf-8") + "中文".encode("gbk"))
+
+    content, metadata = _stream(str(path))
+    expected = TxtReader(str(path)).read()
+    assert metadata["encoding"] == expected["metadata"]["encoding"] == "gbk"
+    assert content == expected["content"]
+
+
+def test_stream_fallback_after_returned_blocks_applies_to_next_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(TxtReader, "SNIFF_BYTES", 2)
+    path = tmp_path / "mixed.txt"
+    path.write_bytes("é".encode("utf-8") + "中文".encode("gbk"))
+
+    with pytest.raises(ValueError):
+        _stream(str(path), block_size=2)
+    content, metadata = _stream(str(path), block_size=2)
+    assert metadata["encoding"] == "gbk"
+    assert content == TxtReader(str(path)).read()["content"]
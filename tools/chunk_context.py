@@ -0,0 +1,76 @@
+import os
+import logging
+from typing import Any, Dict, Optional
+
+from readers.dir_reader import DirReader
+
+logger = logging.getLogger(__name__)
+
+class ChunkContextFetcher:
+    """查询时根据文本块元数据中的位置（source_path、start_offset、end_offset）从源文件取出文本块及其前后文。
+
+    源文件按块流式解码，只保留所需范围内的文本；文件在入库后被修改时位置已经失效，不返回结果。
+    """
+
+    def __init__(self, config_path: str = "config/config.toml", dir_reader: Optional[DirReader] = None):
+        """
+        Args:
+            config_path: 配置文件路径
+            dir_reader: 读取源文件使用的目录读取器，默认按 config_path 创建
+        """
+        self.dir_reader = dir_reader or DirReader(config_path)
+
+    def fetch(self, metadata: Dict[str, Any], before: int = 500, after: int = 500) -> Optional[Dict[str, str]]:
+        """
+        取出文本块及其前后文
+
+        Args:
+            metadata: 检索结果中文本块的元数据
+            before: 文本块之前的字符数
+            after: 文本块之后的字符数
+
+        Returns:
+            Optional[Dict[str, str]]: 包含 before、content、after 的字典；缺少位置信息、源文件不存在或已修改时返回 None
+        """
+        source_path = metadata.get("source_path")
+        start = metadata.get("start_offset")
+        end = metadata.get("end_offset")
+        if not source_path or start is None or end is None:
+            return None
+        if not os.path.isfile(source_path):
+            logger.warning(f"文本块的源文件不存在: {source_path}")
+            return None
+        modified_time = metadata.get("modified_time")
+        if modified_time is not None and os.stat(source_path).st_mtime != modified_time:
+            logger.warning(f"源文件 {source_path} 在入库后已修改，文本块位置已失效")
+            return None
+
+        low = max(0, start - before)
+        high = end + after
+        file_data = self.dir_reader.stream_file(source_path, metadata.get("relative_path", ""))
+        if file_data is None:
+            return None
+
+        pieces = []
+        position = 0
+        blocks = file_data["blocks"]
+        try:
+            for block in blocks:
+                block_end = position + len(block)
+                if block_end > low:
+                    pieces.append(block[max(0, low - position):high - position])
+                position = block_end
+                if position >= high:
+                    break
+        finally:
+            # 提前结束时关闭生成器，释放文件的内存映射
+            close = getattr(blocks, "close", None)
+            if close is not None:
+                close()
+
+        text = "".join(pieces)
+        return {
+            "before": text[:start - low],
+            "content": text[start - low:end - low],
+            "after": text[end - low:]
+        }
@@ -0,0 +1,215 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class ChunkIndex:
+    """基于 SQLite 的文本块引用索引。
+
+    文本块ID由内容哈希得到，相同的文本（许可证头、页脚等）在集合中只向量化和存储一次。
+    索引记录每个文本块被哪些源文件引用，引用数即为引用它的源文件数；
+    源文件重新入库或被删除时替换其引用，引用数降为 0 的文本块才从向量数据库中删除。
+    每条引用还保存该源文件中这个文本块的元数据（位置、修改时间等），向量数据库中文本块的元数据
+    所指的源文件不再引用它时，用其他源文件的元数据替换。
+    """
+
+    # SQLite 单条语句允许的参数个数有限，批量查询时按此大小分段
+    _QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, path: str):
+        """
+        初始化引用索引
+
+        Args:
+            path: SQLite 数据库文件路径
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_refs (
+                collection TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (collection, chunk_id, source)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_refs_source ON chunk_refs(collection, source)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_refs)")}
+        if "metadata" not in columns:
+            # 旧版本的索引没有保存元数据，这些引用的元数据为 NULL
+            self._conn.execute("ALTER TABLE chunk_refs ADD COLUMN metadata TEXT")
+        self._conn.commit()
+
+    @staticmethod
+    def chunk_id(text: str) -> str:
+        """
+        由文本块内容计算ID
+
+        Args:
+            text: 文本块内容
+
+        Returns:
+            str: SHA-256 摘要的前 32 个十六进制字符
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    def _select_ids(self, sql: str, collection: str, ids: List[str]) -> Set[str]:
+        found: Set[str] = set()
+        for start in range(0, len(ids), self._QUERY_CHUNK_SIZE):
+            part = ids[start:start + self._QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(part))
+            rows = self._conn.execute(sql.format(placeholders=placeholders), [collection, *part]).fetchall()
+            found.update(row[0] for row in rows)
+        return found
+
+    def referenced(self, collection: str, chunk_ids: Iterable[str]) -> Set[str]:
+        """
+        返回其中至少被一个源文件引用的文本块ID（是否已存储以向量数据库为准）
+
+        Args:
+            collection: 集合名称
+            chunk_ids: 文本块ID
+
+        Returns:
+            Set[str]: 已被引用的文本块ID
+        """
+        ids = list(dict.fromkeys(chunk_ids))
+        with self._lock:
+            return self._select_ids(
+                "SELECT DISTINCT chunk_id FROM chunk_refs WHERE collection = ? AND chunk_id IN ({placeholders})",
+                collection, ids
+            )
+
+    def unreferenced(self, collection: str, chunk_ids: Iterable[str]) -> List[str]:
+        """
+        返回其中没有任何源文件引用的文本块ID
+
+        Args:
+            collection: 集合名称
+            chunk_ids: 文本块ID
+
+        Returns:
+            List[str]: 引用数为 0 的文本块ID
+        """
+        ids = list(dict.fromkeys(chunk_ids))
+        referenced = self.referenced(collection, ids)
+        return [chunk_id for chunk_id in ids if chunk_id not in referenced]
+
+    def source_chunks(self, collection: str, source: str) -> List[str]:
+        """返回源文件引用的全部文本块ID"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT chunk_id FROM chunk_refs WHERE collection = ? AND source = ?", (collection, source)
+            )]
+
+    def set_refs(self, collection: str, source: str, chunk_ids: Iterable[str],
+                 metadatas: Optional[Dict[str, Dict[str, Any]]] = None) -> List[str]:
+        """
+        用新的文本块ID替换源文件的全部引用
+
+        Args:
+            collection: 集合名称
+            source: 源文件标识（绝对路径）
+            chunk_ids: 源文件当前的文本块ID，为空表示移除该源文件
+            metadatas: 文本块ID -> 该源文件中这个文本块的元数据
+
+        Returns:
+            List[str]: 因此失去最后一个引用的文本块ID，需要从向量数据库中删除
+        """
+        ids = list(dict.fromkeys(chunk_ids))
+        metadatas = metadatas or {}
+        with self._lock:
+            old_ids = [row[0] for row in self._conn.execute(
+                "SELECT chunk_id FROM chunk_refs WHERE collection = ? AND source = ?", (collection, source)
+            )]
+            removed = list(set(old_ids) - set(ids))
+            self._conn.execute("DELETE FROM chunk_refs WHERE collection = ? AND source = ?", (collection, source))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_refs (collection, chunk_id, source, metadata) VALUES (?, ?, ?, ?)",
+                [(collection, chunk_id, source,
+                  json.dumps(metadatas[chunk_id], ensure_ascii=False) if chunk_id in metadatas else None)
+                 for chunk_id in ids]
+            )
+            still_referenced = self._select_ids(
+                "SELECT DISTINCT chunk_id FROM chunk_refs WHERE collection = ? AND chunk_id IN ({placeholders})",
+                collection, removed
+            )
+            self._conn.commit()
+        return [chunk_id for chunk_id in removed if chunk_id not in still_referenced]
+
+    def refcount(self, collection: str, chunk_id: str) -> int:
+        """文本块被引用的源文件数"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM chunk_refs WHERE collection = ? AND chunk_id = ?", (collection, chunk_id)
+            ).fetchone()[0]
+
+    def sources(self, collection: str, chunk_id: str) -> List[str]:
+        """
+        返回引用该文本块的全部源文件（检索结果的元数据只记录其中一个源文件）
+
+        Args:
+            collection: 集合名称
+            chunk_id: 文本块ID
+
+        Returns:
+            List[str]: 源文件标识列表
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT source FROM chunk_refs WHERE collection = ? AND chunk_id = ? ORDER BY source",
+                (collection, chunk_id)
+            )]
+
+    def occurrences(self, collection: str, chunk_ids: Iterable[str]) -> Dict[str, Dict[str, Optional[Dict[str, Any]]]]:
+        """
+        返回文本块在各引用源文件中的元数据
+
+        Args:
+            collection: 集合名称
+            chunk_ids: 文本块ID
+
+        Returns:
+            Dict[str, Dict[str, Optional[Dict[str, Any]]]]: 文本块ID -> {源文件: 元数据}，没有引用的文本块不出现；
+                旧版本写入的引用没有元数据，为 None
+        """
+        ids = list(dict.fromkeys(chunk_ids))
+        found: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+        with self._lock:
+            for start in range(0, len(ids), self._QUERY_CHUNK_SIZE):
+                part = ids[start:start + self._QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT chunk_id, source, metadata FROM chunk_refs WHERE collection = ? AND chunk_id IN ({placeholders}) "
+                    f"ORDER BY chunk_id, source",
+                    [collection, *part]
+                ).fetchall()
+                for chunk_id, source, metadata in rows:
+                    found.setdefault(chunk_id, {})[source] = json.loads(metadata) if metadata else None
+        return found
+
+    def clear(self, collection: str) -> None:
+        """清空集合的全部引用（集合被删除或重置后）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_refs WHERE collection = ?", (collection,))
+            self._conn.commit()
+        logger.info(f"已清空集合 '{collection}' 的文本块引用索引")
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
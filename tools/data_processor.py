@@ -1,15 +1,22 @@
 import os
-from typing import List, Dict, Any, Type
-import tomli
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set, Type
 import importlib
 
 from readers.dir_reader import DirReader
 from readers.file_base_reader import FileBaseReader
 from rules.split_base_rule import SplitRule
 from rules.txt_split_rule import TxtSplitRule # 示例：需要导入具体的切分规则实现类
-from agents.toolcall import ToolCall
+from rules.token_counter import create_token_counter_from_config
 from tools.vector_store import VectorStore
+from tools.chunk_index import ChunkIndex
+from tools.lexical_index import LexicalIndex
+from tools.hybrid_search import HybridSearcher
+from tools.query_cache import QueryCache
+from tools.ingest_pipeline import ChunkDeduplicator, FileTracker, IngestPipeline, iter_documents
+from tools.ingest_manifest import IngestManifest, ManifestEntry
+from tools.ingest_journal import IngestJournal
 from utils.llm import LLM # 导入 LLM 类
+from utils.settings import get_settings
 
 class DataProcessor:
     """数据处理工具，整合文件读取、切分、向量化和存储的流程"""
@@ -21,29 +28,66 @@ class DataProcessor:
         Args:
             config_path: 配置文件路径
         """
-        self.config = self._load_config(config_path)
+        self.config = get_settings(config_path)
         self.dir_reader = DirReader(config_path=config_path)
-        self.tool_call = ToolCall(config_path=config_path)
-        self.vector_store = VectorStore(persist_directory=self.config["rag"]["persist_directory"])
+        store_config = self.config.rag.vector_store
+        backend_settings = {"faiss": self.config.rag.faiss, "numpy": self.config.rag.numpy}.get(self.config.rag.vector_store_type)
+        backend_options = backend_settings.model_dump() if backend_settings is not None else None
+        cache_config = self.config.rag.query_cache
+        self.query_cache: Optional[QueryCache] = None
+        if cache_config.enabled:
+            self.query_cache = QueryCache(max_entries=cache_config.max_entries, ttl=cache_config.ttl)
+        self.vector_store = VectorStore(
+            persist_directory=self.config.rag.persist_directory,
+            write_buffer_size=store_config.write_buffer_size,
+            flush_interval=store_config.flush_interval,
+            max_batch_size=store_config.max_batch_size,
+            vector_store_type=self.config.rag.vector_store_type,
+            backend_options=backend_options,
+            query_cache=self.query_cache,
+            shards=store_config.shards
+        )
+        # 文本块ID为内容哈希，引用索引记录每个文本块被哪些源文件引用
+        self.chunk_index = ChunkIndex(os.path.join(self.config.rag.persist_directory, "chunk_index.sqlite"))
+        # BM25 词法索引随向量数据库的写入和删除同步更新
+        search_config = self.config.rag.search
+        self.lexical_index: Optional[LexicalIndex] = None
+        if search_config.lexical_index:
+            self.lexical_index = LexicalIndex(os.path.join(self.config.rag.persist_directory, "lexical"),
+                                              k1=search_config.bm25_k1, b=search_config.bm25_b)
+            self.vector_store.add_observer(self.lexical_index)
         # 初始化用于 Embedding 的 LLM 实例
         self.llm = LLM() # 不需要在这里传入配置，LLM类内部会自行加载
+        self.searcher = HybridSearcher(
+            self.vector_store,
+            self.lexical_index,
+            embed_query=self.llm.embed,
+            aembed_query=self.llm.aembed,
+            default_mode=search_config.mode if self.lexical_index is not None else "dense",
+            rrf_k=search_config.rrf_k,
+            candidates=search_config.candidates,
+            query_cache=self.query_cache
+        )
         
         # 初始化切分规则链
+        splitter_config = self.config.rag.splitter
         self.split_rules: Dict[str, SplitRule] = {
-            "txt": TxtSplitRule(max_chunk_size=1000, min_chunk_size=200, sentence_threshold=500),
+            "txt": TxtSplitRule(
+                max_chunk_size=splitter_config.max_chunk_size,
+                min_chunk_size=splitter_config.min_chunk_size,
+                sentence_threshold=splitter_config.sentence_threshold,
+                max_tokens=splitter_config.max_tokens if splitter_config.packing else None,
+                overlap_tokens=splitter_config.overlap_tokens,
+                token_counter=create_token_counter_from_config(self.config)
+            ),
             # 在这里添加其他文件类型的切分规则实例
         }
 
-    def _load_config(self, config_path: str) -> Dict[str, Any]:
-        """加载配置文件"""
-        with open(config_path, "rb") as f:
-            return tomli.load(f)
-
     def _get_file_reader_class(self, file_type: str) -> Type[FileBaseReader]:
         """
         根据文件类型获取对应的文件读取器类。
         """
-        reader_class_name = self.config["reader"]["supported_types"].get(file_type)
+        reader_class_name = self.config.reader.supported_types.get(file_type)
         if not reader_class_name:
             raise ValueError(f"不支持的文件读取类型: {file_type}")
         
@@ -56,79 +100,175 @@ class DataProcessor:
         except (ImportError, AttributeError, TypeError) as e:
             raise RuntimeError(f"加载文件读取器 {file_type} 失败: {e}")
 
-    def _process_file_content(self, file_data: Dict[str, Any], collection_name: str) -> None:
+    def _iter_documents(self, file_data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        内部方法：处理单个文件内容的切分、向量化和存储。
+        内部方法：流式切分单个文件内容，逐个产出待向量化的文档。
         Args:
-            file_data: 包含文件内容和元数据的字典。
-            collection_name: 向量数据库集合名称。
+            file_data: 包含元数据以及文本块迭代器（blocks）或完整内容（content）的字典。
+        Yields:
+            Dict[str, Any]: 包含 id、content、metadata 的文档（尚未包含向量）。
         """
-        content = file_data["content"]
         metadata = file_data["metadata"]
         file_type = metadata["file_type"]
         file_name = metadata["file_name"]
 
         print(f"处理文件: {file_name} ({file_type})")
 
-        # 1. 文本切分
         splitter = self.split_rules.get(file_type)
         if not splitter:
             print(f"不支持的切分规则类型: {file_type}，跳过文件: {file_name}")
             return
 
-        chunks = splitter.process(content, file_type)
-        print(f"文件 {file_name} 切分完成，生成 {len(chunks)} 个文本块。")
+        count = 0
+        for document in iter_documents(file_data, splitter):
+            count += 1
+            yield document
+        print(f"文件 {file_name} 切分完成，生成 {count} 个文本块。")
 
-        # 2. 文本向量化
-        texts_to_embed = [chunk["content"] for chunk in chunks]
-        embeddings_list = []
+    def _prepare_documents(self, file_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        内部方法：切分单个文件内容，生成待向量化的文档列表。
+        Args:
+            file_data: 包含文件内容和元数据的字典。
+        Returns:
+            List[Dict[str, Any]]: 包含 id、content、metadata 的文档列表（尚未包含向量）。
+        """
+        return list(self._iter_documents(file_data))
 
+    def _embed_and_store(self, documents: List[Dict[str, Any]], collection_name: str,
+                         journal: Optional[IngestJournal] = None,
+                         on_stored: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> List[str]:
+        """
+        内部方法：批量向量化文档并写入向量数据库。
+        Args:
+            documents: _prepare_documents 生成的文档列表，可以来自多个文件。
+            collection_name: 向量数据库集合名称。
+            journal: 检查点日志，写入前记录批次。
+            on_stored: 为 None 时立即写入；否则放入向量数据库的写缓冲区，与后续文档合并写入，
+                写入后以已写入的文档列表调用。
+        Returns:
+            List[str]: 写入（或已放入写缓冲区）的文档ID列表。
+        """
         try:
-            print("开始创建 EmbeddingAgent 实例...")
-            print(f"当前 tool_call 实例: {self.tool_call}")
-            print(f"当前 vector_store 实例: {self.vector_store}")
-            
-            # 创建 embedding agent 实例，传入必需的参数
-            embedding_agent = self.tool_call.get_agent_instance(
-                "embedding",
-                name="embedding_agent",
-                llm=self.llm,  # 直接使用 DataProcessor 中的 llm 实例
-                vector_store=self.vector_store
-            )
-            print(f"EmbeddingAgent 实例创建成功: {embedding_agent}")
-            print(f"EmbeddingAgent 的 llm 实例: {embedding_agent.llm}")
-            print(f"EmbeddingAgent 的 vector_store 实例: {embedding_agent.vector_store}")
-            
-            for text in texts_to_embed:
-                embeddings_list.append(embedding_agent.llm.embed(text))
-            print(f"文件 {file_name} 向量化完成。")
-
+            batch = self.llm.embed_batch([doc["content"] for doc in documents])
         except Exception as e:
-            print(f"文件 {file_name} 向量化失败: {e}，跳过存储。")
+            print(f"{len(documents)} 个文本块向量化失败: {e}，跳过存储。")
             import traceback
             print(f"详细错误信息: {traceback.format_exc()}")
-            return
+            return []
+
+        for index, error in batch.errors.items():
+            print(f"文本块 {documents[index]['id']} 向量化失败: {error}，跳过存储。")
 
-        # 3. 准备文档存储
         documents_to_add = []
-        for i, chunk in enumerate(chunks):
-            if i < len(embeddings_list) and embeddings_list[i]: # 确保有对应的嵌入向量
-                doc_id = f"{file_name}_{metadata.get("relative_path", "").replace("/", "_")}_{i}"
-                doc_metadata = metadata.copy()
-                doc_metadata.update(chunk["metadata"])
-                doc_metadata["chunk_id"] = doc_id
-
-                documents_to_add.append({
-                    "id": doc_id,
-                    "content": chunk["content"],
-                    "vector": embeddings_list[i],
-                    "metadata": doc_metadata
-                })
-        
+        for doc, embedding in zip(documents, batch.embeddings):
+            if embedding is not None and len(embedding) > 0: # 确保有对应的嵌入向量
+                doc["vector"] = embedding
+                documents_to_add.append(doc)
+
         if documents_to_add:
-            self.vector_store.add_documents(collection_name, documents_to_add)
-        else:
+            if journal:
+                journal.begin_batch([doc["id"] for doc in documents_to_add])
+            if on_stored is None:
+                self.vector_store.add_documents(collection_name, documents_to_add)
+            else:
+                def on_written(ids: List[str]) -> None:
+                    on_stored(documents_to_add)
+
+                self.vector_store.buffer_documents(collection_name, documents_to_add, on_written=on_written)
+        return [doc["id"] for doc in documents_to_add]
+
+    def _process_file_content(self, file_data: Dict[str, Any], collection_name: str) -> None:
+        """
+        内部方法：处理单个文件内容的切分、向量化和存储。
+        Args:
+            file_data: 包含文件内容和元数据的字典。
+            collection_name: 向量数据库集合名称。
+        """
+        file_name = file_data["metadata"]["file_name"]
+        documents = self._prepare_documents(file_data)
+        chunk_ids = list(dict.fromkeys(doc["id"] for doc in documents))
+        # 已存储以向量数据库中实际存在为准；文件内重复的文本块只向量化第一个
+        stored = self.vector_store.stored_ids(collection_name, chunk_ids)
+        first: Dict[str, Dict[str, Any]] = {}
+        for doc in documents:
+            first.setdefault(doc["id"], doc)
+        fresh = [doc for chunk_id, doc in first.items() if chunk_id not in stored]
+        written = stored | set(self._embed_and_store(fresh, collection_name)) if fresh else stored
+        written_chunks = {chunk_id: first[chunk_id]["metadata"] for chunk_id in chunk_ids if chunk_id in written}
+        if not written_chunks:
             print(f"文件 {file_name} 没有生成可存储的文档。")
+            return
+        if stored:
+            print(f"文件 {file_name} 有 {len(stored)} 个文本块已存储，不再重复向量化。")
+        self._set_source_chunks(collection_name, file_data["metadata"]["source_path"], written_chunks)
+
+    def _set_source_chunks(self, collection_name: str, source: str, chunks: Dict[str, Dict[str, Any]],
+                           keep: Optional[Set[str]] = None) -> List[str]:
+        """
+        内部方法：替换源文件引用的文本块，并删除因此不再被任何源文件引用的文本块；
+        仍然存在的文本块的元数据改为指向引用它的源文件。
+        Args:
+            collection_name: 向量数据库集合名称。
+            source: 源文件的绝对路径。
+            chunks: 源文件当前的文本块ID -> 该文件中这个文本块的元数据，为空表示移除该源文件。
+            keep: 本次入库中仍可能被其他文件引用的文本块ID，这些文本块推迟到入库结束时再检查。
+        Returns:
+            List[str]: 推迟删除的文本块ID。
+        """
+        old_ids = self.chunk_index.source_chunks(collection_name, source)
+        orphans = self.chunk_index.set_refs(collection_name, source, list(chunks), chunks)
+        deferred = [chunk_id for chunk_id in orphans if keep and chunk_id in keep]
+        stale = [chunk_id for chunk_id in orphans if not (keep and chunk_id in keep)]
+        if stale:
+            self.vector_store.delete_documents(collection_name, stale)
+        orphan_ids = set(orphans)
+        surviving = list(chunks) + [chunk_id for chunk_id in old_ids if chunk_id not in chunks and chunk_id not in orphan_ids]
+        self._refresh_chunk_sources(collection_name, surviving)
+        return deferred
+
+    def _refresh_chunk_sources(self, collection_name: str, chunk_ids: List[str]) -> None:
+        """
+        内部方法：相同的文本块只存储一份，元数据（来源文件、位置、修改时间）来自第一次写入它的文件。
+        元数据所指的源文件不再引用它（被删除或修改）、或该文件中的位置已变化时，改用引用索引中
+        仍引用它的源文件的元数据，检索结果和取上下文才不会指向已删除的文件或失效的位置。
+        Args:
+            collection_name: 向量数据库集合名称。
+            chunk_ids: 需要检查的文本块ID。
+        """
+        if not chunk_ids:
+            return
+        occurrences = self.chunk_index.occurrences(collection_name, chunk_ids)
+        updates: Dict[str, Dict[str, Any]] = {}
+        for chunk_id, metadata in self.vector_store.stored_metadatas(collection_name, list(occurrences)).items():
+            sources = occurrences[chunk_id]
+            current = (metadata or {}).get("source_path")
+            if current in sources:
+                # 原来的源文件仍引用它，只在位置变化时更新；旧版本的引用没有元数据，无法比较
+                target = sources[current]
+            else:
+                target = next((source_metadata for source_metadata in sources.values() if source_metadata), None)
+            if target is not None and target != metadata:
+                updates[chunk_id] = target
+        if updates:
+            self.vector_store.update_metadatas(collection_name, updates)
+
+    def _prepare_collection(self, collection_name: str) -> None:
+        """
+        内部方法：创建集合；集合为空（新建、被删除或重置）时清空其文本块引用索引。
+        Args:
+            collection_name: 向量数据库集合名称。
+        """
+        self.vector_store.create_collection(collection_name)
+        if self.vector_store.count(collection_name) == 0:
+            self.chunk_index.clear(collection_name)
+        if self.lexical_index is not None:
+            self.lexical_index.ensure_synced(collection_name, self.vector_store)
+
+    @staticmethod
+    def _source_path(directory_path: str, relative_path: str) -> str:
+        """目录中文件的源文件标识，与文档元数据中的 source_path 一致"""
+        return os.path.abspath(os.path.join(directory_path, relative_path))
 
     def process_single_document(self, file_path: str, collection_name: str) -> None:
         """
@@ -139,45 +279,387 @@ class DataProcessor:
             collection_name: 向量数据库中用于存储文档的集合名称。
         """
         print(f"开始处理单个文件: {file_path}")
-        self.vector_store.create_collection(collection_name)
+        self._prepare_collection(collection_name)
 
         if not os.path.exists(file_path) or not os.path.isfile(file_path):
             print(f"文件不存在或不是有效文件: {file_path}")
             return
 
         file_type = os.path.splitext(file_path)[1][1:].lower()
-        if file_type not in self.config["rag"]["document"]["supported_formats"]:
+        if file_type not in self.config.rag.document.supported_formats:
             print(f"不支持的文件类型: {file_type}，跳过文件: {file_path}")
             return
         
         # 检查文件大小
-        if os.path.getsize(file_path) > self.config["rag"]["document"]["max_file_size"]:
+        if os.path.getsize(file_path) > self.config.rag.document.max_file_size:
             print(f"文件过大: {file_path}")
             return
 
         try:
             reader_class = self._get_file_reader_class(file_type)
-            reader = reader_class(file_path, encoding=self.config["reader"]["default_encoding"])
+            reader = reader_class(file_path, encoding=self.config.reader.default_encoding)
             file_data = reader.read()
             # 添加相对路径信息（对于单个文件，相对路径就是文件名本身）
             file_data["metadata"]["relative_path"] = os.path.basename(file_path)
+            file_data["metadata"]["source_path"] = os.path.abspath(file_path)
             self._process_file_content(file_data, collection_name)
+            self.vector_store.persist()
             print(f"文件 {file_path} 处理完成。")
         except Exception as e:
             print(f"处理文件 {file_path} 时出错: {e}")
 
-    def process_document_directory(self, directory_path: str, collection_name: str) -> None:
+    def _ingest_fingerprint(self) -> Dict[str, Dict[str, Any]]:
+        """
+        内部方法：影响入库结果的配置。嵌入部分决定向量（模型相同则维度相同），切分部分决定文本块。
+        Returns:
+            Dict[str, Dict[str, Any]]: 按部分分组的配置指纹，记录在入库清单中。
+        """
+        embedding_config = self.config.llm.embedding
+        if embedding_config.backend == "sentence_transformers":
+            embedding = {"backend": embedding_config.backend, "model": embedding_config.local.model,
+                         "normalize": embedding_config.local.normalize}
+        else:
+            embedding = {"backend": embedding_config.backend, "model": embedding_config.model}
+        return {"embedding": embedding, "splitter": self.config.rag.splitter.model_dump()}
+
+    def _open_manifest(self, directory_path: str, collection_name: str, rebuild: bool = False) -> IngestManifest:
+        """
+        内部方法：加载目录的入库清单。集合为空（例如被删除或重置）而清单中仍有记录时清空清单。
+
+        切分配置变化后所有文件都重新入库。嵌入配置变化后已有的向量与新向量不可比较，而文本块ID只取决于内容，
+        重新入库会沿用旧向量，因此必须指定 rebuild，删除该目录已入库的文本块后全部重新入库。
+        Args:
+            directory_path: 文档目录。
+            collection_name: 向量数据库集合名称。
+            rebuild: 嵌入配置变化时是否删除该目录已入库的文本块并重新入库。
+        Returns:
+            IngestManifest: 入库清单。
+        Raises:
+            ValueError: 嵌入配置已变化且未指定 rebuild。
+        """
+        manifest = IngestManifest.for_directory(self.config.rag.persist_directory, collection_name, directory_path)
+        fingerprint = self._ingest_fingerprint()
+        changed = manifest.changed_settings(fingerprint) if manifest.has_chunks() else []
+        if manifest.has_chunks() and self.vector_store.count(collection_name) == 0:
+            print(f"集合 '{collection_name}' 为空但入库清单中仍有记录，将重新处理所有文件。")
+            manifest.clear()
+        elif "embedding" in changed:
+            if not rebuild:
+                raise ValueError(f"嵌入配置已变化（上次入库: {manifest.fingerprint.get('embedding')}，"
+                                 f"当前: {fingerprint['embedding']}），集合 '{collection_name}' 中该目录的向量需要重新生成，"
+                                 f"请指定 rebuild（run_data.py --rebuild）重新入库。")
+            self._drop_manifest_chunks(manifest, collection_name, directory_path)
+        elif changed:
+            print(f"入库配置已变化（{', '.join(changed)}），将重新处理所有文件。")
+            manifest.invalidate()
+        manifest.fingerprint = fingerprint
+        return manifest
+
+    def _drop_manifest_chunks(self, manifest: IngestManifest, collection_name: str, directory_path: str) -> None:
+        """
+        内部方法：删除清单中记录的全部文本块及其引用，并清空清单。
+        Args:
+            manifest: 入库清单。
+            collection_name: 向量数据库集合名称。
+            directory_path: 文档目录。
+        """
+        chunk_ids = list(dict.fromkeys(chunk_id for entry in manifest.entries.values() for chunk_id in entry.chunk_ids))
+        print(f"重建入库: 删除目录 {directory_path} 已入库的 {len(chunk_ids)} 个文本块。")
+        for entry in manifest.entries.values():
+            self.chunk_index.set_refs(collection_name, self._source_path(directory_path, entry.relative_path), [])
+        if chunk_ids:
+            self.vector_store.delete_documents(collection_name, chunk_ids)
+        manifest.clear()
+
+    def _open_journal(self, manifest: IngestManifest, collection_name: str,
+                      directory_path: str, resume: bool) -> IngestJournal:
+        """
+        内部方法：处理上次遗留的入库日志，并为本次入库开启新日志。
+
+        未完成文件的文本块（包括只写入了一部分的批次）中没有被其他文件引用的总是先删除。恢复模式下，已完成的文件并入清单，
+        本次入库会跳过它们；否则同样删除这些文件的文本块，重新处理。
+        Args:
+            manifest: 入库清单。
+            collection_name: 向量数据库集合名称。
+            directory_path: 文档目录。
+            resume: 是否从上次中断处继续。
+        Returns:
+            IngestJournal: 已写入 start 记录的新日志。
+        """
+        journal = IngestJournal(IngestJournal.path_for(manifest.path))
+        state = IngestJournal.replay(journal.path)
+        if state is not None:
+            # 未完成文件的文本块可能与已入库的文件共享，只删除没有任何引用的
+            rollback_ids = self.chunk_index.unreferenced(collection_name, state.rollback_ids)
+            if rollback_ids:
+                print(f"回滚上次中断时未完成文件的 {len(rollback_ids)} 个文本块。")
+                self.vector_store.delete_documents(collection_name, rollback_ids)
+            if resume:
+                for entry in state.files:
+                    manifest.commit(entry, entry.chunk_ids, complete=bool(entry.content_hash))
+                print(f"从检查点恢复: {len(state.files)} 个文件已完成，将跳过。")
+            else:
+                print(f"发现未完成的入库日志，未指定恢复，将重新处理其中的 {len(state.files)} 个文件。")
+                for entry in state.files:
+                    self._set_source_chunks(collection_name, self._source_path(directory_path, entry.relative_path), {})
+                    manifest.entries.pop(entry.relative_path, None)
+            # 先保存清单，再用新日志覆盖旧日志
+            manifest.save()
+        journal.open(directory_path, collection_name)
+        return journal
+
+    def _check_file(self, manifest: IngestManifest, collection_name: str,
+                    file_path: str, relative_path: str) -> Optional[ManifestEntry]:
+        """
+        内部方法：对照清单检查文件。文件已变化时保留其旧的文本块，重新入库完成后只删除不再被引用的，
+        未变化的段落不会重新向量化。
+        Args:
+            manifest: 入库清单。
+            collection_name: 向量数据库集合名称。
+            file_path: 文件路径。
+            relative_path: 相对路径。
+        Returns:
+            Optional[ManifestEntry]: 需要重新入库时返回新记录，未变化时返回 None。
+        """
+        entry = manifest.check(relative_path, file_path)
+        if entry is not None and manifest.stale_chunk_ids(relative_path):
+            print(f"文件 {relative_path} 已变化，将重新入库。")
+        return entry
+
+    def _remove_deleted_files(self, manifest: IngestManifest, collection_name: str,
+                              directory_path: str, seen_paths: set) -> int:
+        """
+        内部方法：删除已从磁盘移除的文件的文本块，并在清单中打墓碑标记。
+        Args:
+            manifest: 入库清单。
+            collection_name: 向量数据库集合名称。
+            directory_path: 文档目录。
+            seen_paths: 本次遍历到的相对路径集合。
+        Returns:
+            int: 被标记删除的文件数。
+        """
+        missing = manifest.missing(seen_paths)
+        for entry in missing:
+            print(f"文件 {entry.relative_path} 已从磁盘删除，移除其 {len(entry.chunk_ids)} 个文本块引用。")
+            self._set_source_chunks(collection_name, self._source_path(directory_path, entry.relative_path), {})
+            manifest.tombstone(entry.relative_path)
+        return len(missing)
+
+    def process_document_directory(self, directory_path: str, collection_name: str,
+                                   pipelined: Optional[bool] = None,
+                                   incremental: Optional[bool] = None,
+                                   resume: bool = False,
+                                   rebuild: bool = False) -> None:
         """
         处理指定目录下的所有文档，并将其向量化后存储到向量数据库中。
 
         Args:
             directory_path: 包含文档的目录路径。
             collection_name: 向量数据库中用于存储文档的集合名称。
+            pipelined: 是否使用并行流水线模式，默认取 [rag.ingest].mode。
+            incremental: 是否根据入库清单跳过未变化的文件，默认取 [rag.ingest].incremental。
+            resume: 是否从上次中断处继续（依赖入库清单，会强制启用增量模式）。
+            rebuild: 嵌入配置变化后是否删除该目录已入库的文本块并全部重新入库（依赖入库清单，会强制启用增量模式）。
         """
         print(f"开始处理目录: {directory_path}")
-        self.vector_store.create_collection(collection_name)
+        self._prepare_collection(collection_name)
 
-        for file_data in self.dir_reader.read_directory(directory_path):
-            self._process_file_content(file_data, collection_name)
+        ingest_config = self.config.rag.ingest
+        if pipelined is None:
+            pipelined = ingest_config.mode == "pipelined"
+        if incremental is None:
+            incremental = ingest_config.incremental
+        if resume and not incremental:
+            print("恢复模式依赖入库清单，已启用增量模式。")
+            incremental = True
+        if rebuild and not incremental:
+            print("重建模式依赖入库清单，已启用增量模式。")
+            incremental = True
+        manifest = self._open_manifest(directory_path, collection_name, rebuild) if incremental else None
+        journal = self._open_journal(manifest, collection_name, directory_path, resume) if manifest else None
+        finished = False
+        seen_paths = set()
+        skipped = 0
+        # 本次入库的去重器（其中记录了本次入库中出现过的文本块ID），以及因可能仍被其他文件使用而推迟删除的文本块ID
+        deduplicator = ChunkDeduplicator(lambda ids: self.vector_store.stored_ids(collection_name, ids))
+        deferred: List[str] = []
+
+        def prepare_file(file_path: str, relative_path: str) -> Optional[Any]:
+            nonlocal skipped
+            seen_paths.add(relative_path)
+            if manifest is None:
+                return relative_path
+            entry = self._check_file(manifest, collection_name, file_path, relative_path)
+            if entry is None:
+                skipped += 1
+            return entry
+
+        def on_file_done(entry: Any, written: Dict[str, Dict[str, Any]], complete: bool) -> None:
+            written_ids = list(written)
+            relative_path = entry.relative_path if manifest is not None else entry
+            # 先更新引用索引再记录文件完成，崩溃恢复时已完成文件的引用一定存在
+            deferred.extend(self._set_source_chunks(collection_name, self._source_path(directory_path, relative_path),
+                                                    written, keep=deduplicator.scheduled))
+            if manifest is not None:
+                manifest.commit(entry, written_ids, complete=complete)
+                journal.file_done(entry)
+
+        try:
+            if pipelined:
+                pipeline = IngestPipeline(
+                    llm=self.llm,
+                    vector_store=self.vector_store,
+                    dir_reader=self.dir_reader,
+                    split_rules=self.split_rules,
+                    read_workers=ingest_config.read_workers,
+                    embed_workers=ingest_config.embed_workers,
+                    embed_batch_size=self.llm.embedding_batch_size,
+                    write_batch_size=ingest_config.write_batch_size,
+                    queue_size=ingest_config.queue_size,
+                    max_inflight_bytes=ingest_config.max_inflight_bytes
+                )
+                stats = pipeline.run(directory_path, collection_name, prepare_file=prepare_file,
+                                     on_file_done=on_file_done, journal=journal, deduplicator=deduplicator)
+                print(f"流水线统计: {stats}")
+            else:
+                self._process_directory_serial(directory_path, collection_name, prepare_file, on_file_done,
+                                               journal, deduplicator)
+
+            # 推迟的文本块在所有文件完成后仍没有引用时删除
+            orphans = self.chunk_index.unreferenced(collection_name, deferred)
+            if orphans:
+                self.vector_store.delete_documents(collection_name, orphans)
+
+            if manifest is not None:
+                removed = self._remove_deleted_files(manifest, collection_name, directory_path, seen_paths)
+                print(f"增量入库: 跳过 {skipped} 个未变化的文件，移除 {removed} 个已删除的文件。")
+            # 入库结束时保存后端的索引文件，下次打开时不必重放新增的向量
+            self.vector_store.persist()
+            finished = True
+        finally:
+            # 写缓冲区中的回调会更新清单和日志，关闭日志前先处理：正常结束时写出，异常退出时连同回调一起丢弃，
+            # 这些文本块没有记入日志，恢复时重新处理
+            if finished:
+                self.vector_store.flush(collection_name)
+            else:
+                self.vector_store.discard_buffer(collection_name)
+            if manifest is not None:
+                manifest.save()
+            # 正常结束后清单已包含全部进度，日志不再需要；异常退出时保留日志用于恢复
+            if journal is not None and finished:
+                journal.discard()
+            elif journal is not None:
+                journal.close()
+
+        print(f"目录 {directory_path} 处理完成。")
+
+    def _process_directory_serial(self, directory_path: str, collection_name: str,
+                                  prepare_file: Callable[[str, str], Optional[Any]],
+                                  on_file_done: Callable[[Any, Dict[str, Dict[str, Any]], bool], None],
+                                  journal: Optional[IngestJournal] = None,
+                                  deduplicator: Optional[ChunkDeduplicator] = None) -> None:
+        """
+        内部方法：逐个文件读取和切分，跨文件累积文本块后批量向量化和存储。
+        Args:
+            directory_path: 文档目录。
+            collection_name: 向量数据库集合名称。
+            prepare_file: 文件处理前的回调，返回 None 表示跳过该文件，否则返回该文件的标记。
+            on_file_done: 文件的全部文本块写入后的回调，参数为 (标记, 已写入的文本块ID -> 元数据, 是否全部成功)。
+            journal: 检查点日志。
+            deduplicator: 本次入库的去重器，重复的文本块不再向量化，随原始文本块写入（或失败）。
+        """
+        pending: List[Dict[str, Any]] = []
+        tracker = FileTracker(on_file_done, deduplicator)
+        read_error: Optional[Exception] = None
+
+        def flush() -> None:
+            if not pending:
+                return
+            documents = pending
+            if deduplicator is not None:
+                documents, written, failed = deduplicator.split(pending)
+                if written or failed:
+                    tracker.settle(written, failed)
+                if not documents:
+                    pending.clear()
+                    return
+            # 向量化成功的文本块进入向量数据库的写缓冲区，多个小文件合并成少量大批次写入，落盘后才计入文件进度
+            written = set(self._embed_and_store(documents, collection_name, journal,
+                                                on_stored=lambda docs: tracker.settle(docs, [])))
+            tracker.settle([], [doc for doc in documents if doc["id"] not in written])
+            pending.clear()
+
+        def read_documents(file_path: str, relative_path: str) -> Iterator[Dict[str, Any]]:
+            # 只捕获读取和切分中的异常；向量化和存储的异常在 flush 中抛出，不会进入生成器
+            nonlocal read_error
+            try:
+                file_data = self.dir_reader.stream_file(file_path, relative_path)
+                if file_data is not None:
+                    yield from self._iter_documents(file_data)
+            except Exception as e:
+                read_error = e
+
+        # 文件按块流式读取和切分，跨文件累积文本块，凑满一批后再统一向量化和存储，减少嵌入请求次数
+        for file_path, relative_path in self.dir_reader.iter_files(directory_path):
+            token = prepare_file(file_path, relative_path)
+            if token is None:
+                continue
+            tracker.open(relative_path, token)
+            read_error = None
+            count = 0
+            for document in read_documents(file_path, relative_path):
+                pending.append(document)
+                count += 1
+                if len(pending) >= self.llm.embedding_batch_size:
+                    flush()
 
-        print(f"目录 {directory_path} 处理完成。") 
\ No newline at end of file
+            if read_error is not None:
+                print(f"处理文件 {file_path} 时出错: {str(read_error)}")
+                # 丢弃该文件尚未写入的文本块，已写入的部分记入清单，下次运行时重新处理
+                kept = [doc for doc in pending if doc["metadata"]["relative_path"] != relative_path]
+                count -= len(pending) - len(kept)
+                pending[:] = kept
+                # 写缓冲区中该文件的文本块先写出并计入进度，再以不完整结束该文件
+                self.vector_store.flush()
+                tracker.close(relative_path, count, complete=False)
+            else:
+                tracker.close(relative_path, count)
+
+        flush()
+        self.vector_store.flush()
+
+    def resume_unfinished(self, collection_name: Optional[str] = None) -> List[str]:
+        """
+        继续所有未正常结束的目录入库（根据 persist_directory 中遗留的入库日志）。
+        Args:
+            collection_name: 只恢复该集合的入库，默认恢复全部。
+        Returns:
+            List[str]: 已恢复处理的文档目录。
+        """
+        resumed = []
+        for state in IngestJournal.find_unfinished(self.config.rag.persist_directory, collection_name):
+            if not os.path.isdir(state.directory):
+                print(f"文档目录不存在，无法恢复: {state.directory}")
+                continue
+            print(f"恢复入库: 目录 {state.directory}，集合 '{state.collection_name}'")
+            self.process_document_directory(state.directory, state.collection_name, resume=True)
+            resumed.append(state.directory)
+        if not resumed:
+            print("没有需要恢复的入库任务。")
+        return resumed
+
+    def search(self, query: str, collection_name: Optional[str] = None, n_results: int = 5,
+               mode: Optional[str] = None, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        检索与查询相关的文本块。
+        Args:
+            query: 查询文本。
+            collection_name: 集合名称，默认使用配置中的集合。
+            n_results: 返回结果数量。
+            mode: dense、lexical（只查词法索引，不调用向量化服务）或 hybrid，默认使用 [rag.search].mode。
+            where: 元数据过滤条件。
+        Returns:
+            List[Dict[str, Any]]: 按相关性降序的结果，包含 id、content、metadata、score。
+        """
+        return self.searcher.search(collection_name or self.config.rag.collection_name, query,
+                                    n_results=n_results, mode=mode, where=where)
@@ -0,0 +1,242 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from tools.lexical_index import LexicalIndex
+from tools.query_cache import QueryCache
+from tools.vector_backends import match_where
+from tools.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+
+async def _timed(timings: Optional[Dict[str, float]], stage: str, awaitable: Awaitable) -> Any:
+    """等待 awaitable，把耗时（秒）记入 timings[stage]"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        if timings is not None:
+            timings[stage] = time.perf_counter() - started
+
+
+class HybridSearcher:
+    """稠密检索与 BM25 词法检索的混合检索。
+
+    - dense: 查询向量化后在向量数据库中检索
+    - lexical: 只查词法索引，再按ID取回文本和元数据，不需要向量化
+    - hybrid: 两路各取 candidates 个候选，用倒数排名融合（RRF）合并: score = Σ 1 / (rrf_k + 排名)
+
+    结果包含 id、content、metadata、score（dense 为 -distance，lexical 为 BM25 得分，hybrid 为 RRF 得分），
+    以及各路的原始值 distance / bm25（该文档出现在对应一路时）。
+
+    配置了 query_cache 时按规范化的查询文本缓存最终结果，命中时不需要向量化；集合的写版本号变化后失效。
+    asearch 是异步版本：hybrid 模式下词法检索在查询向量化的同时进行。
+    """
+
+    MODES = ("dense", "lexical", "hybrid")
+
+    def __init__(self, vector_store: VectorStore, lexical_index: Optional[LexicalIndex],
+                 embed_query: Callable[[str], List[float]], default_mode: str = "hybrid",
+                 rrf_k: int = 60, candidates: int = 50, query_cache: Optional[QueryCache] = None,
+                 aembed_query: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+                 avector_search: Optional[Callable[[str, List[float], int, Optional[Dict[str, Any]]],
+                                                   Awaitable[List[Dict[str, Any]]]]] = None):
+        """
+        Args:
+            vector_store: 向量数据库
+            lexical_index: 词法索引，为 None 时只能使用 dense 模式
+            embed_query: 查询文本的向量化函数（dense、hybrid 模式使用）
+            default_mode: 默认的检索模式
+            rrf_k: RRF 的平滑常数，越大各路排名靠后的结果权重越接近
+            candidates: hybrid 模式每一路取的候选数（不少于 n_results）
+            query_cache: 查询结果缓存，为 None 时不缓存
+            aembed_query: 查询文本的异步向量化函数（asearch 使用），为 None 时在线程中调用 embed_query
+            avector_search: 异步向量检索函数 (集合名称, 查询向量, 结果数, 过滤条件) -> 结果（asearch 使用，
+                例如合并并发查询的 MicroBatcher），为 None 时在线程中调用 vector_store.search
+        """
+        self._check_mode(default_mode, lexical_index)
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.embed_query = embed_query
+        self.default_mode = default_mode
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.query_cache = query_cache
+        self.aembed_query = aembed_query
+        self.avector_search = avector_search
+
+    def _check_mode(self, mode: str, lexical_index: Optional[LexicalIndex]) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的检索模式: {mode}，可选 {'、'.join(self.MODES)}")
+        if mode != "dense" and lexical_index is None:
+            raise ValueError(f"检索模式 {mode} 需要词法索引，请在配置中启用 [rag.search].lexical_index")
+
+    def search(self, collection_name: str, query: str, n_results: int = 5, mode: Optional[str] = None,
+               where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        检索与查询相关的文档
+
+        Args:
+            collection_name: 集合名称
+            query: 查询文本
+            n_results: 返回结果数量
+            mode: dense、lexical 或 hybrid，默认使用 default_mode
+            where: 元数据过滤条件（ChromaDB 语法）
+
+        Returns:
+            List[Dict[str, Any]]: 按相关性降序的结果
+        """
+        mode = mode or self.default_mode
+        self._check_mode(mode, self.lexical_index)
+        if self.query_cache is None:
+            return self._search(collection_name, query, n_results, mode, where)
+        # 版本号在检索之前读取，检索期间的写入会使这次写入的条目在下次读取时失效
+        version = self.vector_store.collection_version(collection_name)
+        key = QueryCache.make_key("text", collection_name, mode, QueryCache.normalize_query(query), n_results, where,
+                                  self.rrf_k, self.candidates)
+        hits = self.query_cache.get(key, version)
+        if hits is None:
+            hits = self._search(collection_name, query, n_results, mode, where)
+            self.query_cache.put(key, collection_name, version, hits)
+        return hits
+
+    def _search(self, collection_name: str, query: str, n_results: int, mode: str,
+                where: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if mode == "dense":
+            return self._dense(collection_name, query, n_results, where)
+        if mode == "lexical":
+            return self._lexical(collection_name, query, n_results, where)
+        size = max(n_results, self.candidates)
+        return self.fuse([
+            self._dense(collection_name, query, size, where),
+            self._lexical(collection_name, query, size, where)
+        ], n_results, self.rrf_k)
+
+    async def asearch(self, collection_name: str, query: str, n_results: int = 5, mode: Optional[str] = None,
+                      where: Optional[Dict[str, Any]] = None,
+                      timings: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        search 的异步版本。向量化是异步请求，向量数据库和词法索引的检索在线程中执行，
+        hybrid 模式下词法检索与向量化、稠密检索同时进行
+
+        Args:
+            collection_name: 集合名称
+            query: 查询文本
+            n_results: 返回结果数量
+            mode: dense、lexical 或 hybrid，默认使用 default_mode
+            where: 元数据过滤条件（ChromaDB 语法）
+            timings: 用于记录各阶段耗时（秒）的字典: embed、dense、lexical、fuse，命中缓存时只有 cache
+
+        Returns:
+            List[Dict[str, Any]]: 按相关性降序的结果
+        """
+        mode = mode or self.default_mode
+        self._check_mode(mode, self.lexical_index)
+        if self.query_cache is None:
+            return await self._asearch(collection_name, query, n_results, mode, where, timings)
+        started = time.perf_counter()
+        version = await asyncio.to_thread(self.vector_store.collection_version, collection_name)
+        key = QueryCache.make_key("text", collection_name, mode, QueryCache.normalize_query(query), n_results, where,
+                                  self.rrf_k, self.candidates)
+        hits = self.query_cache.get(key, version)
+        if hits is not None:
+            if timings is not None:
+                timings["cache"] = time.perf_counter() - started
+            return hits
+        hits = await self._asearch(collection_name, query, n_results, mode, where, timings)
+        self.query_cache.put(key, collection_name, version, hits)
+        return hits
+
+    async def _asearch(self, collection_name: str, query: str, n_results: int, mode: str,
+                       where: Optional[Dict[str, Any]], timings: Optional[Dict[str, float]]) -> List[Dict[str, Any]]:
+        size = max(n_results, self.candidates) if mode == "hybrid" else n_results
+        lexical = None
+        if mode != "dense":
+            lexical = asyncio.ensure_future(_timed(timings, "lexical", asyncio.to_thread(
+                self._lexical, collection_name, query, size, where)))
+        try:
+            dense = None
+            if mode != "lexical":
+                embedding = self.aembed_query(query) if self.aembed_query else asyncio.to_thread(self.embed_query, query)
+                vector = await _timed(timings, "embed", embedding)
+                dense = await _timed(timings, "dense", self._adense_by_vector(collection_name, vector, size, where))
+            lexical_hits = await lexical if lexical is not None else None
+        except BaseException:
+            if lexical is not None:
+                lexical.cancel()
+            raise
+        if dense is None:
+            return lexical_hits
+        if lexical_hits is None:
+            return dense
+        started = time.perf_counter()
+        hits = self.fuse([dense, lexical_hits], n_results, self.rrf_k)
+        if timings is not None:
+            timings["fuse"] = time.perf_counter() - started
+        return hits
+
+    async def _adense_by_vector(self, collection_name: str, vector: List[float], n_results: int,
+                                where: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.avector_search is None:
+            return await asyncio.to_thread(self._dense_by_vector, collection_name, vector, n_results, where)
+        hits = await self.avector_search(collection_name, vector, n_results, where)
+        for hit in hits:
+            hit["score"] = -hit["distance"]
+        return hits
+
+    def _dense(self, collection_name: str, query: str, n_results: int,
+               where: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._dense_by_vector(collection_name, self.embed_query(query), n_results, where)
+
+    def _dense_by_vector(self, collection_name: str, vector: List[float], n_results: int,
+                         where: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        hits = self.vector_store.search(collection_name, vector, n_results=n_results, where=where)
+        for hit in hits:
+            hit["score"] = -hit["distance"]
+        return hits
+
+    def _lexical(self, collection_name: str, query: str, n_results: int,
+                 where: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # 过滤条件在取回元数据后判断，不够时扩大候选数重试
+        fetch = n_results * (4 if where else 1)
+        while True:
+            ranked = self.lexical_index.search(collection_name, query, fetch)
+            documents = {doc["id"]: doc for doc in self.vector_store.get_documents(collection_name, [doc_id for doc_id, _ in ranked])}
+            hits = []
+            for doc_id, score in ranked:
+                doc = documents.get(doc_id)
+                if doc is None or (where and not match_where(doc.get("metadata"), where)):
+                    continue
+                doc["score"] = doc["bm25"] = score
+                hits.append(doc)
+                if len(hits) == n_results:
+                    return hits
+            if len(ranked) < fetch:
+                return hits
+            fetch *= 4
+
+    @staticmethod
+    def fuse(rankings: Sequence[List[Dict[str, Any]]], n_results: int, rrf_k: int = 60) -> List[Dict[str, Any]]:
+        """
+        倒数排名融合：每个文档的得分为它在各路结果中 1 / (rrf_k + 排名) 之和，排名从 1 开始
+
+        Args:
+            rankings: 各路按相关性降序的结果，每个结果至少包含 id
+            n_results: 返回结果数量
+            rrf_k: 平滑常数
+
+        Returns:
+            List[Dict[str, Any]]: 融合后的结果，合并各路结果的字段，score 为 RRF 得分
+        """
+        fused: Dict[str, Dict[str, Any]] = {}
+        for ranking in rankings:
+            for rank, hit in enumerate(ranking, start=1):
+                entry = fused.get(hit["id"])
+                if entry is None:
+                    entry = fused[hit["id"]] = {**hit, "score": 0.0}
+                else:
+                    entry.update({key: value for key, value in hit.items() if key != "score"})
+                entry["score"] += 1.0 / (rrf_k + rank)
+        return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:n_results]
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+from tools.ingest_manifest import ManifestEntry
+
+logger = logging.getLogger(__name__)
+
+class JournalState(BaseModel):
+    """从入库日志中恢复出的进度"""
+    directory: str = Field("", description="文档目录的绝对路径")
+    collection_name: str = Field("", description="集合名称")
+    started_at: Optional[float] = Field(None, description="上次入库的开始时间")
+    files: List[ManifestEntry] = Field(default_factory=list, description="已完成入库的文件记录")
+    rollback_ids: List[str] = Field(default_factory=list, description="已开始写入、但所属文件未完成的文本块ID")
+
+
+class IngestJournal:
+    """目录入库的检查点日志（追加写入的 JSON Lines，每条记录落盘后才继续）。
+
+    记录类型：
+        start: 入库开始，包含文档目录和集合名称
+        batch: 即将写入向量数据库的一批文本块ID
+        file: 文件的全部文本块已处理完成，包含其清单记录
+
+    检查点以文件为单位：进程崩溃或被杀死后，未完成文件的文本块（无论所在批次是否已写入）不会记入清单，
+    恢复时全部删除，该文件从头重新入库；已完成的文件记录可直接并入入库清单，从而跳过这些文件。
+    """
+
+    SUFFIX = ".journal"
+
+    def __init__(self, path: str, fsync: bool = True):
+        """
+        初始化入库日志
+
+        Args:
+            path: 日志文件路径
+            fsync: 每条记录是否立即 fsync 到磁盘
+        """
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def path_for(cls, manifest_path: str) -> str:
+        """入库清单对应的日志文件路径"""
+        return os.path.splitext(manifest_path)[0] + cls.SUFFIX
+
+    def open(self, directory_path: str, collection_name: str) -> None:
+        """
+        清空旧日志并写入 start 记录
+
+        Args:
+            directory_path: 文档目录
+            collection_name: 集合名称
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._append({
+            "type": "start",
+            "directory": os.path.abspath(directory_path),
+            "collection": collection_name,
+            "time": time.time()
+        })
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def begin_batch(self, ids: List[str]) -> None:
+        """
+        在写入向量数据库之前记录批次，所属文件未完成时恢复会删除这些文本块
+
+        Args:
+            ids: 本批文本块ID
+        """
+        self._append({"type": "batch", "ids": ids})
+
+    def file_done(self, entry: ManifestEntry) -> None:
+        """记录文件已处理完成"""
+        self._append({"type": "file", "entry": entry.model_dump()})
+
+    def close(self) -> None:
+        """关闭日志文件并保留在磁盘上（入库未完成，可用于恢复）"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """入库完成后删除日志"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def replay(path: str) -> Optional[JournalState]:
+        """
+        读取日志并还原进度，忽略崩溃时写了一半的最后一行
+
+        Args:
+            path: 日志文件路径
+
+        Returns:
+            Optional[JournalState]: 日志不存在时返回 None
+        """
+        if not os.path.exists(path):
+            return None
+        state = JournalState()
+        written: List[str] = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"入库日志 {path} 第 {line_number} 行不完整，已忽略")
+                    break
+                record_type = record.get("type")
+                if record_type == "start":
+                    state.directory = record.get("directory", "")
+                    state.collection_name = record.get("collection", "")
+                    state.started_at = record.get("time")
+                elif record_type == "batch":
+                    written.extend(record["ids"])
+                elif record_type == "file":
+                    state.files.append(ManifestEntry(**record["entry"]))
+        # 检查点以文件为单位：只要所属文件没有完成记录，其文本块都需要回滚
+        completed = {doc_id for entry in state.files for doc_id in entry.chunk_ids}
+        state.rollback_ids = list(dict.fromkeys(doc_id for doc_id in written if doc_id not in completed))
+        return state
+
+    @classmethod
+    def find_unfinished(cls, persist_directory: str, collection_name: Optional[str] = None) -> List[JournalState]:
+        """
+        查找 persist_directory 中遗留的入库日志（上次入库未正常结束）
+
+        Args:
+            persist_directory: 向量数据库持久化目录
+            collection_name: 只返回该集合的日志，默认返回全部
+
+        Returns:
+            List[JournalState]: 未完成的入库进度
+        """
+        manifest_dir = os.path.join(persist_directory, "manifests")
+        if not os.path.isdir(manifest_dir):
+            return []
+        states = []
+        for name in sorted(os.listdir(manifest_dir)):
+            if not name.endswith(cls.SUFFIX):
+                continue
+            state = cls.replay(os.path.join(manifest_dir, name))
+            if state is None or not state.directory:
+                continue
+            if collection_name is None or state.collection_name == collection_name:
+                states.append(state)
+        return states
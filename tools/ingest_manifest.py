@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+class ManifestEntry(BaseModel):
+    """清单中单个文件的入库记录"""
+    relative_path: str = Field(..., description="相对于文档目录的路径")
+    size: int = Field(..., description="文件大小（字节）")
+    mtime: float = Field(..., description="文件修改时间")
+    content_hash: str = Field("", description="文件内容的 SHA-256，为空表示上次入库不完整，需要重新处理")
+    chunk_ids: List[str] = Field(default_factory=list, description="已写入向量数据库的文本块ID")
+    indexed_at: float = Field(default_factory=time.time, description="最近一次入库时间")
+    deleted_at: Optional[float] = Field(None, description="文件从磁盘删除的时间（墓碑标记）")
+
+
+class IngestManifest:
+    """目录入库清单，记录每个文件的大小、修改时间、内容哈希及其文本块ID，用于增量入库。
+
+    清单按 (集合, 文档目录) 分别保存在 persist_directory 下的 manifests 目录中。
+    清单同时记录入库时影响文本块和向量的配置（配置指纹），配置变化后文件内容未变也需要重新入库。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, root: str):
+        """
+        初始化入库清单
+
+        Args:
+            path: 清单文件路径
+            root: 文档目录的绝对路径
+        """
+        self.path = path
+        self.root = root
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.fingerprint: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def for_directory(cls, persist_directory: str, collection_name: str, directory_path: str) -> "IngestManifest":
+        """
+        加载 (集合, 文档目录) 对应的清单，不存在时返回空清单
+
+        Args:
+            persist_directory: 向量数据库持久化目录
+            collection_name: 集合名称
+            directory_path: 文档目录
+
+        Returns:
+            IngestManifest: 清单实例
+        """
+        root = os.path.abspath(directory_path)
+        root_digest = hashlib.sha1(root.encode("utf-8")).hexdigest()[:12]
+        path = os.path.join(persist_directory, "manifests", f"{collection_name}_{root_digest}.json")
+        manifest = cls(path, root)
+        manifest.load()
+        return manifest
+
+    def load(self) -> None:
+        """从磁盘加载清单"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != self.VERSION:
+            logger.warning(f"入库清单版本不匹配，忽略已有清单: {self.path}")
+            return
+        self.entries = {
+            rel: ManifestEntry(**entry) for rel, entry in data.get("entries", {}).items()
+        }
+        self.fingerprint = data.get("fingerprint", {})
+
+    def save(self) -> None:
+        """原子地将清单写入磁盘（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {
+            "version": self.VERSION,
+            "root": self.root,
+            "fingerprint": self.fingerprint,
+            "entries": {rel: entry.model_dump() for rel, entry in self.entries.items()},
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        """清空所有记录（例如集合被删除或重置后）"""
+        self.entries = {}
+
+    def changed_settings(self, fingerprint: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        比较配置指纹，返回与清单记录相比发生变化的部分
+
+        Args:
+            fingerprint: 本次入库的配置指纹，按部分（如 "embedding"、"splitter"）分组
+
+        Returns:
+            List[str]: 变化的部分名称（升序）；清单中没有记录指纹（新清单或旧版本的清单）时为空
+        """
+        if not self.fingerprint:
+            return []
+        names = set(self.fingerprint) | set(fingerprint)
+        return sorted(name for name in names if self.fingerprint.get(name) != fingerprint.get(name))
+
+    def invalidate(self) -> None:
+        """将所有有效记录标记为需要重新入库（清空内容哈希），保留文本块ID，重新入库后删除不再使用的文本块"""
+        for entry in self.entries.values():
+            if entry.deleted_at is None:
+                entry.content_hash = ""
+
+    @staticmethod
+    def hash_file(file_path: str, block_size: int = 1024 * 1024) -> str:
+        """
+        分块计算文件内容的 SHA-256
+
+        Args:
+            file_path: 文件路径
+            block_size: 每次读取的字节数
+
+        Returns:
+            str: 十六进制摘要
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def check(self, relative_path: str, file_path: str) -> Optional[ManifestEntry]:
+        """
+        检查文件自上次入库以来是否变化
+
+        先比较大小和修改时间，不一致时再比较内容哈希；内容未变时只更新修改时间。
+
+        Args:
+            relative_path: 相对路径
+            file_path: 文件路径
+
+        Returns:
+            Optional[ManifestEntry]: 文件未变化时返回 None；否则返回待入库的新记录（chunk_ids 为空）
+        """
+        stat = os.stat(file_path)
+        entry = self.entries.get(relative_path)
+        if entry is not None and entry.deleted_at is None and entry.content_hash:
+            if entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+                return None
+            content_hash = self.hash_file(file_path)
+            if entry.content_hash == content_hash:
+                entry.size = stat.st_size
+                entry.mtime = stat.st_mtime
+                return None
+        else:
+            content_hash = self.hash_file(file_path)
+
+        return ManifestEntry(
+            relative_path=relative_path,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            content_hash=content_hash
+        )
+
+    def stale_chunk_ids(self, relative_path: str) -> List[str]:
+        """
+        返回文件上一次入库写入的文本块ID（重新入库前需要删除）
+
+        Args:
+            relative_path: 相对路径
+
+        Returns:
+            List[str]: 文本块ID列表
+        """
+        entry = self.entries.get(relative_path)
+        return list(entry.chunk_ids) if entry is not None else []
+
+    def commit(self, entry: ManifestEntry, chunk_ids: List[str], complete: bool = True) -> None:
+        """
+        记录文件入库结果
+
+        Args:
+            entry: check 返回的新记录
+            chunk_ids: 实际写入向量数据库的文本块ID
+            complete: 是否所有文本块都写入成功；不完整时清空内容哈希，下次运行会重新处理
+        """
+        entry.chunk_ids = list(chunk_ids)
+        entry.indexed_at = time.time()
+        entry.deleted_at = None
+        if not complete:
+            entry.content_hash = ""
+        self.entries[entry.relative_path] = entry
+
+    def missing(self, seen_paths: set) -> List[ManifestEntry]:
+        """
+        返回清单中仍有效、但本次遍历未见到（已从磁盘删除）的文件记录
+
+        Args:
+            seen_paths: 本次遍历到的相对路径集合
+
+        Returns:
+            List[ManifestEntry]: 需要打墓碑标记的记录
+        """
+        return [
+            entry for rel, entry in self.entries.items()
+            if entry.deleted_at is None and rel not in seen_paths
+        ]
+
+    def tombstone(self, relative_path: str) -> None:
+        """
+        将文件标记为已删除，并清空其文本块ID
+
+        Args:
+            relative_path: 相对路径
+        """
+        entry = self.entries.get(relative_path)
+        if entry is not None:
+            entry.chunk_ids = []
+            entry.content_hash = ""
+            entry.deleted_at = time.time()
+
+    def has_chunks(self) -> bool:
+        """清单中是否记录了任何已入库的文本块"""
+        return any(entry.chunk_ids for entry in self.entries.values())
@@ -0,0 +1,677 @@
+import os
+import multiprocessing
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from readers.dir_reader import DirReader, read_with_reader
+from rules.split_base_rule import SplitRule
+from tools.chunk_index import ChunkIndex
+
+if TYPE_CHECKING:
+    # 仅用于类型提示，避免在读取/切分子进程中导入 chromadb、ollama 等重量级依赖
+    from tools.ingest_journal import IngestJournal
+    from tools.vector_store import VectorStore
+    from utils.llm import LLM
+
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_SENTINEL = object()
+
+
+def iter_documents(file_data: Dict[str, Any], splitter: SplitRule) -> Iterator[Dict[str, Any]]:
+    """
+    流式切分单个文件内容，逐个产出待向量化的文档
+
+    Args:
+        file_data: 包含元数据以及文本块迭代器（blocks，流式读取）或完整内容（content）的字典
+        splitter: 文件类型对应的切分规则
+
+    Yields:
+        Dict[str, Any]: 包含 id、content、metadata 的文档（尚未包含向量）
+    """
+    metadata = file_data["metadata"]
+    file_type = metadata["file_type"]
+    blocks = file_data["blocks"] if "blocks" in file_data else [file_data["content"]]
+
+    for chunk in splitter.iter_process(blocks, file_type):
+        # 文本块只保存位置，文本在这里生成一次；之后的向量化和写入都只传递这个字符串的引用
+        content = chunk["content"]
+        # ID 由内容哈希得到，相同的文本在集合中只存储一次，重复入库也是幂等的
+        doc_id = ChunkIndex.chunk_id(content)
+        doc_metadata = metadata.copy()
+        doc_metadata.update(chunk["metadata"])
+        doc_metadata["chunk_id"] = doc_id
+
+        yield {
+            "id": doc_id,
+            "content": content,
+            "metadata": doc_metadata
+        }
+
+
+# 读取/切分子进程向主进程传递文本块的有界队列，以及按文件类型的切分规则，通过进程池的 initializer 传入。
+# 切分规则每个子进程只反序列化一次，打包模式的分词器在子进程中只加载一次，而不是每个文件加载一次
+_chunk_queue: Optional["multiprocessing.Queue"] = None
+_split_rules: Dict[str, SplitRule] = {}
+
+
+def _init_read_worker(chunk_queue: "multiprocessing.Queue", split_rules: Dict[str, SplitRule]) -> None:
+    """读取/切分子进程的初始化函数"""
+    global _chunk_queue, _split_rules
+    _chunk_queue = chunk_queue
+    _split_rules = split_rules
+
+
+def read_and_split(task_id: int, file_path: str, relative_path: str, reader_spec: Tuple[str, str],
+                   encoding: str, file_type: str, block_size: int, group_size: int) -> None:
+    """
+    流式读取并切分单个文件，文本块按 group_size 分组放入进程池共享的有界队列。在读取/切分进程池中执行。
+
+    队列中的消息为 (task_id, 类型, 数据)：
+        chunks: 一组文档
+        done: 文件切分结束，数据为文本块总数
+        error: 读取或切分失败，数据为错误信息
+
+    队列已满时子进程阻塞，单个文件在内存中最多只有一组文档，与文件大小无关。
+
+    Args:
+        task_id: 任务编号，原样写入消息
+        file_path: 文件路径
+        relative_path: 相对路径
+        reader_spec: (读取器模块名, 读取器类名)
+        encoding: 默认编码
+        file_type: 文件类型，用于选择子进程中的切分规则
+        block_size: 流式读取时每块的字符数
+        group_size: 每组的文档数
+    """
+    total = 0
+    group: List[Dict[str, Any]] = []
+    try:
+        file_data = read_with_reader(file_path, relative_path, reader_spec, encoding, stream=True, block_size=block_size)
+        for document in iter_documents(file_data, _split_rules[file_type]):
+            group.append(document)
+            if len(group) >= group_size:
+                _chunk_queue.put((task_id, "chunks", group))
+                total += len(group)
+                group = []
+    except Exception as e:
+        _chunk_queue.put((task_id, "error", str(e)))
+        return
+    if group:
+        _chunk_queue.put((task_id, "chunks", group))
+        total += len(group)
+    _chunk_queue.put((task_id, "done", total))
+
+
+class ByteBudget:
+    """在途文本字节数的上限。生产者在入队前申请额度，写入完成后释放，超出上限时生产者阻塞。"""
+
+    def __init__(self, limit: int):
+        """
+        Args:
+            limit: 允许同时在途的最大字节数
+        """
+        if limit <= 0:
+            raise ValueError(f"limit 必须为正整数: {limit}")
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        申请额度。单个请求超过上限时，在没有其他在途数据时放行，避免死锁。
+
+        Args:
+            size: 申请的字节数
+            stop_event: 流水线停止事件，被设置时放弃等待
+
+        Returns:
+            bool: 是否申请成功（流水线停止时返回 False）
+        """
+        with self._condition:
+            while self.used > 0 and self.used + size > self.limit:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                self._condition.wait(timeout=0.5)
+            self.used += size
+            return True
+
+    def release(self, size: int) -> None:
+        """释放额度"""
+        with self._condition:
+            self.used -= size
+            self._condition.notify_all()
+
+
+class FileTracker:
+    """跟踪每个文件尚未落盘的文本块，文件的全部文本块写入（或失败）后触发回调。
+
+    同一文件的文本块可能分散在多个批次中，并由不同的向量化线程乱序处理；流式切分时，
+    文件的前几批文本块甚至可能在切分结束前就已写入，因此按计数判断完成。
+    """
+
+    def __init__(self, on_file_done: Optional[Callable[[Any, Dict[str, Dict[str, Any]], bool], None]],
+                 deduplicator: Optional["ChunkDeduplicator"] = None):
+        """
+        Args:
+            on_file_done: 文件完成后的回调，参数为 (标记, 已写入的文本块ID -> 该文件中这个文本块的元数据, 是否全部成功)
+            deduplicator: 本次入库的去重器；文本块写入（或失败）时，一并结算等待它的重复文本块
+        """
+        self._on_file_done = on_file_done
+        self._deduplicator = deduplicator
+        self._lock = threading.Lock()
+        # relative_path -> [标记, 文本块总数（切分结束前为 None）, 已写入的ID -> 元数据, 已写入数, 失败数, 是否切分完整]
+        self._files: Dict[str, list] = {}
+
+    def open(self, relative_path: str, token: Any) -> None:
+        """登记开始切分的文件"""
+        with self._lock:
+            self._files[relative_path] = [token, None, {}, 0, 0, True]
+
+    def close(self, relative_path: str, total: int, complete: bool = True) -> None:
+        """
+        文件切分结束，记录文本块总数
+
+        Args:
+            relative_path: 相对路径
+            total: 已交给下游的文本块数
+            complete: 是否切分完整；切分中途失败时为 False，等这些文本块写入（或失败）后以不完整结束
+        """
+        with self._lock:
+            self._files[relative_path][1] = total
+            self._files[relative_path][5] = complete
+            completed = self._pop_if_done(relative_path)
+        if completed:
+            self._notify(*completed)
+
+    def settle(self, written: List[Dict[str, Any]], failed: List[Dict[str, Any]]) -> None:
+        """记录一批已写入和向量化失败的文本块，并对已全部完成的文件触发回调"""
+        if self._deduplicator is not None:
+            waiting_written, waiting_failed = self._deduplicator.resolve(written, failed)
+            written = written + waiting_written
+            failed = failed + waiting_failed
+        completed = []
+        with self._lock:
+            touched = set()
+            for doc in written:
+                relative_path = doc["metadata"]["relative_path"]
+                entry = self._files[relative_path]
+                # 文件内重复的文本块保留第一次出现的元数据
+                entry[2].setdefault(doc["id"], doc["metadata"])
+                entry[3] += 1
+                touched.add(relative_path)
+            for doc in failed:
+                relative_path = doc["metadata"]["relative_path"]
+                self._files[relative_path][4] += 1
+                touched.add(relative_path)
+            for relative_path in touched:
+                done = self._pop_if_done(relative_path)
+                if done:
+                    completed.append(done)
+        for done in completed:
+            self._notify(*done)
+
+    def discard(self, documents: List[Dict[str, Any]]) -> None:
+        """
+        丢弃尚未交给向量化的原始文本块（所属文件切分失败），不计入文件进度；等待它们的重复文本块按失败结算
+
+        Args:
+            documents: ChunkDeduplicator.split 返回的需要向量化的文档
+        """
+        if self._deduplicator is not None:
+            failed = self._deduplicator.forget(documents)
+            if failed:
+                self.settle([], failed)
+
+    def _pop_if_done(self, relative_path: str) -> Optional[Tuple[Any, Dict[str, Dict[str, Any]], bool]]:
+        token, expected, written, written_count, failed_count, complete = self._files[relative_path]
+        if expected is None or written_count + failed_count < expected:
+            return None
+        del self._files[relative_path]
+        return token, written, complete and failed_count == 0
+
+    def _notify(self, token: Any, written: Dict[str, Dict[str, Any]], complete: bool) -> None:
+        if self._on_file_done is not None:
+            self._on_file_done(token, written, complete)
+
+
+class ChunkDeduplicator:
+    """本次入库中按内容哈希ID去重。
+
+    每个文本块ID只有第一次出现的文档（原始文本块）交给向量化；之后出现的重复文档等原始文本块写入向量数据库后
+    才算作已写入，原始文本块向量化或写入失败时一并失败，避免文件记录了从未写入的文本块。
+    本次入库之前是否已存储以向量数据库中实际存在为准，而不是引用索引。
+    """
+
+    # 文本块状态
+    PENDING = 0
+    STORED = 1
+    FAILED = 2
+
+    def __init__(self, stored_ids: Callable[[List[str]], Set[str]]):
+        """
+        Args:
+            stored_ids: 返回其中已写入向量数据库的文本块ID
+        """
+        self._stored_ids = stored_ids
+        self._lock = threading.Lock()
+        # 文本块ID -> [状态, 等待该文本块写入的重复文档]
+        self._chunks: Dict[str, list] = {}
+        # 本次入库中出现过的全部文本块ID，其中不再被引用的文本块推迟到入库结束时再删除
+        self.scheduled: Set[str] = set()
+
+    def split(self, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        把文档分成需要向量化的原始文本块和重复的文本块，后者不再向量化
+
+        Args:
+            documents: 文档列表
+
+        Returns:
+            Tuple: (需要向量化的文档, 已可视为写入的重复文档, 原始文本块已失败的重复文档)；
+                其余重复文档在原始文本块写入（或失败）后由 resolve 返回
+        """
+        unseen = [doc["id"] for doc in documents if doc["id"] not in self._chunks]
+        stored = self._stored_ids(unseen) if unseen else set()
+        fresh, written, failed = [], [], []
+        with self._lock:
+            for doc in documents:
+                doc_id = doc["id"]
+                self.scheduled.add(doc_id)
+                state = self._chunks.get(doc_id)
+                if state is None:
+                    if doc_id in stored:
+                        self._chunks[doc_id] = [self.STORED, []]
+                        written.append(doc)
+                    else:
+                        self._chunks[doc_id] = [self.PENDING, []]
+                        fresh.append(doc)
+                elif state[0] == self.STORED:
+                    written.append(doc)
+                elif state[0] == self.FAILED:
+                    failed.append(doc)
+                else:
+                    state[1].append(doc)
+        return fresh, written, failed
+
+    def resolve(self, written: List[Dict[str, Any]],
+                failed: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        记录原始文本块已写入或失败，返回等待它们的重复文档
+
+        Args:
+            written: 已写入向量数据库的文档
+            failed: 向量化或写入失败的文档
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: (随之写入的重复文档, 随之失败的重复文档)
+        """
+        waiting_written, waiting_failed = [], []
+        with self._lock:
+            for docs, status, waiting in ((written, self.STORED, waiting_written),
+                                          (failed, self.FAILED, waiting_failed)):
+                for doc in docs:
+                    state = self._chunks.get(doc["id"])
+                    if state is None or state[0] != self.PENDING:
+                        continue
+                    state[0] = status
+                    waiting.extend(state[1])
+                    state[1] = []
+        return waiting_written, waiting_failed
+
+    def forget(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        撤销尚未交给向量化的原始文本块，之后再出现相同的文本块时重新向量化
+
+        Args:
+            documents: split 返回的需要向量化的文档
+
+        Returns:
+            List[Dict[str, Any]]: 等待这些文本块的重复文档，按失败结算
+        """
+        failed = []
+        with self._lock:
+            for doc in documents:
+                state = self._chunks.get(doc["id"])
+                if state is not None and state[0] == self.PENDING:
+                    failed.extend(state[1])
+                    del self._chunks[doc["id"]]
+        return failed
+
+
+def _documents_size(documents: List[Dict[str, Any]]) -> int:
+    """估算文档列表占用的文本字节数"""
+    return sum(len(doc["content"]) for doc in documents)
+
+
+class IngestPipeline:
+    """并行分阶段的目录入库流水线。
+
+    读取/切分 -> 向量化 -> 写入 三个阶段之间通过有界队列连接：
+    - 读取和切分在进程池中执行；
+    - 多个向量化线程并发调用 LLM.embed_batch；
+    - 单个写入线程把多个文件的文档攒成大批次写入 VectorStore。
+    在途文本总量受 max_inflight_bytes 限制，下游变慢时上游自动阻塞。
+    """
+
+    # 写入线程在上游空闲超过该时长（秒）时写出已缓冲的文档
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self,
+                 llm: "LLM",
+                 vector_store: "VectorStore",
+                 dir_reader: DirReader,
+                 split_rules: Dict[str, SplitRule],
+                 read_workers: int = 0,
+                 embed_workers: int = 4,
+                 embed_batch_size: int = 32,
+                 write_batch_size: int = 256,
+                 queue_size: int = 16,
+                 max_inflight_bytes: int = 256 * 1024 * 1024):
+        """
+        初始化入库流水线
+
+        Args:
+            llm: 用于向量化的 LLM 实例
+            vector_store: 向量数据库
+            dir_reader: 目录读取器，用于遍历文件和确定读取器
+            split_rules: 文件类型到切分规则的映射
+            read_workers: 读取/切分进程数，0 表示使用 CPU 核数
+            embed_workers: 向量化线程数
+            embed_batch_size: 每个向量化批次的文档数
+            write_batch_size: 每次写入向量数据库的文档数
+            queue_size: 阶段间队列的最大长度
+            max_inflight_bytes: 在途文本的最大字节数
+        """
+        self.llm = llm
+        self.vector_store = vector_store
+        self.dir_reader = dir_reader
+        self.split_rules = split_rules
+        self.read_workers = read_workers or os.cpu_count() or 1
+        self.embed_workers = max(1, embed_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.write_batch_size = max(1, write_batch_size)
+        self.queue_size = max(1, queue_size)
+        self.budget = ByteBudget(max_inflight_bytes)
+
+        self._stop_event = threading.Event()
+        self._errors: List[BaseException] = []
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+
+    def _fail(self, error: BaseException) -> None:
+        """记录致命错误并通知所有阶段停止"""
+        logger.error(f"入库流水线出错: {error}")
+        self._errors.append(error)
+        self._stop_event.set()
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    def _put(self, target: "queue.Queue", item: Any) -> bool:
+        """向有界队列放入数据，队列满时阻塞；流水线停止时返回 False"""
+        while not self._stop_event.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self, directory_path: str, collection_name: str,
+            prepare_file: Optional[Callable[[str, str], Optional[Any]]] = None,
+            on_file_done: Optional[Callable[[Any, Dict[str, Dict[str, Any]], bool], None]] = None,
+            journal: Optional["IngestJournal"] = None,
+            deduplicator: Optional[ChunkDeduplicator] = None) -> Dict[str, int]:
+        """
+        处理目录下的所有文档
+
+        Args:
+            directory_path: 文档目录
+            collection_name: 向量数据库集合名称
+            prepare_file: 文件提交读取前在生产者线程中调用，参数为 (文件路径, 相对路径)，
+                返回 None 表示跳过该文件，否则返回该文件的标记
+            on_file_done: 文件的全部文本块写入（或失败）后调用，参数为 (标记, 已写入的文本块ID -> 元数据, 是否全部成功)；
+                通常在写入线程中调用
+            journal: 检查点日志，每批写入前记录，用于崩溃后回滚未完成文件的文本块
+            deduplicator: 本次入库的去重器，在生产者线程中去重；重复的文本块不再向量化和写入，
+                随原始文本块写入（或失败）
+
+        Returns:
+            Dict[str, int]: 各阶段的计数统计
+
+        Raises:
+            RuntimeError: 任一阶段出现致命错误时抛出
+        """
+        self.stats = {"files": 0, "failed_files": 0, "chunks": 0, "deduplicated": 0, "embedded": 0,
+                      "failed_chunks": 0, "written": 0}
+        self._stop_event.clear()
+        self._errors = []
+        self._tracker = FileTracker(on_file_done, deduplicator)
+        self._journal = journal
+        embed_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        write_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        started = time.perf_counter()
+
+        embedders = [
+            threading.Thread(target=self._embed_loop, args=(embed_queue, write_queue), name=f"ingest-embed-{i}", daemon=True)
+            for i in range(self.embed_workers)
+        ]
+        writer = threading.Thread(target=self._write_loop, args=(write_queue, collection_name), name="ingest-writer", daemon=True)
+        for thread in embedders:
+            thread.start()
+        writer.start()
+
+        try:
+            self._produce(directory_path, embed_queue, prepare_file, deduplicator)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            for _ in embedders:
+                self._put(embed_queue, _SENTINEL) or embed_queue.put(_SENTINEL)
+            for thread in embedders:
+                thread.join()
+            self._put(write_queue, _SENTINEL) or write_queue.put(_SENTINEL)
+            writer.join()
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"入库流水线完成: {self.stats}，耗时 {elapsed:.2f}s")
+        if self._errors:
+            raise RuntimeError(f"入库流水线失败: {self._errors[0]}") from self._errors[0]
+        return self.stats
+
+    def _produce(self, directory_path: str, embed_queue: "queue.Queue",
+                 prepare_file: Optional[Callable[[str, str], Optional[Any]]],
+                 deduplicator: Optional[ChunkDeduplicator] = None) -> None:
+        """读取/切分阶段：在进程池中并行处理文件，子进程流式产出的文本块在这里重新组合成向量化批次"""
+        pending: List[Dict[str, Any]] = []
+        max_in_flight = self.read_workers * 2
+        # task_id -> [Future, 文件路径, 相对路径, 已交给下游的文本块数]
+        tasks: Dict[int, list] = {}
+
+        def emit(documents: List[Dict[str, Any]]) -> bool:
+            size = _documents_size(documents)
+            if not self.budget.acquire(size, self._stop_event):
+                return False
+            if not self._put(embed_queue, (documents, size)):
+                self.budget.release(size)
+                return False
+            return True
+
+        def fail(task_id: int, message: str) -> None:
+            nonlocal pending
+            _, file_path, relative_path, count = tasks.pop(task_id)
+            print(f"处理文件 {file_path} 时出错: {message}")
+            self._count("failed_files")
+            # 丢弃该文件尚未交给向量化的文本块，已交出的写入（或失败）后以不完整结束，下次运行时重新处理
+            dropped = [doc for doc in pending if doc["metadata"]["relative_path"] == relative_path]
+            pending = [doc for doc in pending if doc["metadata"]["relative_path"] != relative_path]
+            self._tracker.discard(dropped)
+            self._tracker.close(relative_path, count - len(dropped), complete=False)
+
+        def handle(message: Tuple[int, str, Any]) -> bool:
+            nonlocal pending
+            task_id, kind, payload = message
+            if task_id not in tasks:
+                # 子进程异常退出后已按失败处理的文件
+                return True
+            task = tasks[task_id]
+            if kind == "error":
+                fail(task_id, payload)
+            elif kind == "done":
+                del tasks[task_id]
+                self._count("files")
+                self._tracker.close(task[2], task[3])
+            else:
+                documents = payload
+                task[3] += len(documents)
+                self._count("chunks", len(documents))
+                if deduplicator is not None:
+                    fresh, written, failed = deduplicator.split(documents)
+                    self._count("deduplicated", len(documents) - len(fresh))
+                    if written or failed:
+                        self._tracker.settle(written, failed)
+                    documents = fresh
+                pending.extend(documents)
+                while len(pending) >= self.embed_batch_size:
+                    batch, pending = pending[:self.embed_batch_size], pending[self.embed_batch_size:]
+                    if not emit(batch):
+                        return False
+            return True
+
+        def receive() -> bool:
+            try:
+                message = chunk_queue.get(timeout=0.5)
+            except queue.Empty:
+                # 子进程被杀死时不会发送 error 消息，只能从 Future 得知
+                for task_id, task in list(tasks.items()):
+                    if task[0].done() and task[0].exception() is not None:
+                        fail(task_id, str(task[0].exception()))
+                return True
+            return handle(message)
+
+        # 流水线中已有运行的线程，使用 spawn 启动子进程以避免 fork 继承线程锁状态
+        context = multiprocessing.get_context("spawn")
+        # 队列中最多缓存 queue_size 组文本块，主进程来不及处理时子进程阻塞，切分结果不会在内存中堆积
+        chunk_queue = context.Queue(maxsize=self.queue_size)
+        with ProcessPoolExecutor(max_workers=self.read_workers, mp_context=context,
+                                 initializer=_init_read_worker, initargs=(chunk_queue, self.split_rules)) as executor:
+            try:
+                for task_id, (file_path, relative_path) in enumerate(self.dir_reader.iter_files(directory_path)):
+                    if self._stop_event.is_set():
+                        break
+                    reader_spec = self.dir_reader.get_reader_spec(file_path)
+                    file_type = os.path.splitext(file_path)[1][1:].lower()
+                    if not reader_spec or file_type not in self.split_rules:
+                        print(f"不支持的切分规则类型: {file_type}，跳过文件: {file_path}")
+                        continue
+                    token = prepare_file(file_path, relative_path) if prepare_file else relative_path
+                    if token is None:
+                        continue
+                    self._tracker.open(relative_path, token)
+                    tasks[task_id] = [executor.submit(
+                        read_and_split, task_id, file_path, relative_path, reader_spec,
+                        self.dir_reader.default_encoding, file_type, self.dir_reader.block_size, self.embed_batch_size
+                    ), file_path, relative_path, 0]
+
+                    # 限制已提交但未完成的文件数
+                    while len(tasks) >= max_in_flight and not self._stop_event.is_set():
+                        if not receive():
+                            break
+
+                while tasks and not self._stop_event.is_set():
+                    if not receive():
+                        break
+            finally:
+                for task in tasks.values():
+                    task[0].cancel()
+                # 流水线停止时子进程可能阻塞在已满的队列上，丢弃剩余的消息直到它们全部结束
+                while any(not task[0].done() for task in tasks.values()):
+                    try:
+                        chunk_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+        chunk_queue.close()
+
+        if pending and not self._stop_event.is_set():
+            emit(pending)
+
+    def _embed_loop(self, embed_queue: "queue.Queue", write_queue: "queue.Queue") -> None:
+        """向量化阶段：多个线程并发调用 LLM.embed_batch"""
+        while True:
+            item = embed_queue.get()
+            if item is _SENTINEL:
+                return
+            documents, size = item
+            if self._stop_event.is_set():
+                self.budget.release(size)
+                continue
+            try:
+                batch = self.llm.embed_batch([doc["content"] for doc in documents])
+            except Exception as e:
+                print(f"{len(documents)} 个文本块向量化失败: {e}，跳过存储。")
+                self._count("failed_chunks", len(documents))
+                if not self._put(write_queue, ([], documents, size)):
+                    self.budget.release(size)
+                continue
+
+            embedded, failed = [], []
+            for index, (doc, embedding) in enumerate(zip(documents, batch.embeddings)):
+                if embedding is not None and len(embedding) > 0:
+                    doc["vector"] = embedding
+                    embedded.append(doc)
+                else:
+                    print(f"文本块 {doc['id']} 向量化失败: {batch.errors.get(index)}，跳过存储。")
+                    failed.append(doc)
+            self._count("embedded", len(embedded))
+            self._count("failed_chunks", len(failed))
+            # 失败的文本块也交给写入线程，用于判断文件是否处理完成
+            if not self._put(write_queue, (embedded, failed, size)):
+                self.budget.release(size)
+
+    def _write_loop(self, write_queue: "queue.Queue", collection_name: str) -> None:
+        """写入阶段：单线程攒批写入向量数据库"""
+        buffer: List[Dict[str, Any]] = []
+        failed: List[Dict[str, Any]] = []
+        buffered_size = 0
+
+        def flush() -> None:
+            nonlocal buffer, failed, buffered_size
+            try:
+                if self._stop_event.is_set():
+                    return
+                if buffer:
+                    if self._journal:
+                        self._journal.begin_batch([doc["id"] for doc in buffer])
+                    self.vector_store.add_documents(collection_name, buffer)
+                    self._count("written", len(buffer))
+                self._tracker.settle(buffer, failed)
+            except Exception as e:
+                self._fail(e)
+            finally:
+                self.budget.release(buffered_size)
+                buffer, failed, buffered_size = [], [], 0
+
+        while True:
+            try:
+                item = write_queue.get(timeout=self.FLUSH_INTERVAL)
+            except queue.Empty:
+                # 上游暂时没有数据（可能正因额度不足而阻塞），先写出已缓冲的文档释放额度
+                flush()
+                continue
+            if item is _SENTINEL:
+                flush()
+                return
+            documents, failed_documents, size = item
+            buffer.extend(documents)
+            failed.extend(failed_documents)
+            buffered_size += size
+            # 缓冲的文本占用过半额度时提前写出，避免生产者长时间等待额度
+            if len(buffer) >= self.write_batch_size or buffered_size >= self.budget.limit // 2:
+                flush()
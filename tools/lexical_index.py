@@ -0,0 +1,474 @@
+import os
+import re
+import json
+import glob
+import math
+import shutil
+import threading
+import unicodedata
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.vector_store import VectorStore, WriteObserver
+
+logger = logging.getLogger(__name__)
+
+# CJK 文字：中日韩统一表意文字（含扩展A）、兼容表意文字、假名、谚文
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af"
+# CJK 片段，或由字母数字组成、可以用 . _ - / : # 连接的词（标识符、版本号、错误码）
+_TOKEN = re.compile(rf"(?P<cjk>[{_CJK}]+)|(?P<word>[^\W_{_CJK}]+(?:[._\-/:#][^\W_{_CJK}]+)*)")
+_WORD_PART = re.compile(rf"[^\W_{_CJK}]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    词法索引的分词：NFKC 规范化（全角转半角）并转小写后，CJK 片段切成相邻两字的二元组（单字片段保留单字），
+    其他文字按词切分；带连接符的词（ERR-1024、v2.3.1、foo_bar）既作为整体，也拆成各部分
+
+    Args:
+        text: 文本
+
+    Returns:
+        List[str]: 词项列表（可重复）
+    """
+    tokens: List[str] = []
+    for match in _TOKEN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        piece = match.group()
+        if match.lastgroup == "cjk":
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+            parts = _WORD_PART.findall(piece)
+            if len(parts) > 1:
+                tokens.extend(parts)
+    return tokens
+
+
+class _Segment:
+    """不可变的索引段：按词项排序的倒排表。
+
+    倒排表为定长数组：文档序号 uint32、词频 uint16，按词项连续存放，post_offsets 给出每个词项的范围；
+    词项和文档ID以 UTF-8 拼接存放并记录偏移。整个段用 np.savez 保存为一个 .npz 文件。
+    """
+
+    def __init__(self, terms: List[str], post_offsets: np.ndarray, post_ords: np.ndarray, post_tfs: np.ndarray,
+                 doc_ords: np.ndarray, doc_lens: np.ndarray, doc_ids: List[str]):
+        self.terms = terms
+        self.term_index = {term: i for i, term in enumerate(terms)}
+        self.post_offsets = post_offsets
+        self.post_ords = post_ords
+        self.post_tfs = post_tfs
+        self.doc_ords = doc_ords
+        self.doc_lens = doc_lens
+        self.doc_ids = doc_ids
+
+    @staticmethod
+    def _pack(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    @staticmethod
+    def _unpack(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+        data = blob.tobytes()
+        return [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    @classmethod
+    def build(cls, postings: Dict[str, Tuple[List[int], List[int]]],
+              doc_ords: List[int], doc_lens: List[int], doc_ids: List[str]) -> "_Segment":
+        """由内存中的倒排表构建段"""
+        terms = sorted(postings)
+        counts = [len(postings[term][0]) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        ords = np.fromiter((o for term in terms for o in postings[term][0]), dtype=np.uint32, count=int(offsets[-1]))
+        tfs = np.fromiter((t for term in terms for t in postings[term][1]), dtype=np.uint16, count=int(offsets[-1]))
+        return cls(terms, offsets, ords, tfs, np.asarray(doc_ords, dtype=np.uint32),
+                   np.asarray(doc_lens, dtype=np.uint32), list(doc_ids))
+
+    @classmethod
+    def merge(cls, segments: List["_Segment"], alive: np.ndarray) -> "_Segment":
+        """合并多个段，去掉已删除的文档"""
+        vocabulary = sorted(set().union(*(segment.terms for segment in segments)))
+        index = {term: i for i, term in enumerate(vocabulary)}
+        term_ids = np.concatenate([
+            np.repeat(np.fromiter((index[term] for term in segment.terms), dtype=np.int64, count=len(segment.terms)),
+                      np.diff(segment.post_offsets))
+            for segment in segments
+        ])
+        ords = np.concatenate([segment.post_ords for segment in segments])
+        tfs = np.concatenate([segment.post_tfs for segment in segments])
+        keep = alive[ords]
+        term_ids, ords, tfs = term_ids[keep], ords[keep], tfs[keep]
+        order = np.lexsort((ords, term_ids))
+        term_ids, ords, tfs = term_ids[order], ords[order], tfs[order]
+
+        counts = np.bincount(term_ids, minlength=len(vocabulary))
+        used = np.flatnonzero(counts)
+        offsets = np.zeros(len(used) + 1, dtype=np.int64)
+        np.cumsum(counts[used], out=offsets[1:])
+
+        doc_ords = np.concatenate([segment.doc_ords for segment in segments])
+        doc_lens = np.concatenate([segment.doc_lens for segment in segments])
+        doc_ids = [doc_id for segment in segments for doc_id in segment.doc_ids]
+        live_docs = alive[doc_ords]
+        return cls([vocabulary[i] for i in used], offsets, ords, tfs, doc_ords[live_docs], doc_lens[live_docs],
+                   [doc_id for doc_id, live in zip(doc_ids, live_docs) if live])
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        i = self.term_index.get(term)
+        if i is None:
+            return None
+        start, end = self.post_offsets[i], self.post_offsets[i + 1]
+        return self.post_ords[start:end], self.post_tfs[start:end]
+
+    def save(self, path: str) -> None:
+        term_blob, term_offsets = self._pack(self.terms)
+        id_blob, id_offsets = self._pack(self.doc_ids)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, term_blob=term_blob, term_offsets=term_offsets, post_offsets=self.post_offsets,
+                     post_ords=self.post_ords, post_tfs=self.post_tfs, doc_ords=self.doc_ords,
+                     doc_lens=self.doc_lens, id_blob=id_blob, id_offsets=id_offsets)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "_Segment":
+        with np.load(path) as data:
+            return cls(cls._unpack(data["term_blob"], data["term_offsets"]), data["post_offsets"],
+                       data["post_ords"], data["post_tfs"], data["doc_ords"], data["doc_lens"],
+                       cls._unpack(data["id_blob"], data["id_offsets"]))
+
+
+class _LexicalCollection:
+    """单个集合的 BM25 索引：磁盘上的若干段 + 内存中尚未保存的新文档。
+
+    每个文档分配一个递增的序号；删除只把序号标记为失效，已删除的序号随 index.json 保存在 deleted.<n>.npy 中。
+    commit 时把内存中的文档写成新段，段数超过 max_segments 或已删除的文档超过 merge_ratio 时合并为一个段。
+    index.json 通过临时文件替换原子更新，其中列出的段和删除列表构成一次完整的提交。
+    """
+
+    def __init__(self, directory: str, options: Dict[str, Any]):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.options = options
+        self.lock = threading.RLock()
+        self.segments: List[Tuple[int, _Segment]] = []
+        self.id_to_ord: Dict[str, int] = {}
+        self.ord_to_id: Dict[int, str] = {}
+        self.alive = np.zeros(1024, dtype=bool)
+        self.lengths = np.zeros(1024, dtype=np.uint32)
+        self.next_ord = 0
+        self.next_segment = 0
+        self.commit_number = 0
+        self.total_length = 0
+        self._reset_buffer()
+        self.dirty = False
+        self._load()
+
+    def _reset_buffer(self) -> None:
+        self.buffer_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self.buffer_ords: List[int] = []
+        self.buffer_lens: List[int] = []
+        self.buffer_ids: List[str] = []
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _load(self) -> None:
+        if not os.path.exists(self._manifest_path()):
+            return
+        with open(self._manifest_path(), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.next_ord = manifest["next_ord"]
+        self.next_segment = manifest["next_segment"]
+        self.commit_number = manifest["commit"]
+        self._grow(self.next_ord)
+        for number in manifest["segments"]:
+            segment = _Segment.load(os.path.join(self.directory, f"seg.{number}.npz"))
+            self.segments.append((number, segment))
+            self.alive[segment.doc_ords] = True
+            self.lengths[segment.doc_ords] = segment.doc_lens
+            for doc_ord, doc_id in zip(segment.doc_ords.tolist(), segment.doc_ids):
+                self.id_to_ord[doc_id] = doc_ord
+        if manifest["deleted"]:
+            self.alive[np.load(os.path.join(self.directory, manifest["deleted"]))] = False
+        for doc_id, doc_ord in list(self.id_to_ord.items()):
+            if self.alive[doc_ord]:
+                self.ord_to_id[doc_ord] = doc_id
+            else:
+                del self.id_to_ord[doc_id]
+        self.total_length = int(self.lengths[:self.next_ord][self.alive[:self.next_ord]].sum())
+
+    def _grow(self, size: int) -> None:
+        if size > len(self.alive):
+            capacity = max(size, 2 * len(self.alive))
+            self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+            self.lengths = np.concatenate([self.lengths, np.zeros(capacity - len(self.lengths), dtype=np.uint32)])
+
+    def count(self) -> int:
+        return len(self.id_to_ord)
+
+    # ---- 写入 ----
+
+    def _remove(self, doc_id: str) -> None:
+        doc_ord = self.id_to_ord.pop(doc_id, None)
+        if doc_ord is not None:
+            del self.ord_to_id[doc_ord]
+            self.alive[doc_ord] = False
+            self.total_length -= int(self.lengths[doc_ord])
+            self.dirty = True
+
+    def add(self, ids: List[str], documents: List[str]) -> None:
+        with self.lock:
+            for doc_id, document in zip(ids, documents):
+                self._remove(doc_id)
+                tokens = Counter(tokenize(document or ""))
+                length = sum(tokens.values())
+                doc_ord = self.next_ord
+                self.next_ord += 1
+                self._grow(self.next_ord)
+                for term, tf in tokens.items():
+                    ords, tfs = self.buffer_postings.setdefault(term, ([], []))
+                    ords.append(doc_ord)
+                    tfs.append(min(tf, 65535))
+                self.buffer_ords.append(doc_ord)
+                self.buffer_lens.append(length)
+                self.buffer_ids.append(doc_id)
+                self.alive[doc_ord] = True
+                self.lengths[doc_ord] = length
+                self.id_to_ord[doc_id] = doc_ord
+                self.ord_to_id[doc_ord] = doc_id
+                self.total_length += length
+            self.dirty = True
+            if len(self.buffer_ords) >= self.options["buffer_docs"]:
+                self.commit()
+
+    def delete(self, ids: List[str]) -> None:
+        with self.lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def commit(self) -> None:
+        """把内存中的文档写成新段并原子地更新 index.json，必要时合并段"""
+        with self.lock:
+            if not self.dirty:
+                return
+            if self.buffer_ords:
+                segment = _Segment.build(self.buffer_postings, self.buffer_ords, self.buffer_lens, self.buffer_ids)
+                self.segments.append((self.next_segment, segment))
+                self.next_segment += 1
+                self._reset_buffer()
+
+            indexed = sum(len(segment.doc_ords) for _, segment in self.segments)
+            deleted = indexed - self.count()
+            if len(self.segments) > self.options["max_segments"] or (
+                    deleted and deleted > self.options["merge_ratio"] * indexed):
+                merged = _Segment.merge([segment for _, segment in self.segments], self.alive)
+                self.segments = [(self.next_segment, merged)]
+                self.next_segment += 1
+                logger.info(f"词法索引 {self.directory} 合并为 1 个段，去掉 {deleted} 个已删除的文档")
+
+            for number, segment in self.segments:
+                path = os.path.join(self.directory, f"seg.{number}.npz")
+                if not os.path.exists(path):
+                    segment.save(path)
+            self.commit_number += 1
+            deleted_file = None
+            # 只需记录仍在段中的已删除文档，合并时去掉的不再记录
+            indexed_ords = [segment.doc_ords for _, segment in self.segments]
+            indexed_ords = np.concatenate(indexed_ords) if indexed_ords else np.zeros(0, dtype=np.uint32)
+            dead = indexed_ords[~self.alive[indexed_ords]]
+            if len(dead):
+                deleted_file = f"deleted.{self.commit_number}.npy"
+                np.save(os.path.join(self.directory, deleted_file), dead)
+            manifest = {
+                "segments": [number for number, _ in self.segments],
+                "next_ord": self.next_ord,
+                "next_segment": self.next_segment,
+                "commit": self.commit_number,
+                "deleted": deleted_file,
+            }
+            with open(self._manifest_path() + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self._manifest_path() + ".tmp", self._manifest_path())
+            self.dirty = False
+            self._remove_unused_files(manifest)
+
+    def _remove_unused_files(self, manifest: Dict[str, Any]) -> None:
+        used = {f"seg.{number}.npz" for number in manifest["segments"]} | {manifest["deleted"], "index.json"}
+        for path in glob.glob(os.path.join(self.directory, "*")):
+            if os.path.basename(path) not in used:
+                os.remove(path)
+
+    # ---- 查询 ----
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        ords, tfs = [], []
+        for _, segment in self.segments:
+            found = segment.postings(term)
+            if found is not None:
+                ords.append(found[0])
+                tfs.append(found[1])
+        if term in self.buffer_postings:
+            buffered = self.buffer_postings[term]
+            ords.append(np.asarray(buffered[0], dtype=np.uint32))
+            tfs.append(np.asarray(buffered[1], dtype=np.uint16))
+        if not ords:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16)
+        return np.concatenate(ords), np.concatenate(tfs)
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        with self.lock:
+            total_docs = self.count()
+            terms = Counter(tokenize(query))
+            if not total_docs or not terms or n_results <= 0:
+                return []
+            k1, b = self.options["k1"], self.options["b"]
+            average_length = max(self.total_length / total_docs, 1e-9)
+            all_ords, all_scores = [], []
+            for term, query_tf in terms.items():
+                ords, tfs = self._postings(term)
+                live = self.alive[ords]
+                ords, tfs = ords[live], tfs[live].astype(np.float64)
+                if not len(ords):
+                    continue
+                idf = math.log(1 + (total_docs - len(ords) + 0.5) / (len(ords) + 0.5))
+                norm = k1 * (1 - b + b * self.lengths[ords] / average_length)
+                all_ords.append(ords)
+                all_scores.append(query_tf * idf * tfs * (k1 + 1) / (tfs + norm))
+            if not all_ords:
+                return []
+            unique_ords, inverse = np.unique(np.concatenate(all_ords), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+            if n_results < len(scores):
+                top = np.argpartition(-scores, n_results - 1)[:n_results]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self.ord_to_id[int(unique_ords[i])], float(scores[i])) for i in top]
+
+
+class LexicalIndex(WriteObserver):
+    """BM25 词法索引，每个集合一个目录（directory/<集合名>）。
+
+    作为 VectorStore 的写入观察者注册后，写入和删除文档时同步更新内存中的索引，
+    VectorStore.persist/close 时保存。查询不需要向量化，可以单独使用，也可以与稠密检索融合（见 HybridSearcher）。
+    """
+
+    def __init__(self, directory: str, k1: float = 1.2, b: float = 0.75, buffer_docs: int = 20000,
+                 max_segments: int = 8, merge_ratio: float = 0.2):
+        """
+        Args:
+            directory: 索引目录
+            k1: BM25 词频饱和参数
+            b: BM25 文档长度归一化参数
+            buffer_docs: 内存中的新文档达到该数量时写成新段
+            max_segments: 段数超过该值时合并
+            merge_ratio: 已删除的文档超过该比例时合并
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.options = {"k1": k1, "b": b, "buffer_docs": max(1, buffer_docs),
+                        "max_segments": max(1, max_segments), "merge_ratio": merge_ratio}
+        self._lock = threading.Lock()
+        self._collections: Dict[str, _LexicalCollection] = {}
+
+    def _get_collection(self, collection_name: str) -> _LexicalCollection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                collection = _LexicalCollection(os.path.join(self.directory, collection_name), self.options)
+                self._collections[collection_name] = collection
+            return collection
+
+    def on_upsert(self, collection_name: str, ids: List[str], documents: List[str],
+                  metadatas: List[Optional[Dict[str, Any]]]) -> None:
+        self._get_collection(collection_name).add(ids, documents)
+
+    def on_delete(self, collection_name: str, ids: List[str]) -> None:
+        self._get_collection(collection_name).delete(ids)
+
+    def on_drop(self, collection_name: str) -> None:
+        with self._lock:
+            self._collections.pop(collection_name, None)
+            path = os.path.join(self.directory, collection_name)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+
+    def persist(self) -> None:
+        with self._lock:
+            collections = list(self._collections.values())
+        for collection in collections:
+            collection.commit()
+
+    def count(self, collection_name: str) -> int:
+        """
+        索引中的文档数
+
+        Args:
+            collection_name: 集合名称
+
+        Returns:
+            int: 文档数
+        """
+        return self._get_collection(collection_name).count()
+
+    def search(self, collection_name: str, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """
+        BM25 检索
+
+        Args:
+            collection_name: 集合名称
+            query: 查询文本
+            n_results: 返回结果数量
+
+        Returns:
+            List[Tuple[str, float]]: (文档ID, BM25 得分)，按得分降序
+        """
+        return self._get_collection(collection_name).search(query, n_results)
+
+    def rebuild(self, collection_name: str, vector_store: VectorStore, batch_size: int = 1000) -> int:
+        """
+        从向量数据库中的文本重建集合的索引
+
+        Args:
+            collection_name: 集合名称
+            vector_store: 向量数据库
+            batch_size: 每批读取的文档数
+
+        Returns:
+            int: 索引的文档数
+        """
+        self.on_drop(collection_name)
+        collection = self._get_collection(collection_name)
+        for documents in vector_store.iter_documents(collection_name, batch_size, include=("documents",)):
+            collection.add([doc["id"] for doc in documents], [doc["content"] for doc in documents])
+        collection.dirty = True
+        collection.commit()
+        logger.info(f"已重建集合 '{collection_name}' 的词法索引，共 {collection.count()} 个文档")
+        return collection.count()
+
+    def ensure_synced(self, collection_name: str, vector_store: VectorStore) -> None:
+        """
+        文档数与向量数据库不一致时（例如上次入库中断、索引未保存）重建索引
+
+        Args:
+            collection_name: 集合名称
+            vector_store: 向量数据库
+        """
+        stored = vector_store.count(collection_name)
+        indexed = self.count(collection_name)
+        if stored != indexed:
+            logger.warning(f"集合 '{collection_name}' 的词法索引有 {indexed} 个文档，向量数据库中有 {stored} 个，重建索引")
+            self.rebuild(collection_name, vector_store)
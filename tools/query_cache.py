@@ -0,0 +1,197 @@
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _copy(value: Any) -> Any:
+    """复制结果的列表和字典结构（叶子值共享），调用方修改返回的结果不会影响缓存"""
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    return value
+
+
+class QueryCache:
+    """进程内的查询结果缓存，按 LRU 淘汰，条目超过 ttl 秒后过期。
+
+    每个条目记录写入时集合的写版本号（VectorStore.collection_version）；VectorStore 写入、删除文档
+    或删除集合时递增版本号，读取时版本号不一致的条目视为失效，不需要逐条清理。
+    其他进程对同一集合的写入不会递增本进程的版本号，这种情况下由 ttl 限制结果的陈旧程度。
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        """
+        初始化查询结果缓存
+
+        Args:
+            max_entries: 最大条目数，超过后淘汰最久未访问的条目
+            ttl: 条目的有效时间（秒），0 表示不过期
+        """
+        if max_entries <= 0:
+            raise ValueError(f"max_entries 必须为正整数: {max_entries}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # 键 -> (集合名称, 写版本号, 过期时间, 结果)
+        self._entries: "OrderedDict[str, Tuple[str, int, float, Any]]" = OrderedDict()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+        self.expired = 0
+        self.stale = 0
+
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        """
+        规范化查询文本（NFKC 规范化、合并连续空白并去除首尾空白），写法不同的相同问题共用一个条目
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            str: 规范化后的文本
+        """
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+    @staticmethod
+    def vector_digest(vector: Sequence[float]) -> str:
+        """
+        查询向量的摘要（按 float32 字节计算）
+
+        Args:
+            vector: 查询向量
+
+        Returns:
+            str: 十六进制 SHA-256 摘要
+        """
+        return hashlib.sha256(np.asarray(vector, dtype="<f4").tobytes()).hexdigest()
+
+    @staticmethod
+    def make_key(kind: str, collection_name: str, *parts: Any) -> str:
+        """
+        由查询的各个组成部分生成缓存键
+
+        Args:
+            kind: 缓存的层次（例如 text 表示按查询文本，vector 表示按查询向量），分别统计命中率
+            collection_name: 集合名称
+            parts: 其他参数（查询摘要、结果数、过滤条件等），需要可以序列化为 JSON
+
+        Returns:
+            str: 缓存键
+        """
+        payload = json.dumps([collection_name, *parts], sort_keys=True, ensure_ascii=False, default=str)
+        return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def _count(self, key: str, field: str) -> None:
+        kind = key.split(":", 1)[0]
+        counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0})
+        counters[field] += 1
+
+    def get(self, key: str, version: int) -> Optional[Any]:
+        """
+        查询缓存
+
+        Args:
+            key: make_key 生成的键
+            version: 集合当前的写版本号
+
+        Returns:
+            Optional[Any]: 命中时返回结果的副本，否则返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                _, entry_version, expires_at, value = entry
+                if entry_version != version:
+                    self.stale += 1
+                    del self._entries[key]
+                elif self.ttl > 0 and time.monotonic() > expires_at:
+                    self.expired += 1
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self._count(key, "hits")
+                    return _copy(value)
+            self._count(key, "misses")
+            return None
+
+    def put(self, key: str, collection_name: str, version: int, value: Any) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: make_key 生成的键
+            collection_name: 集合名称（invalidate 按集合清理时使用）
+            version: 计算结果之前读取的集合写版本号
+            value: 查询结果（列表、字典组成的结构）
+        """
+        with self._lock:
+            self._entries[key] = (collection_name, version, time.monotonic() + self.ttl, _copy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection_name: Optional[str] = None) -> int:
+        """
+        立即删除集合（默认全部集合）的条目，通常不需要调用，版本号变化后条目自然失效
+
+        Args:
+            collection_name: 集合名称
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if collection_name is None or entry[0] == collection_name]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 hits、misses、hit_rate、entries、evictions、expired、stale，
+                以及按缓存层次（text、vector）分别统计的 by_kind
+        """
+        with self._lock:
+            by_kind = {}
+            for kind, counters in self._counters.items():
+                total = counters["hits"] + counters["misses"]
+                by_kind[kind] = {**counters, "hit_rate": counters["hits"] / total if total else 0.0}
+            hits = sum(counters["hits"] for counters in self._counters.values())
+            misses = sum(counters["misses"] for counters in self._counters.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "stale": self.stale,
+                "by_kind": by_kind,
+            }
+
+    def clear(self) -> None:
+        """清空缓存并重置计数器"""
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            self.evictions = 0
+            self.expired = 0
+            self.stale = 0
@@ -0,0 +1,206 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from rules.token_counter import TokenCounter, create_token_counter, create_token_counter_from_config
+from tools.hybrid_search import HybridSearcher
+from utils.generation import GenerationStats
+from utils.llm import LLM
+
+logger = logging.getLogger(__name__)
+
+
+class QueryAnswer(BaseModel):
+    """一次问答的结果"""
+    question: str = Field(..., description="问题")
+    answer: str = Field("", description="生成的回答")
+    sources: List[Dict[str, Any]] = Field(default_factory=list, description="拼入提示词的检索结果（id、content、metadata、score）")
+    timings: Dict[str, float] = Field(default_factory=dict, description="各阶段耗时（秒）")
+    generation: Optional[GenerationStats] = Field(None, description="生成调用的延迟统计")
+
+    def timing_summary(self) -> str:
+        """返回便于输出的单行耗时摘要"""
+        return ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in self.timings.items())
+
+
+class QueryStream:
+    """流式问答结果。异步迭代产出回答的增量文本，迭代结束后可通过 result 获取来源和各阶段耗时。"""
+
+    def __init__(self, engine: "QueryEngine", question: str, collection_name: str, n_results: int,
+                 mode: Optional[str], where: Optional[Dict[str, Any]]):
+        self._engine = engine
+        self._question = question
+        self._collection_name = collection_name
+        self._n_results = n_results
+        self._mode = mode
+        self._where = where
+        self._started = False
+        self.result: Optional[QueryAnswer] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        if self._started:
+            raise RuntimeError("QueryStream 只能迭代一次")
+        self._started = True
+        engine = self._engine
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        hits = await engine.searcher.asearch(self._collection_name, self._question, self._n_results,
+                                             self._mode, self._where, timings)
+        timings["retrieve"] = time.perf_counter() - started
+
+        stage_started = time.perf_counter()
+        prompt, sources = engine.build_prompt(self._question, hits)
+        timings["context"] = time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        stream = engine.llm.agenerate_stream(prompt)
+        async for delta in stream:
+            if "first_token" not in timings:
+                timings["first_token"] = time.perf_counter() - started
+            yield delta
+        timings["generate"] = time.perf_counter() - stage_started
+        timings["total"] = time.perf_counter() - started
+
+        self.result = QueryAnswer(question=self._question, answer=stream.text, sources=sources,
+                                  timings=timings, generation=stream.stats)
+        logger.info(f"问答完成: {self.result.timing_summary()}")
+
+
+class QueryEngine:
+    """检索增强问答：检索（查询向量化、稠密/词法检索）→ 拼装上下文 → 流式生成，整个过程是一条异步流水线。
+
+    hybrid 模式下词法检索在查询向量化的同时进行；检索结果按相关性顺序拼入提示词，直到用完 token 预算。
+    每次回答都记录各阶段耗时: embed、dense、lexical、fuse（或命中查询缓存时的 cache）、retrieve、context、
+    first_token（从开始到首个 token）、generate、total。
+    """
+
+    def __init__(self, searcher: HybridSearcher, llm: LLM, prompt_template: str, collection_name: str,
+                 n_results: int = 5, mode: Optional[str] = None, max_context_tokens: int = 3000,
+                 token_counter: Optional[TokenCounter] = None):
+        """
+        Args:
+            searcher: 检索器
+            llm: 生成回答使用的 LLM
+            prompt_template: 提示词模板，包含 {context} 和 {question}
+            collection_name: 默认的集合名称
+            n_results: 默认检索的文本块数
+            mode: 默认的检索模式，为 None 时使用检索器的默认模式
+            max_context_tokens: 拼入提示词的上下文 token 预算
+            token_counter: token 计数器，默认使用近似计数
+        """
+        self.searcher = searcher
+        self.llm = llm
+        self.prompt_template = prompt_template
+        self.collection_name = collection_name
+        self.n_results = n_results
+        self.mode = mode
+        self.max_context_tokens = max_context_tokens
+        self.token_counter = token_counter or create_token_counter()
+
+    @classmethod
+    def from_config(cls, config_path: str = "config/config.toml") -> "QueryEngine":
+        """
+        按配置文件创建问答引擎，检索组件（向量数据库、词法索引、查询缓存）与入库使用的相同
+
+        Args:
+            config_path: 配置文件路径
+
+        Returns:
+            QueryEngine: 问答引擎
+        """
+        # 延迟导入：DataProcessor 会导入全部读取器和切分规则
+        from tools.data_processor import DataProcessor
+
+        processor = DataProcessor(config_path=config_path)
+        config = processor.config
+        query_config = config.rag.query
+        prompt_path = query_config.prompt_file
+        if not os.path.isabs(prompt_path):
+            # 相对路径相对于项目根目录（配置文件所在目录的上一级）
+            prompt_path = os.path.join(os.path.dirname(os.path.dirname(config.config_path)), prompt_path)
+        with open(prompt_path, "r", encoding="utf-8") as f:
+            prompt_template = f.read()
+        return cls(
+            processor.searcher,
+            processor.llm,
+            prompt_template,
+            config.rag.collection_name,
+            n_results=query_config.n_results,
+            mode=query_config.mode or None,
+            max_context_tokens=query_config.max_context_tokens,
+            token_counter=create_token_counter_from_config(config)
+        )
+
+    def build_prompt(self, question: str, hits: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        按相关性顺序把检索结果拼入提示词，直到用完上下文 token 预算（至少包含第一个结果）
+
+        Args:
+            question: 问题
+            hits: 检索结果
+
+        Returns:
+            Tuple[str, List[Dict[str, Any]]]: (提示词, 拼入提示词的检索结果)
+        """
+        blocks = []
+        sources = []
+        used = 0
+        for hit in hits:
+            metadata = hit.get("metadata") or {}
+            source = metadata.get("relative_path") or metadata.get("file_name") or hit["id"]
+            block = f"[{len(sources) + 1}] 来源: {source}\n{hit.get('content', '')}"
+            tokens = self.token_counter.count(block)
+            if sources and used + tokens > self.max_context_tokens:
+                break
+            blocks.append(block)
+            sources.append(hit)
+            used += tokens
+        context = "\n\n".join(blocks) if blocks else "（没有检索到相关资料）"
+        return self.prompt_template.format(context=context, question=question), sources
+
+    def stream(self, question: str, collection_name: Optional[str] = None, n_results: Optional[int] = None,
+               mode: Optional[str] = None, where: Optional[Dict[str, Any]] = None) -> QueryStream:
+        """
+        流式回答问题，检索在开始迭代时进行
+
+        Args:
+            question: 问题
+            collection_name: 集合名称，默认使用配置中的集合
+            n_results: 检索的文本块数
+            mode: dense、lexical 或 hybrid
+            where: 元数据过滤条件
+
+        Returns:
+            QueryStream: 回答增量文本的异步迭代器，迭代结束后 result 中有来源和各阶段耗时
+        """
+        return QueryStream(self, question, collection_name or self.collection_name, n_results or self.n_results,
+                           mode or self.mode, where)
+
+    async def aquery(self, question: str, collection_name: Optional[str] = None, n_results: Optional[int] = None,
+                     mode: Optional[str] = None, where: Optional[Dict[str, Any]] = None) -> QueryAnswer:
+        """
+        回答问题
+
+        Args:
+            question: 问题
+            collection_name: 集合名称，默认使用配置中的集合
+            n_results: 检索的文本块数
+            mode: dense、lexical 或 hybrid
+            where: 元数据过滤条件
+
+        Returns:
+            QueryAnswer: 回答、来源和各阶段耗时
+        """
+        stream = self.stream(question, collection_name, n_results, mode, where)
+        async for _ in stream:
+            pass
+        return stream.result
+
+    def query(self, question: str, **kwargs) -> QueryAnswer:
+        """aquery 的同步版本（不能在事件循环中调用）"""
+        return asyncio.run(self.aquery(question, **kwargs))
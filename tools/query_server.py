@@ -0,0 +1,406 @@
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from tools.query_engine import QueryEngine
+from utils.concurrency import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+_ENDPOINTS = {("GET", "/health"), ("GET", "/metrics"), ("POST", "/search"), ("POST", "/query")}
+
+
+def _json_default(value: Any) -> Any:
+    """NumPy 标量和数组（检索结果中的距离、向量）转换为 JSON 可序列化的值"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _encode(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+class _Exchange:
+    """一次 HTTP 请求的响应状态，用于判断响应头是否已发出（流式响应开始后不能再改为错误响应）"""
+
+    def __init__(self, writer: asyncio.StreamWriter, keep_alive: bool):
+        self.writer = writer
+        self.keep_alive = keep_alive
+        self.status: Optional[int] = None
+
+    def _head(self, status: int, content_type: str, extra: str) -> bytes:
+        self.status = status
+        connection = "keep-alive" if self.keep_alive else "close"
+        return (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+                f"Connection: {connection}\r\n{extra}\r\n").encode("latin-1")
+
+    async def send_json(self, status: int, payload: Any) -> None:
+        body = _encode(payload)
+        self.writer.write(self._head(status, "application/json; charset=utf-8", f"Content-Length: {len(body)}\r\n") + body)
+        await self.writer.drain()
+
+    async def start_chunked(self, status: int, content_type: str) -> None:
+        self.writer.write(self._head(status, content_type, "Transfer-Encoding: chunked\r\n"))
+        await self.writer.drain()
+
+    async def send_chunk(self, data: bytes) -> None:
+        self.writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await self.writer.drain()
+
+    async def end_chunked(self) -> None:
+        self.writer.write(b"0\r\n\r\n")
+        await self.writer.drain()
+
+
+class _EndpointMetrics:
+    """单个接口的请求数、错误数和最近请求的延迟分布"""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.errors = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+
+    def observe(self, latency: float, error: bool) -> None:
+        self.count += 1
+        self.errors += int(error)
+        self.latencies.append(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+        }
+
+
+class QueryServer:
+    """基于 asyncio 的 HTTP 问答服务（HTTP/1.1，支持 keep-alive），不依赖 Web 框架。
+
+    接口:
+    - GET /health: 存活检查
+    - GET /metrics: 各接口的请求数和延迟、排队与拒绝数、微批处理、查询缓存和 LLM 并发窗口统计
+    - POST /search: {"query", "collection"?, "n_results"?, "mode"?, "where"?}，只检索不生成
+    - POST /query: {"question", "collection"?, "n_results"?, "mode"?, "where"?, "stream"?}，
+      stream 为 true 时以 NDJSON 分块返回 {"delta": ...}，最后一行是完整结果
+
+    /search、/query 最多同时处理 max_concurrency 个，另有最多 max_pending 个排队，超出时返回 503；
+    超过 request_timeout 秒未完成时返回 504。几毫秒内并发到达的请求由 MicroBatcher 合并：
+    查询向量化合并为一次批量嵌入调用，稠密检索按 (集合, 结果数, 过滤条件) 合并为一次多查询检索。
+    """
+
+    def __init__(self, engine: QueryEngine, host: str = "127.0.0.1", port: int = 8000,
+                 max_concurrency: int = 64, max_pending: int = 256, request_timeout: float = 60.0,
+                 batch_max_size: int = 32, batch_max_wait: float = 0.005, max_body_bytes: int = 1024 * 1024):
+        """
+        Args:
+            engine: 问答引擎，其检索器的向量化和稠密检索会被替换为微批处理版本
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+            max_concurrency: 同时处理的 /search、/query 请求数
+            max_pending: 排队等待处理的请求数上限
+            request_timeout: 单个请求的超时时间（秒）
+            batch_max_size: 每批合并的最大请求数
+            batch_max_wait: 第一个请求等待合并的最长时间（秒）
+            max_body_bytes: 请求体的最大字节数
+        """
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self.max_body_bytes = max_body_bytes
+
+        self.embed_batcher: MicroBatcher[str, List[float]] = MicroBatcher(
+            self._embed_batch, batch_max_size, batch_max_wait)
+        self.search_batcher: MicroBatcher[Tuple[str, List[float], int, Optional[Dict[str, Any]]], List[Dict[str, Any]]] = \
+            MicroBatcher(self._search_batch, batch_max_size, batch_max_wait)
+        engine.searcher.aembed_query = self.embed_batcher.submit
+        engine.searcher.avector_search = self._vector_search
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._started_at = time.time()
+        self._active = 0
+        self._waiting = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._metrics: Dict[str, _EndpointMetrics] = {}
+
+    async def _embed_batch(self, texts: List[str]) -> List[Union[List[float], BaseException]]:
+        """一次批量嵌入调用；失败的文本只让对应的请求失败"""
+        batch = await self.engine.llm.aembed_batch(texts)
+        return [
+            RuntimeError(f"LLM嵌入失败: {batch.errors[index]}") if index in batch.errors
+            else (vector.tolist() if hasattr(vector, "tolist") else vector)
+            for index, vector in enumerate(batch.embeddings)
+        ]
+
+    async def _vector_search(self, collection_name: str, vector: List[float], n_results: int,
+                             where: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self.search_batcher.submit((collection_name, vector, n_results, where))
+
+    async def _search_batch(self, items: List[Tuple[str, List[float], int, Optional[Dict[str, Any]]]]) -> List[Any]:
+        """按 (集合, 结果数, 过滤条件) 分组，每组一次 search_many；各组在线程中并行执行"""
+        groups: Dict[str, List[int]] = {}
+        for index, (collection_name, _, n_results, where) in enumerate(items):
+            key = json.dumps([collection_name, n_results, where], sort_keys=True, default=str)
+            groups.setdefault(key, []).append(index)
+
+        vector_store = self.engine.searcher.vector_store
+        results: List[Any] = [None] * len(items)
+
+        async def run(indexes: List[int]) -> None:
+            collection_name, _, n_results, where = items[indexes[0]]
+            try:
+                hits = await asyncio.to_thread(vector_store.search_many, collection_name,
+                                               [items[index][1] for index in indexes], n_results, where)
+            except Exception as e:
+                hits = [e] * len(indexes)
+            for index, result in zip(indexes, hits):
+                results[index] = result
+
+        await asyncio.gather(*(run(indexes) for indexes in groups.values()))
+        return results
+
+    async def start(self) -> None:
+        """开始监听；port 为 0 时实际端口写回 self.port"""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"问答服务已启动: http://{self.host}:{self.port}")
+
+    async def serve_forever(self) -> None:
+        """启动并一直运行，直到被取消"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """停止监听"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    # keep-alive 连接空闲超过 request_timeout 时关闭
+                    request_line = await asyncio.wait_for(reader.readline(), self.request_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    headers: Dict[str, str] = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get("content-length", "0"))
+                except ValueError:
+                    await _Exchange(writer, False).send_json(400, {"error": "无法解析的 HTTP 请求"})
+                    break
+                if length > self.max_body_bytes:
+                    await _Exchange(writer, False).send_json(413, {"error": f"请求体超过 {self.max_body_bytes} 字节"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+                exchange = _Exchange(writer, keep_alive)
+                await self._handle_request(method.upper(), urlsplit(target).path, body, exchange)
+                if not exchange.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, method: str, path: str, body: bytes, exchange: _Exchange) -> None:
+        started = time.perf_counter()
+        endpoint = path if (method, path) in _ENDPOINTS else "other"
+        try:
+            if (method, path) == ("GET", "/health"):
+                await exchange.send_json(200, {"status": "ok"})
+            elif (method, path) == ("GET", "/metrics"):
+                await exchange.send_json(200, self.metrics())
+            elif (method, path) in _ENDPOINTS:
+                await self._handle_limited(path, body, exchange)
+            elif path in {endpoint_path for _, endpoint_path in _ENDPOINTS}:
+                await exchange.send_json(405, {"error": f"{path} 不支持 {method}"})
+            else:
+                await exchange.send_json(404, {"error": f"未知的路径: {path}"})
+        except ConnectionError:
+            exchange.keep_alive = False
+        except Exception as e:
+            if exchange.status is None:
+                logger.exception(f"处理请求 {method} {path} 失败")
+                await exchange.send_json(500, {"error": str(e)})
+            else:
+                exchange.keep_alive = False
+        finally:
+            metrics = self._metrics.setdefault(endpoint, _EndpointMetrics())
+            metrics.observe(time.perf_counter() - started, exchange.status is None or exchange.status >= 400)
+
+    async def _handle_limited(self, path: str, body: bytes, exchange: _Exchange) -> None:
+        """在并发限制和超时内处理 /search、/query"""
+        try:
+            payload = json.loads(body or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("请求体必须是 JSON 对象")
+        except ValueError as e:
+            await exchange.send_json(400, {"error": f"无效的 JSON: {e}"})
+            return
+        if self._active + self._waiting >= self.max_concurrency + self.max_pending:
+            self.rejected += 1
+            await exchange.send_json(503, {"error": "服务繁忙，请稍后重试"})
+            return
+
+        # 超时包括排队等待的时间
+        deadline = time.perf_counter() + self.request_timeout
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            await exchange.send_json(504, {"error": f"请求排队超过 {self.request_timeout} 秒"})
+            return
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        try:
+            handler = self._search if path == "/search" else self._query
+            await asyncio.wait_for(handler(payload, exchange), max(0.0, deadline - time.perf_counter()))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if exchange.status is None:
+                await exchange.send_json(504, {"error": f"请求超过 {self.request_timeout} 秒未完成"})
+            else:
+                exchange.keep_alive = False
+        except ValueError as e:
+            # 参数错误（检索模式、过滤条件等）
+            if exchange.status is None:
+                await exchange.send_json(400, {"error": str(e)})
+            else:
+                exchange.keep_alive = False
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    @staticmethod
+    def _options(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """校验并取出检索参数"""
+        collection_name = payload.get("collection")
+        n_results = payload.get("n_results")
+        mode = payload.get("mode")
+        where = payload.get("where")
+        if collection_name is not None and not isinstance(collection_name, str):
+            raise ValueError("collection 必须是字符串")
+        if n_results is not None and (not isinstance(n_results, int) or not 1 <= n_results <= 1000):
+            raise ValueError("n_results 必须是 1-1000 之间的整数")
+        if mode is not None and not isinstance(mode, str):
+            raise ValueError("mode 必须是字符串")
+        if where is not None and not isinstance(where, dict):
+            raise ValueError("where 必须是 JSON 对象")
+        return {"collection_name": collection_name, "n_results": n_results, "mode": mode, "where": where}
+
+    @staticmethod
+    def _text(payload: Dict[str, Any], key: str) -> str:
+        text = payload.get(key)
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError(f"缺少 {key}")
+        return text
+
+    async def _search(self, payload: Dict[str, Any], exchange: _Exchange) -> None:
+        query = self._text(payload, "query")
+        options = self._options(payload)
+        engine = self.engine
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        hits = await engine.searcher.asearch(options["collection_name"] or engine.collection_name, query,
+                                             options["n_results"] or engine.n_results,
+                                             options["mode"] or engine.mode, options["where"], timings)
+        timings["total"] = time.perf_counter() - started
+        await exchange.send_json(200, {"results": hits, "timings": timings})
+
+    async def _query(self, payload: Dict[str, Any], exchange: _Exchange) -> None:
+        question = self._text(payload, "question")
+        stream = self.engine.stream(question, **self._options(payload))
+        if not payload.get("stream"):
+            async for _ in stream:
+                pass
+            await exchange.send_json(200, stream.result.model_dump())
+            return
+
+        deltas = stream.__aiter__()
+        # 检索失败时还没有发出响应头，可以返回错误状态码
+        try:
+            first = await deltas.__anext__()
+        except StopAsyncIteration:
+            first = None
+        await exchange.start_chunked(200, "application/x-ndjson; charset=utf-8")
+        try:
+            if first is not None:
+                await exchange.send_chunk(_encode({"delta": first}) + b"\n")
+                async for delta in deltas:
+                    await exchange.send_chunk(_encode({"delta": delta}) + b"\n")
+            await exchange.send_chunk(_encode(stream.result.model_dump()) + b"\n")
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            logger.exception(f"流式生成失败: {question[:100]}")
+            await exchange.send_chunk(_encode({"error": str(e)}) + b"\n")
+        await exchange.end_chunked()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        获取服务统计信息
+
+        Returns:
+            Dict[str, Any]: 运行时长、各接口的请求数和延迟分布、在途/排队/拒绝/超时数，以及微批处理、
+                查询缓存、LLM 并发窗口和嵌入缓存的统计
+        """
+        searcher = self.engine.searcher
+        llm = self.engine.llm
+        query_cache = getattr(searcher, "query_cache", None)
+        limiter = getattr(llm, "async_limiter", None)
+        embedding_cache = getattr(llm, "embedding_cache", None)
+        return {
+            "uptime": time.time() - self._started_at,
+            "endpoints": {endpoint: metrics.stats() for endpoint, metrics in self._metrics.items()},
+            "active": self._active,
+            "waiting": self._waiting,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "batching": {"embed": self.embed_batcher.stats(), "search": self.search_batcher.stats()},
+            "query_cache": query_cache.stats() if query_cache is not None else None,
+            "llm_limiter": limiter.stats() if limiter is not None else None,
+            "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        }
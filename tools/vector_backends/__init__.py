@@ -0,0 +1,43 @@
+import os
+from typing import Any, Dict, Optional
+
+from .base import DirectoryBackend, VectorBackend, match_where
+
+
+def create_backend(store_type: str, persist_directory: str, options: Optional[Dict[str, Any]] = None,
+                   shards: int = 1) -> VectorBackend:
+    """
+    按 [rag].vector_store_type 创建向量数据库后端，后端模块按需导入，未使用的后端不要求安装其依赖
+
+    Args:
+        store_type: 后端类型: chroma、faiss 或 numpy
+        persist_directory: 持久化目录
+        options: 后端的构造参数（例如 [rag.faiss]、[rag.numpy] 中的索引参数）
+        shards: 分片数，大于 1 时每个分片是 persist_directory/shards/<序号> 下的一个独立后端
+
+    Returns:
+        VectorBackend: 后端实例
+    """
+    options = options or {}
+    store_type = store_type.lower()
+    if shards > 1:
+        from .sharded_backend import ShardedBackend
+        return ShardedBackend(
+            os.path.join(persist_directory, "shards"),
+            store_type,
+            lambda path: create_backend(store_type, path, options),
+            shards
+        )
+    if store_type == "chroma":
+        from .chroma_backend import ChromaBackend
+        return ChromaBackend(persist_directory, **options)
+    if store_type == "faiss":
+        from .faiss_backend import FaissBackend
+        return FaissBackend(persist_directory, **options)
+    if store_type == "numpy":
+        from .numpy_backend import NumpyBackend
+        return NumpyBackend(persist_directory, **options)
+    raise ValueError(f"不支持的向量数据库类型: {store_type}")
+
+
+__all__ = ["DirectoryBackend", "VectorBackend", "create_backend", "match_where"]
@@ -0,0 +1,257 @@
+import os
+import re
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+_MISSING = object()
+
+# 集合名称规则与 ChromaDB 一致，集合名直接用作目录名
+_COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{1,510}[A-Za-z0-9]$")
+
+# where 条件中的比较运算符；元数据中没有该键时只有 $ne、$nin 成立
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not _MISSING and value > operand,
+    "$gte": lambda value, operand: value is not _MISSING and value >= operand,
+    "$lt": lambda value, operand: value is not _MISSING and value < operand,
+    "$lte": lambda value, operand: value is not _MISSING and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def match_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    按 ChromaDB 的 where 语法判断元数据是否满足过滤条件，供不支持原生过滤的后端使用
+
+    支持 {"key": value}、{"key": {"$op": value}}（$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin）以及 $and/$or 组合。
+
+    Args:
+        metadata: 文档元数据
+        where: 过滤条件，为空时总是满足
+
+    Returns:
+        bool: 是否满足
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, item) for item in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, item) for item in condition):
+                return False
+        else:
+            value = metadata.get(key, _MISSING)
+            if isinstance(condition, dict):
+                for operator, operand in condition.items():
+                    if operator not in _OPERATORS:
+                        raise ValueError(f"不支持的过滤运算符: {operator}")
+                    if not _OPERATORS[operator](value, operand):
+                        return False
+            elif value != condition:
+                return False
+    return True
+
+
+class VectorBackend(ABC):
+    """向量数据库后端接口。
+
+    VectorStore 在其上实现写缓冲、批次拆分和结果格式化，后端只负责按集合存取向量、文本和元数据。
+    query 返回与 ChromaDB 相同形状的字典：{"ids": [[...]], "documents": [[...]], ...}，
+    外层列表与查询向量一一对应，只包含 include 中要求的字段。
+    """
+
+    # 单次写入或查询允许的最大条数
+    max_batch_size: int = 5000
+
+    @abstractmethod
+    def create_collection(self, name: str) -> None:
+        """创建集合，已存在时不做任何事"""
+        pass
+
+    @abstractmethod
+    def delete_collection(self, name: str) -> None:
+        """删除集合"""
+        pass
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        """列出所有集合名称"""
+        pass
+
+    @abstractmethod
+    def upsert(self, name: str, ids: List[str], documents: List[str],
+               metadatas: List[Optional[Dict[str, Any]]], embeddings: List[Sequence[float]]) -> None:
+        """
+        写入或覆盖文档，返回时已持久化
+
+        Args:
+            name: 集合名称
+            ids: 文档ID
+            documents: 文本
+            metadatas: 元数据，可以为 None
+            embeddings: 向量
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, name: str, ids: List[str]) -> None:
+        """按ID删除文档"""
+        pass
+
+    @abstractmethod
+    def count(self, name: str) -> int:
+        """集合中的文档数"""
+        pass
+
+    @abstractmethod
+    def query(self, name: str, query_embeddings: List[Sequence[float]], n_results: int,
+              where: Optional[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        """
+        查询最相似的文档
+
+        Args:
+            name: 集合名称
+            query_embeddings: 查询向量
+            n_results: 每个查询返回的结果数
+            where: 元数据过滤条件（ChromaDB 语法）
+            include: 需要返回的字段: documents、metadatas、distances、embeddings
+
+        Returns:
+            Dict[str, Any]: 包含 ids 以及 include 中各字段的嵌套列表
+        """
+        pass
+
+    @abstractmethod
+    def get(self, name: str, ids: Optional[List[str]], include: List[str],
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        """
+        按ID取出文档，或按写入顺序分页取出全部文档
+
+        Args:
+            name: 集合名称
+            ids: 文档ID，为 None 时按写入顺序取出全部文档
+            include: 需要返回的字段: documents、metadatas、embeddings
+            limit: ids 为 None 时最多返回的文档数
+            offset: ids 为 None 时跳过的文档数
+
+        Returns:
+            Dict[str, Any]: 包含 ids 以及 include 中各字段的列表（不存在的ID不返回）
+        """
+        pass
+
+    @abstractmethod
+    def reset(self) -> None:
+        """删除所有集合"""
+        pass
+
+    def persist(self) -> None:
+        """把内存中的索引状态保存到磁盘（写入本身已持久化的后端无需实现）"""
+        pass
+
+    def close(self) -> None:
+        """保存并释放资源"""
+        self.persist()
+
+
+class DirectoryBackend(VectorBackend):
+    """每个集合一个目录的进程内后端的公共部分。
+
+    集合目录为 directory/<集合名>，其中的 store.sqlite 是集合存在的标志；打开的集合对象缓存在内存中。
+    子类实现 _open_collection，集合对象需要提供 lock、conn 以及 upsert、delete、count、query、save、close。
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: 存放集合目录的目录
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._collections: Dict[str, Any] = {}
+
+    @abstractmethod
+    def _open_collection(self, path: str) -> Any:
+        """打开（不存在时创建）集合目录"""
+        pass
+
+    def _path(self, name: str) -> str:
+        if not _COLLECTION_NAME.match(name):
+            raise ValueError(f"集合名称 {name} 不合法：需要 3-512 个字符，只能包含字母、数字、.、_、-，且首尾为字母或数字")
+        return os.path.join(self.directory, name)
+
+    def _get_collection(self, name: str, create: bool = False) -> Any:
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    path = self._path(name)
+                    if not create and not os.path.exists(os.path.join(path, "store.sqlite")):
+                        raise ValueError(f"集合 {name} 不存在")
+                    collection = self._open_collection(path)
+                    self._collections[name] = collection
+        return collection
+
+    def create_collection(self, name: str) -> None:
+        self._get_collection(name, create=True)
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                # 集合目录随即删除，不需要保存
+                collection.conn.close()
+            path = self._path(name)
+            if not os.path.exists(path):
+                raise ValueError(f"集合 {name} 不存在")
+            shutil.rmtree(path)
+
+    def list_collections(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if os.path.exists(os.path.join(self.directory, name, "store.sqlite"))
+        )
+
+    def upsert(self, name: str, ids: List[str], documents: List[str],
+               metadatas: List[Optional[Dict[str, Any]]], embeddings: List[Sequence[float]]) -> None:
+        self._get_collection(name).upsert(ids, documents, metadatas, embeddings)
+
+    def delete(self, name: str, ids: List[str]) -> None:
+        self._get_collection(name).delete(ids)
+
+    def count(self, name: str) -> int:
+        return self._get_collection(name).count()
+
+    def query(self, name: str, query_embeddings: List[Sequence[float]], n_results: int,
+              where: Optional[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        return self._get_collection(name).query(query_embeddings, n_results, where, include)
+
+    def get(self, name: str, ids: Optional[List[str]], include: List[str],
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        return self._get_collection(name).get(ids, include, limit, offset)
+
+    def reset(self) -> None:
+        for name in self.list_collections():
+            self.delete_collection(name)
+
+    def persist(self) -> None:
+        with self._lock:
+            collections = list(self._collections.values())
+        for collection in collections:
+            with collection.lock:
+                collection.save()
+
+    def close(self) -> None:
+        with self._lock:
+            collections = list(self._collections.values())
+            self._collections.clear()
+        for collection in collections:
+            collection.close()
@@ -0,0 +1,82 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+import chromadb
+from chromadb.config import Settings
+
+from .base import VectorBackend
+
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB 后端（PersistentClient），集合句柄在首次使用后缓存"""
+
+    def __init__(self, persist_directory: str):
+        """
+        Args:
+            persist_directory: 持久化目录
+        """
+        os.makedirs(persist_directory, exist_ok=True)
+        self.client = chromadb.PersistentClient(
+            path=persist_directory,
+            settings=Settings(
+                anonymized_telemetry=False,
+                allow_reset=True
+            )
+        )
+        self.max_batch_size = self.client.get_max_batch_size()
+        self._lock = threading.Lock()
+        self._collections: Dict[str, Any] = {}
+
+    def _get_collection(self, name: str):
+        """获取集合句柄，首次获取后缓存"""
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = self.client.get_collection(name)
+                    self._collections[name] = collection
+        return collection
+
+    def create_collection(self, name: str) -> None:
+        collection = self.client.get_or_create_collection(name)
+        with self._lock:
+            self._collections[name] = collection
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            self._collections.pop(name, None)
+        self.client.delete_collection(name)
+
+    def list_collections(self) -> List[str]:
+        return [c.name for c in self.client.list_collections()]
+
+    def upsert(self, name: str, ids: List[str], documents: List[str],
+               metadatas: List[Optional[Dict[str, Any]]], embeddings: List[Sequence[float]]) -> None:
+        self._get_collection(name).upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def delete(self, name: str, ids: List[str]) -> None:
+        self._get_collection(name).delete(ids=ids)
+
+    def count(self, name: str) -> int:
+        return self._get_collection(name).count()
+
+    def query(self, name: str, query_embeddings: List[Sequence[float]], n_results: int,
+              where: Optional[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        return self._get_collection(name).query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include
+        )
+
+    def get(self, name: str, ids: Optional[List[str]], include: List[str],
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        if ids is not None:
+            return self._get_collection(name).get(ids=ids, include=include)
+        return self._get_collection(name).get(limit=limit, offset=offset, include=include)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._collections.clear()
+        self.client.reset()
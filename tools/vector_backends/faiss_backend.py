@@ -0,0 +1,395 @@
+import os
+import re
+import json
+import glob
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .base import DirectoryBackend, match_where
+
+logger = logging.getLogger(__name__)
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - 可选依赖
+    faiss = None
+
+_INDEX_FILE = re.compile(r"^index\.(\d+)\.faiss$")
+
+
+class _FaissCollection:
+    """单个集合：FAISS 索引 + SQLite 旁路存储。
+
+    旁路存储 store.sqlite 保存每条文档的 ID、文本、元数据和 float32 向量，写入在其提交后即已持久化；
+    FAISS 索引以旁路存储的行号作为向量ID，是可重建的加速结构。索引文件名 index.<行号>.faiss 记录
+    其中包含的最大行号，加载时把之后新增的行补入索引，因此不需要每次写入都保存整个索引。
+
+    删除和覆盖只修改旁路存储：索引中残留的旧向量在查询时因找不到对应行而被跳过，
+    残留比例超过 compact_ratio 时从旁路存储重建索引。
+    """
+
+    def __init__(self, directory: str, options: Dict[str, Any]):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.options = options
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(directory, "store.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT,
+                metadata TEXT,
+                vector BLOB NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+        row = self.conn.execute("SELECT value FROM state WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self.index = None
+        self.max_rowid = 0          # 索引中包含的最大行号
+        self.saved_rowid = 0        # 最近一次保存的索引文件包含的最大行号
+        self.trained_on = 0         # IVF 索引训练时的向量数
+        if self.dim is not None:
+            self._load_index()
+
+    # ---- 索引构建与持久化 ----
+
+    def _metric(self) -> int:
+        return faiss.METRIC_L2 if self.options["metric"] == "l2" else faiss.METRIC_INNER_PRODUCT
+
+    def _new_index(self, training_vectors: np.ndarray):
+        """按配置创建空索引（IVF 索引用 training_vectors 训练），外层包装 IndexIDMap2 以使用行号作为向量ID"""
+        index_type = self.options["index_type"]
+        metric = self._metric()
+        if index_type == "flat":
+            base = faiss.IndexFlat(self.dim, metric)
+        elif index_type == "hnsw":
+            base = faiss.IndexHNSWFlat(self.dim, self.options["hnsw_m"], metric)
+            base.hnsw.efConstruction = self.options["ef_construction"]
+        elif index_type == "ivf":
+            # 每个聚类中心至少需要约 39 个训练向量
+            nlist = max(1, min(self.options["nlist"], len(training_vectors) // 39))
+            quantizer = faiss.IndexFlat(self.dim, metric)
+            base = faiss.IndexIVFFlat(quantizer, self.dim, nlist, metric)
+            base.train(training_vectors)
+            self.trained_on = len(training_vectors)
+        else:
+            raise ValueError(f"不支持的 FAISS 索引类型: {index_type}，可选 flat、hnsw、ivf")
+        index = faiss.IndexIDMap2(base)
+        self._apply_search_params(index)
+        return index
+
+    def _apply_search_params(self, index) -> None:
+        base = faiss.downcast_index(index.index)
+        if isinstance(base, faiss.IndexHNSW):
+            base.hnsw.efSearch = self.options["ef_search"]
+        elif isinstance(base, faiss.IndexIVF):
+            base.nprobe = self.options["nprobe"]
+
+    def _index_files(self) -> List[Tuple[int, str]]:
+        files = []
+        for path in glob.glob(os.path.join(self.directory, "index.*.faiss")):
+            match = _INDEX_FILE.match(os.path.basename(path))
+            if match:
+                files.append((int(match.group(1)), path))
+        return sorted(files)
+
+    def _iter_vectors(self, after_rowid: int = 0, batch: int = 10000):
+        """按行号顺序分批读取旁路存储中的向量"""
+        cursor = self.conn.execute("SELECT rowid, vector FROM rows WHERE rowid > ? ORDER BY rowid", (after_rowid,))
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            rowids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), self.dim)
+            yield rowids, vectors
+
+    def _load_index(self) -> None:
+        files = self._index_files()
+        if files:
+            self.saved_rowid, path = files[-1]
+            self.index = faiss.read_index(path)
+            self._apply_search_params(self.index)
+            self.max_rowid = self.saved_rowid
+            base = faiss.downcast_index(self.index.index)
+            if isinstance(base, faiss.IndexIVF):
+                self.trained_on = self.index.ntotal
+            # 补入保存索引之后新增的行
+            for rowids, vectors in self._iter_vectors(self.saved_rowid):
+                self.index.add_with_ids(vectors, rowids)
+                self.max_rowid = int(rowids[-1])
+        else:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        """从旁路存储重建索引（去掉已删除的残留向量；IVF 索引按当前数据重新训练）"""
+        if self.count() == 0:
+            self.index = None
+            self.max_rowid = 0
+            return
+        training = np.empty((0, self.dim), dtype=np.float32)
+        if self.options["index_type"] == "ivf":
+            # 训练样本取每个聚类中心 256 个向量即可
+            limit = self.options["nlist"] * 256
+            sample, size = [], 0
+            for _, vectors in self._iter_vectors():
+                sample.append(vectors)
+                size += len(vectors)
+                if size >= limit:
+                    break
+            training = np.concatenate(sample)[:limit]
+        self.index = self._new_index(training)
+        self.max_rowid = 0
+        for rowids, vectors in self._iter_vectors():
+            self.index.add_with_ids(vectors, rowids)
+            self.max_rowid = int(rowids[-1])
+        self.save(force=True)
+
+    def save(self, force: bool = False) -> None:
+        """原子地保存索引文件，并删除旧的索引文件
+
+        Args:
+            force: 没有新增向量时也保存（重建索引后去掉了残留向量）
+        """
+        if self.index is None or (not force and self.max_rowid == self.saved_rowid and self._index_files()):
+            return
+        path = os.path.join(self.directory, f"index.{self.max_rowid}.faiss")
+        faiss.write_index(self.index, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        for rowid, old_path in self._index_files():
+            if rowid != self.max_rowid:
+                os.remove(old_path)
+        self.saved_rowid = self.max_rowid
+
+    def _maybe_maintain(self) -> None:
+        """残留向量过多或 IVF 数据量远超训练规模时重建索引，未保存的新增行过多时保存索引"""
+        if self.index is None:
+            return
+        live = self.count()
+        stale = self.index.ntotal - live
+        if self.index.ntotal > 1000 and stale > self.options["compact_ratio"] * self.index.ntotal:
+            logger.info(f"FAISS 索引 {self.directory} 残留 {stale} 个已删除向量，重建索引")
+            self._rebuild()
+            return
+        if (self.options["index_type"] == "ivf" and live >= 4 * max(self.trained_on, 39)
+                and faiss.downcast_index(self.index.index).nlist < self.options["nlist"]):
+            logger.info(f"FAISS 索引 {self.directory} 数据量已增长到 {live}，重新训练 IVF 索引")
+            self._rebuild()
+            return
+        unsaved = self.max_rowid - self.saved_rowid
+        if unsaved >= max(self.options["save_interval"], self.index.ntotal // 10):
+            self.save()
+
+    # ---- 读写 ----
+
+    def _prepare(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        array = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+        if array.ndim != 2:
+            raise ValueError(f"向量形状不正确: {array.shape}")
+        if self.dim is not None and array.shape[1] != self.dim:
+            raise ValueError(f"向量维度 {array.shape[1]} 与集合的维度 {self.dim} 不一致")
+        # cosine 度量存储和返回的都是归一化后的向量
+        if self.options["metric"] == "cosine":
+            array = array.copy()
+            faiss.normalize_L2(array)
+        return array
+
+    def upsert(self, ids: List[str], documents: List[str],
+               metadatas: List[Optional[Dict[str, Any]]], embeddings: List[Sequence[float]]) -> None:
+        with self.lock:
+            vectors = self._prepare(embeddings)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            # 覆盖的ID先删除旧行，新行使用新的行号（AUTOINCREMENT 保证行号不复用），索引中的旧向量成为残留
+            self.conn.executemany("DELETE FROM rows WHERE id = ?", [(doc_id,) for doc_id in ids])
+            rowids = []
+            for doc_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                cursor = self.conn.execute(
+                    "INSERT INTO rows (id, document, metadata, vector) VALUES (?, ?, ?, ?)",
+                    (doc_id, document, json.dumps(metadata, ensure_ascii=False) if metadata else None, vector.tobytes())
+                )
+                rowids.append(cursor.lastrowid)
+            self.conn.commit()
+
+            if self.index is None:
+                self._rebuild()
+                return
+            self.index.add_with_ids(vectors, np.asarray(rowids, dtype=np.int64))
+            self.max_rowid = max(self.max_rowid, rowids[-1])
+            self._maybe_maintain()
+
+    def delete(self, ids: List[str]) -> None:
+        with self.lock:
+            self.conn.executemany("DELETE FROM rows WHERE id = ?", [(doc_id,) for doc_id in ids])
+            self.conn.commit()
+            self._maybe_maintain()
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _fetch_rows(self, rowids: List[int], with_vectors: bool) -> Dict[int, tuple]:
+        columns = "rowid, id, document, metadata" + (", vector" if with_vectors else "")
+        rows: Dict[int, tuple] = {}
+        for start in range(0, len(rowids), 500):
+            part = rowids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for row in self.conn.execute(f"SELECT {columns} FROM rows WHERE rowid IN ({placeholders})", part):
+                rows[row[0]] = row
+        return rows
+
+    def _distance(self, score: float) -> float:
+        # 与 ChromaDB 一致：l2 为平方欧氏距离，ip/cosine 为 1 - 内积
+        return float(score) if self.options["metric"] == "l2" else 1.0 - float(score)
+
+    def query(self, query_embeddings: List[Sequence[float]], n_results: int,
+              where: Optional[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        with self.lock:
+            results: Dict[str, Any] = {"ids": [[] for _ in query_embeddings]}
+            for field in include:
+                results[field] = [[] for _ in query_embeddings]
+            if self.index is None or self.index.ntotal == 0 or n_results <= 0:
+                return results
+
+            queries = self._prepare(query_embeddings)
+            ntotal = self.index.ntotal
+            stale = max(0, ntotal - self.count())
+            # 残留向量和过滤条件都会占用名额，先多取一些，仍不够时按 4 倍扩大，直到取完整个索引
+            fetch = min(ntotal, (n_results + stale) * (4 if where else 1))
+            pending = list(range(len(queries)))
+            with_vectors = "embeddings" in include
+            while pending:
+                scores, labels = self.index.search(queries[pending], fetch)
+                rows = self._fetch_rows(sorted({int(label) for label in labels.ravel() if label >= 0}), with_vectors)
+                unfinished = []
+                for position, query_index in enumerate(pending):
+                    hits = []
+                    for score, label in zip(scores[position], labels[position]):
+                        row = rows.get(int(label))
+                        if row is None:
+                            continue
+                        metadata = json.loads(row[3]) if row[3] else None
+                        if where and not match_where(metadata, where):
+                            continue
+                        hits.append((row, metadata, score))
+                        if len(hits) == n_results:
+                            break
+                    if len(hits) < n_results and fetch < ntotal:
+                        unfinished.append(query_index)
+                        continue
+                    results["ids"][query_index] = [row[1] for row, _, _ in hits]
+                    if "documents" in include:
+                        results["documents"][query_index] = [row[2] for row, _, _ in hits]
+                    if "metadatas" in include:
+                        results["metadatas"][query_index] = [metadata for _, metadata, _ in hits]
+                    if "distances" in include:
+                        results["distances"][query_index] = [self._distance(score) for _, _, score in hits]
+                    if with_vectors:
+                        results["embeddings"][query_index] = [np.frombuffer(row[4], dtype=np.float32) for row, _, _ in hits]
+                pending = unfinished
+                fetch = min(ntotal, fetch * 4)
+            return results
+
+    def get(self, ids: Optional[List[str]], include: List[str],
+            limit: Optional[int], offset: int) -> Dict[str, Any]:
+        with self.lock:
+            columns = "id, document, metadata" + (", vector" if "embeddings" in include else "")
+            if ids is None:
+                rows = self.conn.execute(f"SELECT {columns} FROM rows ORDER BY rowid LIMIT ? OFFSET ?",
+                                         (-1 if limit is None else limit, offset)).fetchall()
+            else:
+                rows = []
+                for start in range(0, len(ids), 500):
+                    part = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    rows.extend(self.conn.execute(f"SELECT {columns} FROM rows WHERE id IN ({placeholders})", part))
+            results: Dict[str, Any] = {"ids": [row[0] for row in rows]}
+            if "documents" in include:
+                results["documents"] = [row[1] for row in rows]
+            if "metadatas" in include:
+                results["metadatas"] = [json.loads(row[2]) if row[2] else None for row in rows]
+            if "embeddings" in include:
+                results["embeddings"] = [np.frombuffer(row[3], dtype=np.float32) for row in rows]
+            return results
+
+    def close(self) -> None:
+        with self.lock:
+            self.save()
+            self.conn.close()
+
+
+class FaissBackend(DirectoryBackend):
+    """进程内的 FAISS 后端（faiss-cpu）。
+
+    每个集合一个目录（persist_directory/faiss/<集合名>），包含 FAISS 索引文件和 SQLite 旁路存储。
+    支持 flat（精确）、hnsw（HNSWFlat，efSearch 可调）、ivf（IVFFlat，nprobe 可调）三种索引，
+    距离度量支持 l2、ip、cosine；where 过滤在取回候选后按元数据进行。
+    """
+
+    max_batch_size = 10000
+
+    def __init__(self, persist_directory: str, index_type: str = "hnsw", metric: str = "l2",
+                 hnsw_m: int = 32, ef_construction: int = 200, ef_search: int = 64,
+                 nlist: int = 1024, nprobe: int = 16, compact_ratio: float = 0.2, save_interval: int = 10000):
+        """
+        Args:
+            persist_directory: 持久化目录
+            index_type: 索引类型: flat、hnsw、ivf
+            metric: 距离度量: l2、ip、cosine
+            hnsw_m: HNSW 每个节点的邻居数
+            ef_construction: HNSW 构建时的候选队列长度
+            ef_search: HNSW 查询时的候选队列长度，越大召回越高、越慢
+            nlist: IVF 聚类中心数上限（按数据量自动减小）
+            nprobe: IVF 查询时访问的聚类数，越大召回越高、越慢
+            compact_ratio: 已删除的残留向量超过索引的该比例时重建索引
+            save_interval: 新增多少向量后保存一次索引文件（写入本身在旁路存储中已持久化）
+        """
+        if faiss is None:
+            raise ImportError("使用 FAISS 向量数据库需要安装 faiss-cpu: pip install faiss-cpu")
+        if metric not in ("l2", "ip", "cosine"):
+            raise ValueError(f"不支持的距离度量: {metric}，可选 l2、ip、cosine")
+        super().__init__(os.path.join(persist_directory, "faiss"))
+        self.options = {
+            "index_type": index_type,
+            "metric": metric,
+            "hnsw_m": hnsw_m,
+            "ef_construction": ef_construction,
+            "ef_search": ef_search,
+            "nlist": nlist,
+            "nprobe": nprobe,
+            "compact_ratio": compact_ratio,
+            "save_interval": save_interval,
+        }
+
+    def _open_collection(self, path: str) -> _FaissCollection:
+        return _FaissCollection(path, self.options)
+
+    def set_search_params(self, ef_search: Optional[int] = None, nprobe: Optional[int] = None) -> None:
+        """
+        调整查询参数，对已打开的集合立即生效
+
+        Args:
+            ef_search: HNSW 查询时的候选队列长度
+            nprobe: IVF 查询时访问的聚类数
+        """
+        if ef_search is not None:
+            self.options["ef_search"] = ef_search
+        if nprobe is not None:
+            self.options["nprobe"] = nprobe
+        with self._lock:
+            for collection in self._collections.values():
+                with collection.lock:
+                    if collection.index is not None:
+                        collection._apply_search_params(collection.index)
@@ -0,0 +1,515 @@
+import io
+import os
+import glob
+import json
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .base import DirectoryBackend, match_where
+
+logger = logging.getLogger(__name__)
+
+_DTYPES = ("float32", "float16", "int8")
+# 计算得分时每次反量化的矩阵块大小（元素数），限制临时 float32 块的内存
+_BLOCK_ELEMENTS = 1 << 22
+# 一批查询的得分矩阵（查询数 x 行数）的元素数上限
+_SCORE_ELEMENTS = 1 << 25
+
+
+class _NpyMatrix:
+    """只追加的 .npy 矩阵文件。
+
+    追加时先把新行写到数据末尾并落盘，再原地改写头部中的行数（numpy 写头部时为第 0 维的增长预留了空间），
+    因此头部的行数总是对应已完整写入的数据。读取时把文件映射为只读的 np.memmap，
+    同一台机器上打开该集合的多个进程共享同一份页缓存，不需要复制。
+    """
+
+    def __init__(self, path: str, dtype: str, row_shape: Tuple[int, ...]):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.row_bytes = self.dtype.itemsize * int(np.prod(self.row_shape, dtype=np.int64))
+        if not os.path.exists(path):
+            with open(path + ".tmp", "wb") as f:
+                f.write(self._header(0))
+            os.replace(path + ".tmp", path)
+        self.rows = 0
+        self.offset = 0
+        self._mapped: Optional[np.ndarray] = None
+        self.reload()
+
+    def _header(self, rows: int) -> bytes:
+        buffer = io.BytesIO()
+        np.lib.format.write_array_header_1_0(buffer, {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (rows,) + self.row_shape,
+        })
+        return buffer.getvalue()
+
+    def reload(self) -> None:
+        """重新读取头部中的行数（其他进程可能追加了数据）"""
+        with open(self.path, "rb") as f:
+            np.lib.format.read_magic(f)
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            self.rows, self.offset = shape[0], f.tell()
+
+    def array(self) -> np.ndarray:
+        """全部行的只读内存映射，行数变化后重新映射"""
+        if self._mapped is None or len(self._mapped) != self.rows:
+            if self.rows == 0:
+                self._mapped = np.empty((0,) + self.row_shape, dtype=self.dtype)
+            else:
+                self._mapped = np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.offset,
+                                         shape=(self.rows,) + self.row_shape)
+        return self._mapped
+
+    def _set_rows(self, f, rows: int) -> None:
+        header = self._header(rows)
+        if len(header) != self.offset:
+            raise RuntimeError(f"{self.path} 的头部没有预留增长空间，无法原地追加")
+        f.seek(0)
+        f.write(header)
+        f.flush()
+        os.fsync(f.fileno())
+        self.rows = rows
+
+    def append(self, values: np.ndarray) -> None:
+        """追加行，返回时数据和头部都已落盘"""
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        with open(self.path, "r+b") as f:
+            f.seek(self.offset + self.rows * self.row_bytes)
+            f.write(values.tobytes())
+            # 去掉上次中断的追加留下的数据
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+            self._set_rows(f, self.rows + len(values))
+
+    def limit(self, rows: int) -> None:
+        """只使用前 rows 行；之后的行会被下一次追加覆盖"""
+        self.rows = min(self.rows, rows)
+
+
+class _NumpyCollection:
+    """单个集合：量化后的向量矩阵 + SQLite 旁路存储。
+
+    向量按写入顺序追加到 vectors.<代>.npy（float32、float16 或 int8；int8 时每个向量的缩放系数在
+    scales.<代>.npy 中），行号即槽位。开启 rescore 且存储类型不是 float32 时，原始 float32 向量追加到
+    full.<代>.npy，用于对候选重新精确打分。旁路存储 store.sqlite 保存 ID、槽位、文本和元数据。
+
+    删除和覆盖只修改旁路存储，旧槽位成为空洞并在查询时被屏蔽；空洞超过 compact_ratio 时把存活的行
+    复制到下一代文件并更新槽位（同一事务中切换代号），然后删除旧文件。
+    只允许一个进程写入；其他进程打开同一目录只读查询，通过 SQLite 的 data_version 发现写入并重新映射。
+    读取时不修改任何文件，中断的追加或压缩留下的数据由写入进程在第一次写入前清理。
+    """
+
+    def __init__(self, directory: str, options: Dict[str, Any]):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.options = options
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(directory, "store.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                id TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL,
+                document TEXT,
+                metadata TEXT
+            )
+            """
+        )
+        # 槽位在压缩时整体前移，不加唯一约束
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_slot ON rows(slot)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+        self.dim: Optional[int] = None
+        self.vectors: Optional[_NpyMatrix] = None
+        self.scales: Optional[_NpyMatrix] = None
+        self.full: Optional[_NpyMatrix] = None
+        self.live = np.zeros(0, dtype=bool)
+        self._data_version = None
+        self._cleaned = False
+        self._load()
+        if self.dim is not None and (self.dtype != options["dtype"] or self.metric != options["metric"]):
+            logger.warning(f"集合 {directory} 创建时使用 {self.dtype}/{self.metric}，忽略配置的 "
+                           f"{options['dtype']}/{options['metric']}")
+
+    # ---- 文件与状态 ----
+
+    def _state(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT key, value FROM state"))
+
+    def _file(self, kind: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{kind}.{generation}.npy")
+
+    def _load(self) -> None:
+        """按旁路存储中的状态打开当前代的矩阵文件，并重建存活槽位"""
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        state = self._state()
+        if "dim" not in state:
+            return
+        self.dim = int(state["dim"])
+        self.dtype = state["dtype"]
+        self.metric = state["metric"]
+        generation = int(state["generation"])
+        self.vectors = _NpyMatrix(self._file("vectors", generation), self.dtype, (self.dim,))
+        self.scales = _NpyMatrix(self._file("scales", generation), "float32", ()) if self.dtype == "int8" else None
+        self.full = _NpyMatrix(self._file("full", generation), "float32", (self.dim,)) if state["full"] == "1" else None
+        matrices = self._matrices()
+        # 追加中断（或写入进程正在追加）时各矩阵的行数可能不同，以最少的为准
+        size = min(matrix.rows for matrix in matrices)
+        for matrix in matrices:
+            matrix.limit(size)
+
+        slots = np.fromiter((row[0] for row in self.conn.execute("SELECT slot FROM rows")), dtype=np.int64)
+        self.live = np.zeros(size, dtype=bool)
+        self.live[slots[slots < size]] = True
+
+    def _matrices(self) -> List[_NpyMatrix]:
+        return [matrix for matrix in (self.vectors, self.scales, self.full) if matrix is not None]
+
+    def _remove_stale_files(self) -> None:
+        """删除不属于当前代的矩阵文件（中断的压缩留下的）"""
+        current = {matrix.path for matrix in self._matrices()}
+        for path in glob.glob(os.path.join(self.directory, "*.npy")):
+            if path not in current:
+                os.remove(path)
+
+    def _prepare_write(self) -> None:
+        self._refresh()
+        if not self._cleaned:
+            self._remove_stale_files()
+            self._cleaned = True
+
+    def _refresh(self) -> None:
+        """其他进程提交了写入时重新加载"""
+        if self.conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load()
+
+    def _create(self, dim: int) -> None:
+        dtype = self.options["dtype"]
+        full = self.options["rescore"] and dtype != "float32"
+        self.conn.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", [
+            ("dim", str(dim)), ("dtype", dtype), ("metric", self.options["metric"]),
+            ("full", "1" if full else "0"), ("generation", "0"),
+        ])
+        self.conn.commit()
+        self._load()
+
+    def save(self) -> None:
+        """每次写入返回时都已落盘，无需保存"""
+        pass
+
+    # ---- 写入 ----
+
+    def _prepare(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        array = np.asarray(vectors, dtype=np.float32)
+        if array.ndim != 2:
+            raise ValueError(f"向量形状不正确: {array.shape}")
+        if self.dim is not None and array.shape[1] != self.dim:
+            raise ValueError(f"向量维度 {array.shape[1]} 与集合的维度 {self.dim} 不一致")
+        # cosine 度量存储和返回的都是归一化后的向量
+        if (self.metric if self.dim is not None else self.options["metric"]) == "cosine":
+            norms = np.linalg.norm(array, axis=1, keepdims=True)
+            array = array / np.where(norms == 0, 1, norms)
+        return np.ascontiguousarray(array)
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype != "int8":
+            return vectors.astype(self.dtype), None
+        # 每个向量单独缩放到 [-127, 127]
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+
+    def upsert(self, ids: List[str], documents: List[str],
+               metadatas: List[Optional[Dict[str, Any]]], embeddings: List[Sequence[float]]) -> None:
+        with self.lock:
+            self._prepare_write()
+            # 同一批次中重复的ID只保留最后一个
+            keep = sorted({doc_id: i for i, doc_id in enumerate(ids)}.values())
+            vectors = self._prepare([embeddings[i] for i in keep])
+            if self.dim is None:
+                self._create(vectors.shape[1])
+            quantized, scales = self._quantize(vectors)
+
+            # 先追加向量并落盘，再提交旁路存储：中断时只会留下没有文档引用的空槽位
+            start = self.vectors.rows
+            self.vectors.append(quantized)
+            if self.scales is not None:
+                self.scales.append(scales)
+            if self.full is not None:
+                self.full.append(vectors)
+
+            old_slots = self._slots_of([ids[i] for i in keep])
+            self.conn.executemany(
+                """
+                INSERT INTO rows (id, slot, document, metadata) VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET slot = excluded.slot, document = excluded.document,
+                                              metadata = excluded.metadata
+                """,
+                [
+                    (ids[i], start + position, documents[i],
+                     json.dumps(metadatas[i], ensure_ascii=False) if metadatas[i] else None)
+                    for position, i in enumerate(keep)
+                ]
+            )
+            self.conn.commit()
+
+            live = np.ones(self.vectors.rows, dtype=bool)
+            live[:start] = self.live[:start]
+            live[old_slots] = False
+            self.live = live
+            self._maybe_compact()
+
+    def _slots_of(self, ids: List[str]) -> np.ndarray:
+        slots = []
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            slots.extend(row[0] for row in self.conn.execute(f"SELECT slot FROM rows WHERE id IN ({placeholders})", part))
+        return np.asarray(slots, dtype=np.int64)
+
+    def delete(self, ids: List[str]) -> None:
+        with self.lock:
+            self._prepare_write()
+            slots = self._slots_of(ids)
+            self.conn.executemany("DELETE FROM rows WHERE id = ?", [(doc_id,) for doc_id in ids])
+            self.conn.commit()
+            self.live[slots] = False
+            self._maybe_compact()
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _maybe_compact(self) -> None:
+        size = len(self.live)
+        holes = size - int(self.live.sum())
+        if size > 1000 and holes > self.options["compact_ratio"] * size:
+            logger.info(f"集合 {self.directory} 有 {holes} 个空槽位，压缩向量矩阵")
+            self._compact()
+
+    def _compact(self) -> None:
+        """把存活的行复制到下一代文件，在同一事务中更新槽位和代号，然后删除旧文件"""
+        generation = int(self._state()["generation"]) + 1
+        survivors = np.flatnonzero(self.live)
+        for matrix in self._matrices():
+            kind = os.path.basename(matrix.path).split(".")[0]
+            path = self._file(kind, generation)
+            if os.path.exists(path):
+                # 本进程中之前失败的压缩留下的文件
+                os.remove(path)
+            target = _NpyMatrix(path, matrix.dtype.name, matrix.row_shape)
+            source = matrix.array()
+            step = max(1, _BLOCK_ELEMENTS // max(1, int(np.prod(matrix.row_shape, dtype=np.int64))))
+            for start in range(0, len(survivors), step):
+                target.append(source[survivors[start:start + step]])
+
+        # 新槽位不大于旧槽位，按旧槽位升序更新不会与尚未更新的行冲突
+        self.conn.executemany("UPDATE rows SET slot = ? WHERE slot = ?",
+                              [(int(new), int(old)) for new, old in enumerate(survivors) if new != old])
+        self.conn.execute("UPDATE state SET value = ? WHERE key = 'generation'", (str(generation),))
+        self.conn.commit()
+        self._load()
+        self._remove_stale_files()
+
+    # ---- 查询 ----
+
+    def _scores(self, queries: np.ndarray, matrix: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        """
+        计算查询与所有行的得分（越大越相似）：ip/cosine 为内积，l2 为 2·x·q - |x|²（距离 = |q|² - 得分）
+
+        矩阵按块反量化为 float32 后做矩阵乘法，临时内存只与块大小有关。
+        """
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        step = max(1, _BLOCK_ELEMENTS // self.dim)
+        for start in range(0, len(matrix), step):
+            block = np.asarray(matrix[start:start + step]).astype(np.float32, copy=False)
+            if scales is not None:
+                block = block * scales[start:start + step, None]
+            part = queries @ block.T
+            if self.metric == "l2":
+                part *= 2
+                part -= np.einsum("ij,ij->i", block, block)
+            scores[:, start:start + step] = part
+        return scores
+
+    def _exact_scores(self, query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        scores = vectors @ query
+        if self.metric == "l2":
+            scores = 2 * scores - np.einsum("ij,ij->i", vectors, vectors)
+        return scores
+
+    def _distance(self, query: np.ndarray, score: float) -> float:
+        # 与 ChromaDB 一致：l2 为平方欧氏距离，ip/cosine 为 1 - 内积
+        if self.metric == "l2":
+            return max(0.0, float(query @ query) - float(score))
+        return 1.0 - float(score)
+
+    def _vectors(self, slots: np.ndarray) -> np.ndarray:
+        """按槽位取出 float32 向量（有原始向量时使用原始向量，否则反量化）"""
+        if self.full is not None:
+            return np.asarray(self.full.array()[slots])
+        vectors = np.asarray(self.vectors.array()[slots]).astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales.array()[slots][:, None]
+        return vectors
+
+    def _fetch_rows(self, slots: List[int]) -> Dict[int, tuple]:
+        rows: Dict[int, tuple] = {}
+        for start in range(0, len(slots), 500):
+            part = slots[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for row in self.conn.execute(f"SELECT slot, id, document, metadata FROM rows WHERE slot IN ({placeholders})", part):
+                rows[row[0]] = row
+        return rows
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        """得分最高的 k 个位置，按得分降序（argpartition 选出后只对这 k 个排序）"""
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def query(self, query_embeddings: List[Sequence[float]], n_results: int,
+              where: Optional[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        with self.lock:
+            self._refresh()
+            results: Dict[str, Any] = {"ids": [[] for _ in query_embeddings]}
+            for field in include:
+                results[field] = [[] for _ in query_embeddings]
+            live_count = int(self.live.sum())
+            if self.dim is None or live_count == 0 or n_results <= 0:
+                return results
+
+            queries = self._prepare(query_embeddings)
+            matrix = self.vectors.array()
+            scales = self.scales.array() if self.scales is not None else None
+            rescore = self.options["rescore"] and self.full is not None
+            # 量化后的排序是近似的，重新打分时先多取 rescore_factor 倍的候选
+            factor = self.options["rescore_factor"] if rescore else 1
+            batch = max(1, _SCORE_ELEMENTS // len(matrix))
+            for batch_start in range(0, len(queries), batch):
+                scores = self._scores(queries[batch_start:batch_start + batch], matrix, scales)
+                scores[:, ~self.live] = -np.inf
+                for position, score_row in enumerate(scores):
+                    query_index = batch_start + position
+                    hits = self._select(queries[query_index], score_row, n_results, factor, rescore, where, live_count)
+                    results["ids"][query_index] = [row[1] for row, _, _ in hits]
+                    if "documents" in include:
+                        results["documents"][query_index] = [row[2] for row, _, _ in hits]
+                    if "metadatas" in include:
+                        results["metadatas"][query_index] = [metadata for _, metadata, _ in hits]
+                    if "distances" in include:
+                        results["distances"][query_index] = [self._distance(queries[query_index], score)
+                                                             for _, _, score in hits]
+                    if "embeddings" in include:
+                        slots = np.asarray([row[0] for row, _, _ in hits], dtype=np.int64)
+                        results["embeddings"][query_index] = list(self._vectors(slots))
+            return results
+
+    def _select(self, query: np.ndarray, score_row: np.ndarray, n_results: int, factor: int, rescore: bool,
+                where: Optional[Dict[str, Any]], live_count: int) -> List[tuple]:
+        """从一个查询的得分中选出结果，过滤条件不满足时在已算好的得分上扩大候选数重试"""
+        fetch = min(live_count, n_results * factor * (4 if where else 1))
+        while True:
+            slots = self._top(score_row, fetch)
+            if rescore:
+                exact = self._exact_scores(query, self._vectors(slots))
+                order = np.argsort(-exact, kind="stable")
+                slots, candidate_scores = slots[order], exact[order]
+            else:
+                candidate_scores = score_row[slots]
+            rows = self._fetch_rows([int(slot) for slot in slots])
+            hits = []
+            for slot, score in zip(slots, candidate_scores):
+                row = rows.get(int(slot))
+                if row is None:
+                    continue
+                metadata = json.loads(row[3]) if row[3] else None
+                if where and not match_where(metadata, where):
+                    continue
+                hits.append((row, metadata, score))
+                if len(hits) == n_results:
+                    return hits
+            if fetch >= live_count:
+                return hits
+            fetch = min(live_count, fetch * 4)
+
+    def get(self, ids: Optional[List[str]], include: List[str],
+            limit: Optional[int], offset: int) -> Dict[str, Any]:
+        with self.lock:
+            self._refresh()
+            if ids is None:
+                rows = self.conn.execute("SELECT slot, id, document, metadata FROM rows ORDER BY rowid LIMIT ? OFFSET ?",
+                                         (-1 if limit is None else limit, offset)).fetchall()
+            else:
+                rows = []
+                for start in range(0, len(ids), 500):
+                    part = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    rows.extend(self.conn.execute(
+                        f"SELECT slot, id, document, metadata FROM rows WHERE id IN ({placeholders})", part))
+            results: Dict[str, Any] = {"ids": [row[1] for row in rows]}
+            if "documents" in include:
+                results["documents"] = [row[2] for row in rows]
+            if "metadatas" in include:
+                results["metadatas"] = [json.loads(row[3]) if row[3] else None for row in rows]
+            if "embeddings" in include:
+                slots = np.asarray([row[0] for row in rows], dtype=np.int64)
+                results["embeddings"] = list(self._vectors(slots)) if len(slots) else []
+            return results
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class NumpyBackend(DirectoryBackend):
+    """基于内存映射 .npy 矩阵的精确检索后端，适合中小规模的集合。
+
+    每个集合一个目录（persist_directory/numpy/<集合名>）。查询对整个矩阵做一次分块矩阵乘法，
+    用 argpartition 取前 k 个，可选地用 float32 原始向量对候选重新打分；矩阵通过内存映射读取，
+    多个工作进程可以共享同一份索引。where 过滤在得分排序后按元数据进行。
+    """
+
+    max_batch_size = 10000
+
+    def __init__(self, persist_directory: str, dtype: str = "float16", metric: str = "l2",
+                 rescore: bool = True, rescore_factor: int = 4, compact_ratio: float = 0.2):
+        """
+        Args:
+            persist_directory: 持久化目录
+            dtype: 向量矩阵的存储类型: float32、float16、int8（int8 为每个向量单独缩放）
+            metric: 距离度量: l2、ip、cosine
+            rescore: 存储类型不是 float32 时另存原始向量，并对候选用 float32 重新打分
+            rescore_factor: 重新打分时取 n_results 的多少倍作为候选
+            compact_ratio: 已删除的空槽位超过该比例时压缩矩阵
+        """
+        if dtype not in _DTYPES:
+            raise ValueError(f"不支持的存储类型: {dtype}，可选 {'、'.join(_DTYPES)}")
+        if metric not in ("l2", "ip", "cosine"):
+            raise ValueError(f"不支持的距离度量: {metric}，可选 l2、ip、cosine")
+        super().__init__(os.path.join(persist_directory, "numpy"))
+        self.options = {
+            "dtype": dtype,
+            "metric": metric,
+            "rescore": rescore,
+            "rescore_factor": max(1, rescore_factor),
+            "compact_ratio": compact_ratio,
+        }
+
+    def _open_collection(self, path: str) -> _NumpyCollection:
+        return _NumpyCollection(path, self.options)
@@ -0,0 +1,186 @@
+import os
+import json
+import heapq
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .base import VectorBackend
+
+logger = logging.getLogger(__name__)
+
+_LAYOUT_FILE = "shards.json"
+
+
+def shard_of(doc_id: str, shards: int) -> int:
+    """
+    文档所在的分片（按ID的哈希取模，与进程和 Python 的哈希随机化无关）
+
+    Args:
+        doc_id: 文档ID
+        shards: 分片数
+
+    Returns:
+        int: 分片序号
+    """
+    digest = hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+class ShardedBackend(VectorBackend):
+    """把每个逻辑集合按文档ID的哈希分布到 N 个分片上的后端。
+
+    每个分片是 directory/<序号> 下一个独立的后端实例（独立的 ChromaDB 客户端、FAISS 索引或 NumPy 矩阵），
+    写入按ID路由到分片，查询并行发往所有分片，再按距离合并各分片的前 n_results 个结果。
+    分片数记录在 directory/shards.json 中，已有数据按记录的分片数路由，修改分片数需要重新入库。
+
+    分片在线程池中并行执行：各后端的索引构建和检索（SQLite、hnswlib、FAISS、NumPy 矩阵运算）都会释放 GIL。
+    """
+
+    def __init__(self, directory: str, store_type: str, factory: Callable[[str], VectorBackend], shards: int):
+        """
+        Args:
+            directory: 分片目录的父目录
+            store_type: 分片的后端类型（记录在 shards.json 中，防止用其他后端打开已有分片）
+            factory: 按分片目录创建后端实例的函数
+            shards: 分片数（directory 中已有分片时以已有的为准）
+        """
+        if shards <= 0:
+            raise ValueError(f"分片数必须为正整数: {shards}")
+        os.makedirs(directory, exist_ok=True)
+        layout_path = os.path.join(directory, _LAYOUT_FILE)
+        if os.path.exists(layout_path):
+            with open(layout_path, "r", encoding="utf-8") as f:
+                layout = json.load(f)
+            if layout["store_type"] != store_type:
+                raise ValueError(f"分片目录 {directory} 使用 {layout['store_type']} 后端创建，不能用 {store_type} 打开")
+            if layout["shards"] != shards:
+                logger.warning(f"分片目录 {directory} 创建时使用 {layout['shards']} 个分片，忽略配置的 {shards} 个；"
+                               f"修改分片数需要删除该目录后重新入库")
+                shards = layout["shards"]
+        else:
+            tmp_path = layout_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"shards": shards, "store_type": store_type}, f)
+            os.replace(tmp_path, layout_path)
+
+        self.directory = directory
+        self.shards: List[VectorBackend] = [
+            factory(os.path.join(directory, f"{index:03d}")) for index in range(shards)
+        ]
+        self.max_batch_size = min(shard.max_batch_size for shard in self.shards)
+        self._executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="vector-shard")
+
+    def _fan_out(self, call: Callable[[VectorBackend], Any]) -> List[Any]:
+        """在所有分片上并行执行 call，按分片顺序返回结果；任一分片失败时抛出其异常"""
+        futures = [self._executor.submit(call, shard) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    def _route(self, ids: List[str]) -> Dict[int, List[int]]:
+        """分片序号 -> 属于该分片的文档在 ids 中的下标"""
+        routes: Dict[int, List[int]] = {}
+        for position, doc_id in enumerate(ids):
+            routes.setdefault(shard_of(doc_id, len(self.shards)), []).append(position)
+        return routes
+
+    def create_collection(self, name: str) -> None:
+        self._fan_out(lambda shard: shard.create_collection(name))
+
+    def delete_collection(self, name: str) -> None:
+        self._fan_out(lambda shard: shard.delete_collection(name))
+
+    def list_collections(self) -> List[str]:
+        # 集合总是在所有分片上同时创建和删除
+        return self.shards[0].list_collections()
+
+    def upsert(self, name: str, ids: List[str], documents: List[str],
+               metadatas: List[Optional[Dict[str, Any]]], embeddings: List[Sequence[float]]) -> None:
+        routes = self._route(ids)
+
+        def write(index: int) -> None:
+            positions = routes[index]
+            self.shards[index].upsert(
+                name,
+                [ids[i] for i in positions],
+                [documents[i] for i in positions],
+                [metadatas[i] for i in positions],
+                [embeddings[i] for i in positions]
+            )
+
+        futures = [self._executor.submit(write, index) for index in routes]
+        for future in futures:
+            future.result()
+
+    def delete(self, name: str, ids: List[str]) -> None:
+        routes = self._route(ids)
+        futures = [self._executor.submit(self.shards[index].delete, name, [ids[i] for i in positions])
+                   for index, positions in routes.items()]
+        for future in futures:
+            future.result()
+
+    def count(self, name: str) -> int:
+        return sum(self._fan_out(lambda shard: shard.count(name)))
+
+    def query(self, name: str, query_embeddings: List[Sequence[float]], n_results: int,
+              where: Optional[Dict[str, Any]], include: List[str]) -> Dict[str, Any]:
+        # 合并需要各分片的距离，调用方没有要求时查询后去掉
+        shard_include = list(include) if "distances" in include else [*include, "distances"]
+        results = self._fan_out(lambda shard: shard.query(name, query_embeddings, n_results, where, shard_include))
+
+        fields = ["ids", *include]
+        merged: Dict[str, Any] = {field: [] for field in fields}
+        for i in range(len(query_embeddings)):
+            candidates = [
+                (result["distances"][i][j], index, j)
+                for index, result in enumerate(results)
+                for j in range(len(result["ids"][i]))
+            ]
+            top = heapq.nsmallest(n_results, candidates)
+            for field in fields:
+                merged[field].append([results[index][field][i][j] for _, index, j in top])
+        return merged
+
+    def get(self, name: str, ids: Optional[List[str]], include: List[str],
+            limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        fields = ["ids", *include]
+        merged: Dict[str, Any] = {field: [] for field in fields}
+        if ids is not None:
+            futures = [self._executor.submit(self.shards[index].get, name, [ids[i] for i in positions], include)
+                       for index, positions in self._route(ids).items()]
+        else:
+            # 依次取各分片的文档（分片内按写入顺序），按各分片的文档数换算 offset 和 limit
+            counts = self._fan_out(lambda shard: shard.count(name))
+            requests = []
+            for index, count in enumerate(counts):
+                if limit is not None and limit <= 0:
+                    break
+                if offset >= count:
+                    offset -= count
+                    continue
+                size = count - offset if limit is None else min(limit, count - offset)
+                requests.append((index, offset, size))
+                offset = 0
+                if limit is not None:
+                    limit -= size
+            futures = [self._executor.submit(self.shards[index].get, name, None, include, size, start)
+                       for index, start, size in requests]
+        for future in futures:
+            result = future.result()
+            for field in fields:
+                values = result.get(field)
+                if values is not None:
+                    merged[field].extend(values)
+        return merged
+
+    def reset(self) -> None:
+        self._fan_out(lambda shard: shard.reset())
+
+    def persist(self) -> None:
+        self._fan_out(lambda shard: shard.persist())
+
+    def close(self) -> None:
+        try:
+            self._fan_out(lambda shard: shard.close())
+        finally:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,196 @@
+import io
+import os
+import json
+import shutil
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DTYPES = ("float16", "float32")
+
+_MANIFEST_FILE = "manifest.json"
+_VECTORS_FILE = "vectors.npy"
+_TEXTS_FILE = "texts.bin"
+_METADATA_FILE = "metadata.jsonl"
+_LENGTH = struct.Struct("<I")
+
+
+class SnapshotWriter:
+    """按列写出集合快照的目录。
+
+    - vectors.npy: (文档数, 维度) 的 float16/float32 矩阵，数据逐批追加，最后改写头部中的行数
+    - texts.bin: 每个文本为 4 字节小端长度 + UTF-8 字节
+    - metadata.jsonl: 每行一个 {"id": ..., "metadata": ...}
+    - manifest.json: 格式版本、集合名称、文档数、维度和向量类型，最后写入
+
+    文件先写到 <path>.tmp 目录，全部完成后整体改名为 path，没有 manifest.json 的目录不是完整的快照。
+    """
+
+    def __init__(self, path: str, collection_name: str, dtype: str = "float32"):
+        """
+        Args:
+            path: 快照目录，不能已存在
+            collection_name: 集合名称（记录在 manifest.json 中，导入时默认使用）
+            dtype: 向量的存储类型: float16 或 float32
+        """
+        if dtype not in SNAPSHOT_DTYPES:
+            raise ValueError(f"不支持的快照向量类型: {dtype}，可选 {'、'.join(SNAPSHOT_DTYPES)}")
+        if os.path.exists(path):
+            raise FileExistsError(f"快照目录已存在: {path}")
+        self.path = path
+        self.collection_name = collection_name
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.dim: Optional[int] = None
+        self._tmp_path = path + ".tmp"
+        if os.path.exists(self._tmp_path):
+            # 上次中断的导出
+            shutil.rmtree(self._tmp_path)
+        os.makedirs(self._tmp_path)
+        self._vectors = open(os.path.join(self._tmp_path, _VECTORS_FILE), "wb")
+        self._texts = open(os.path.join(self._tmp_path, _TEXTS_FILE), "wb")
+        self._metadata = open(os.path.join(self._tmp_path, _METADATA_FILE), "w", encoding="utf-8")
+        self._header_size = 0
+
+    def _header(self, rows: int) -> bytes:
+        buffer = io.BytesIO()
+        np.lib.format.write_array_header_1_0(buffer, {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (rows, self.dim or 0),
+        })
+        return buffer.getvalue()
+
+    def write(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Optional[Dict[str, Any]]],
+              vectors: Any) -> None:
+        """
+        追加一批文档
+
+        Args:
+            ids: 文档ID
+            texts: 文本
+            metadatas: 元数据，可以为 None
+            vectors: 向量（二维数组或向量列表）
+        """
+        if not ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"向量的形状 {vectors.shape} 与文档数 {len(ids)} 不一致")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            header = self._header(0)
+            self._header_size = len(header)
+            self._vectors.write(header)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"向量维度 {vectors.shape[1]} 与之前的 {self.dim} 不一致")
+
+        self._vectors.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        for text in texts:
+            data = text.encode("utf-8")
+            self._texts.write(_LENGTH.pack(len(data)))
+            self._texts.write(data)
+        self._metadata.writelines(
+            json.dumps({"id": doc_id, "metadata": metadata}, ensure_ascii=False) + "\n"
+            for doc_id, metadata in zip(ids, metadatas)
+        )
+        self.count += len(ids)
+
+    def close(self) -> Dict[str, Any]:
+        """
+        写入 manifest.json 并把临时目录改名为快照目录
+
+        Returns:
+            Dict[str, Any]: manifest 内容
+        """
+        if self.dim is None:
+            self._vectors.write(self._header(0))
+        else:
+            # numpy 写头部时为第 0 维的增长预留了空间，改写行数后长度不变
+            header = self._header(self.count)
+            if len(header) != self._header_size:
+                raise RuntimeError("vectors.npy 的头部没有预留增长空间")
+            self._vectors.seek(0)
+            self._vectors.write(header)
+        for f in (self._vectors, self._texts, self._metadata):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "collection": self.collection_name,
+            "count": self.count,
+            "dim": self.dim or 0,
+            "dtype": self.dtype.name,
+        }
+        with open(os.path.join(self._tmp_path, _MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self._tmp_path, self.path)
+        return manifest
+
+    def abort(self) -> None:
+        """放弃导出，删除临时目录"""
+        for f in (self._vectors, self._texts, self._metadata):
+            f.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """
+    读取快照的 manifest.json
+
+    Args:
+        path: 快照目录
+
+    Returns:
+        Dict[str, Any]: 包含 version、collection、count、dim、dtype
+    """
+    manifest_path = os.path.join(path, _MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"{path} 不是完整的快照目录（缺少 {_MANIFEST_FILE}）")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本: {manifest.get('version')}")
+    return manifest
+
+
+def read_snapshot(path: str, batch_size: int = 5000) -> Iterator[Tuple[List[str], List[str], List[Optional[Dict[str, Any]]], np.ndarray]]:
+    """
+    按批流式读取快照，向量通过内存映射读取，内存占用只与批次大小有关
+
+    Args:
+        path: 快照目录
+        batch_size: 每批的文档数
+
+    Yields:
+        Tuple: (ID 列表, 文本列表, 元数据列表, float32 向量矩阵)
+    """
+    manifest = read_manifest(path)
+    count = manifest["count"]
+    vectors = np.load(os.path.join(path, _VECTORS_FILE), mmap_mode="r")
+    if vectors.shape != (count, manifest["dim"]):
+        raise ValueError(f"快照 {path} 的向量形状 {vectors.shape} 与 manifest 不一致")
+
+    batch_size = max(1, batch_size)
+    with open(os.path.join(path, _TEXTS_FILE), "rb") as texts_file, \
+            open(os.path.join(path, _METADATA_FILE), "r", encoding="utf-8") as metadata_file:
+        for start in range(0, count, batch_size):
+            size = min(batch_size, count - start)
+            ids, metadatas, texts = [], [], []
+            for _ in range(size):
+                line = metadata_file.readline()
+                prefix = texts_file.read(_LENGTH.size)
+                if not line or len(prefix) < _LENGTH.size:
+                    raise ValueError(f"快照 {path} 的文档数少于 manifest 记录的 {count}")
+                record = json.loads(line)
+                ids.append(record["id"])
+                metadatas.append(record["metadata"])
+                length, = _LENGTH.unpack(prefix)
+                texts.append(texts_file.read(length).decode("utf-8"))
+            yield ids, texts, metadatas, np.asarray(vectors[start:start + size], dtype=np.float32)
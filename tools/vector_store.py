@@ -1,29 +1,125 @@
-import os
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
+import uuid
+import threading
+from typing import Callable, Iterator, List, Dict, Any, Optional, Sequence, Set, Tuple
+
+from tools.vector_backends import VectorBackend, create_backend
+from tools.query_cache import QueryCache
+from tools.vector_snapshot import SnapshotWriter, read_manifest, read_snapshot
+
+class WriteObserver:
+    """VectorStore 的写入观察者，用于维护从向量数据库派生的索引（例如词法索引）。
+
+    回调在文档写入后端、从后端删除或集合被删除之后调用，可能来自写缓冲的定时线程，应只做内存操作；
+    persist 和 close 随 VectorStore 的同名方法调用，用于把派生索引保存到磁盘。
+    """
+    
+    def on_upsert(self, collection_name: str, ids: List[str], documents: List[str],
+                  metadatas: List[Optional[Dict[str, Any]]]) -> None:
+        pass
+    
+    def on_delete(self, collection_name: str, ids: List[str]) -> None:
+        pass
+    
+    def on_drop(self, collection_name: str) -> None:
+        pass
+    
+    def persist(self) -> None:
+        pass
+    
+    def close(self) -> None:
+        self.persist()
 
 class VectorStore:
-    """向量数据库管理类，使用ChromaDB"""
+    """向量数据库管理类
+
+    实际的存储由 VectorBackend 完成（ChromaDB、进程内的 FAISS 索引或内存映射的 NumPy 矩阵，按 vector_store_type 选择）。
+    buffer_documents 把文档放入写缓冲区，缓冲的文档数达到 write_buffer_size
+    或最早的文档等待超过 flush_interval 秒时自动写出；每次写入都按后端允许的最大批次拆分。
+    可以用 with 语句使用，退出时写出剩余的缓冲文档。
+    
+    每个集合有一个进程内的写版本号，写入、删除文档或删除集合时递增；配置了 query_cache 时，
+    search_many 按查询向量缓存结果，版本号变化后缓存的结果失效。
+    """
     
-    def __init__(self, persist_directory: str = "data/vector_store"):
+    def __init__(self, persist_directory: str = "data/vector_store",
+                 write_buffer_size: int = 1000,
+                 flush_interval: float = 2.0,
+                 max_batch_size: int = 0,
+                 vector_store_type: str = "chroma",
+                 backend_options: Optional[Dict[str, Any]] = None,
+                 backend: Optional[VectorBackend] = None,
+                 query_cache: Optional[QueryCache] = None,
+                 shards: int = 1):
         """
         初始化向量数据库
         
         Args:
             persist_directory: 持久化目录
+            write_buffer_size: 写缓冲区的文档数上限，达到后自动写出
+            flush_interval: 缓冲文档的最长等待时间（秒），0 表示只按数量和显式 flush 写出
+            max_batch_size: 单次写入的最大文档数，0 表示使用后端允许的上限
+            vector_store_type: 后端类型: chroma、faiss 或 numpy
+            backend_options: 后端的构造参数（例如 FAISS 的索引类型和 efSearch/nprobe）
+            backend: 直接使用的后端实例，给出时忽略 vector_store_type 和 backend_options
+            query_cache: 查询结果缓存，为 None 时不缓存
+            shards: 分片数，大于 1 时按文档ID的哈希把每个集合分布到多个独立的后端实例，查询并行发往所有分片
         """
         self.persist_directory = persist_directory
-        os.makedirs(persist_directory, exist_ok=True)
-        
-        # 初始化ChromaDB客户端
-        self.client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
+        self.backend = backend or create_backend(vector_store_type, persist_directory, backend_options, shards)
+        
+        backend_limit = self.backend.max_batch_size
+        self.max_batch_size = min(max_batch_size, backend_limit) if max_batch_size > 0 else backend_limit
+        self.write_buffer_size = max(1, write_buffer_size)
+        self.flush_interval = flush_interval
+        
+        self._lock = threading.RLock()
+        # 写缓冲区: 集合名称 -> 待写入的 (ID, 文本, 元数据, 向量)
+        self._buffer: Dict[str, List[Tuple[str, str, Optional[Dict[str, Any]], List[float]]]] = {}
+        # 缓冲文档写出后的回调: 集合名称 -> [(回调, 文档ID列表)]
+        self._callbacks: Dict[str, List[Tuple[Callable[[List[str]], None], List[str]]]] = {}
+        self._buffered_count = 0
+        self._timer: Optional[threading.Timer] = None
+        self._observers: List[WriteObserver] = []
+        self.query_cache = query_cache
+        self._versions: Dict[str, int] = {}
+    
+    def add_observer(self, observer: WriteObserver) -> None:
+        """
+        注册写入观察者，此后的写入、删除都会通知它
+        
+        Args:
+            observer: 写入观察者
+        """
+        self._observers.append(observer)
+    
+    def __enter__(self) -> "VectorStore":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            self.close()
+        except Exception as e:
+            if exc_type is None:
+                raise
+            # 已有异常时不覆盖原异常
+            print(f"写出缓冲文档失败: {e}")
+    
+    def _bump_version(self, collection_name: str) -> None:
+        with self._lock:
+            self._versions[collection_name] = self._versions.get(collection_name, 0) + 1
+    
+    def collection_version(self, collection_name: str) -> int:
+        """
+        集合的写版本号，用作查询结果缓存的失效依据。先写出该集合的缓冲文档，使版本号包含已提交的写入
+        
+        Args:
+            collection_name: 集合名称
+            
+        Returns:
+            int: 写版本号
+        """
+        self.flush(collection_name)
+        return self._versions.get(collection_name, 0)
     
     def create_collection(self, collection_name: str) -> None:
         """
@@ -33,53 +129,181 @@ class VectorStore:
             collection_name: 集合名称
         """
         try:
-            self.client.get_or_create_collection(collection_name)
+            self.backend.create_collection(collection_name)
             print(f"集合 '{collection_name}' 已存在或创建成功。")
         except Exception as e:
             print(f"创建或获取集合 '{collection_name}' 失败: {e}")
             raise
     
+    @staticmethod
+    def _to_records(documents: List[Dict[str, Any]]) -> List[Tuple[str, str, Optional[Dict[str, Any]], List[float]]]:
+        """转换为 (ID, 文本, 元数据, 向量)，没有ID的文档使用随机UUID；ChromaDB 不接受空的元数据字典，以 None 代替"""
+        return [
+            (doc.get("id") or uuid.uuid4().hex, doc["content"], doc.get("metadata") or None, doc["vector"])
+            for doc in documents
+        ]
+    
+    def _write(self, collection_name: str, records: List[Tuple[str, str, Optional[Dict[str, Any]], List[float]]]) -> None:
+        """按后端允许的最大批次拆分写入。使用 upsert，重复写入同一ID是幂等的；同一批次中重复的ID只保留最后一个"""
+        records = list({record[0]: record for record in records}.values())
+        try:
+            for start in range(0, len(records), self.max_batch_size):
+                ids, texts, metadatas, embeddings = zip(*records[start:start + self.max_batch_size])
+                self.backend.upsert(collection_name, list(ids), list(texts), list(metadatas), list(embeddings))
+                for observer in self._observers:
+                    observer.on_upsert(collection_name, list(ids), list(texts), list(metadatas))
+        finally:
+            # 部分批次写入后失败时也已改变集合内容
+            self._bump_version(collection_name)
+    
     def add_documents(self, collection_name: str, documents: List[Dict[str, Any]]) -> List[str]:
         """
-        添加文档到集合
+        添加或更新文档（立即写入，返回时已落盘；ID已存在时覆盖）
         
         Args:
             collection_name: 集合名称
-            documents: 包含 'content' 和 'vector' 的文档列表，以及可选的 'metadata'。
+            documents: 包含 'content' 和 'vector' 的文档列表，以及可选的 'id' 和 'metadata'。
                        每个文档字典应至少包含 {"content": str, "vector": List[float]}。
                        可选地，可以包含 {"metadata": Dict[str, Any]}。
             
         Returns:
             List[str]: 添加的文档ID列表
         """
-        collection = self.client.get_collection(collection_name)
-        
-        ids = []
-        texts = []
-        metadatas = []
-        embeddings = []
-        
-        for i, doc in enumerate(documents):
-            # 生成唯一ID，如果文档没有提供ID
-            doc_id = doc.get("id")
-            if not doc_id:
-                # 使用UUID或者其他更健壮的ID生成方式在实际应用中更好
-                # 这里为了简化，使用基于时间戳和索引的方式
-                doc_id = f"{collection_name}_{len(collection.peek()) + i}"
-            ids.append(doc_id)
-            texts.append(doc["content"])
-            embeddings.append(doc["vector"])
-            metadatas.append(doc.get("metadata", {}))
+        records = self._to_records(documents)
+        if records:
+            self._write(collection_name, records)
+        print(f"成功向集合 '{collection_name}' 添加 {len(records)} 个文档。")
+        return [record[0] for record in records]
+    
+    def buffer_documents(self, collection_name: str, documents: List[Dict[str, Any]],
+                         on_written: Optional[Callable[[List[str]], None]] = None) -> List[str]:
+        """
+        把文档放入写缓冲区，与其他文件的文档合并后批量写入
+        
+        Args:
+            collection_name: 集合名称
+            documents: 文档列表，格式与 add_documents 相同
+            on_written: 这些文档写入后调用，参数为文档ID列表；可能在自动写出的定时线程中调用
             
-        collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas,
-            embeddings=embeddings
-        )
-        print(f"成功向集合 '{collection_name}' 添加 {len(ids)} 个文档。")
+        Returns:
+            List[str]: 文档ID列表（尚未写入）
+        """
+        records = self._to_records(documents)
+        ids = [record[0] for record in records]
+        if not records:
+            if on_written is not None:
+                on_written(ids)
+            return ids
+        
+        with self._lock:
+            self._buffer.setdefault(collection_name, []).extend(records)
+            if on_written is not None:
+                self._callbacks.setdefault(collection_name, []).append((on_written, ids))
+            self._buffered_count += len(records)
+            if self._buffered_count >= self.write_buffer_size:
+                self.flush()
+            elif self.flush_interval > 0 and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
         return ids
     
+    def _flush_on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            try:
+                self.flush()
+            except Exception as e:
+                # 写出失败的文档仍留在缓冲区，下次写出时重试
+                print(f"定时写出缓冲文档失败: {e}")
+    
+    def flush(self, collection_name: Optional[str] = None) -> int:
+        """
+        写出写缓冲区中的文档，并调用对应的回调
+        
+        Args:
+            collection_name: 只写出该集合的文档，默认写出全部
+            
+        Returns:
+            int: 写入的文档数
+        """
+        written = 0
+        with self._lock:
+            names = [collection_name] if collection_name is not None else list(self._buffer)
+            for name in names:
+                records = self._buffer.pop(name, [])
+                callbacks = self._callbacks.pop(name, [])
+                if not records:
+                    continue
+                try:
+                    self._write(name, records)
+                except Exception:
+                    # 保留未写出的文档和回调，交给调用方处理
+                    self._buffer[name] = records + self._buffer.get(name, [])
+                    self._callbacks[name] = callbacks + self._callbacks.get(name, [])
+                    raise
+                self._buffered_count -= len(records)
+                written += len(records)
+                print(f"成功向集合 '{name}' 写入 {len(records)} 个缓冲文档。")
+                for callback, ids in callbacks:
+                    try:
+                        callback(ids)
+                    except Exception as e:
+                        # 文档已经写入，回调失败不影响其他回调，也不能中断 close 中后端的关闭
+                        print(f"集合 '{name}' 的写入回调失败: {e}")
+            if not self._buffered_count and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return written
+    
+    def persist(self) -> None:
+        """写出缓冲文档，并让后端把内存中的索引保存到磁盘（FAISS 后端平时只按 save_interval 保存索引文件）"""
+        with self._lock:
+            self.flush()
+            self.backend.persist()
+            for observer in self._observers:
+                observer.persist()
+    
+    def discard_buffer(self, collection_name: str) -> int:
+        """
+        丢弃集合尚未写出的缓冲文档及其回调（入库异常中止、回调依赖的状态即将失效时使用）
+        
+        Args:
+            collection_name: 集合名称
+            
+        Returns:
+            int: 丢弃的文档数
+        """
+        with self._lock:
+            discarded = len(self._buffer.get(collection_name, []))
+            self._discard_buffer(collection_name)
+            if not self._buffered_count and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return discarded
+    
+    def close(self) -> None:
+        """写出剩余的缓冲文档并停止定时写出，然后关闭后端；写出失败时仍会关闭后端，再抛出异常"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            try:
+                self.flush()
+            finally:
+                self.backend.close()
+                for observer in self._observers:
+                    observer.close()
+    
+    # search_many 的 include 可选字段 -> 结果字典中的键
+    SEARCH_FIELDS = {
+        "documents": "content",
+        "metadatas": "metadata",
+        "distances": "distance",
+        "embeddings": "vector"
+    }
+    DEFAULT_INCLUDE = ("documents", "metadatas", "distances")
+    
     def search(
         self,
         collection_name: str,
@@ -97,30 +321,283 @@ class VectorStore:
             where: 过滤条件
             
         Returns:
-            List[Dict[str, Any]]: 搜索结果列表，包含 content, metadata, distance
-        """
-        collection = self.client.get_collection(collection_name)
-        
-        results = collection.query(
-            query_embeddings=[query_vector],
-            n_results=n_results,
-            where=where
-        )
-        
-        formatted_results = []
-        if results["documents"] and results["embeddings"] and results["metadatas"] and results["distances"]:
-            for doc, meta, dist in zip(
-                results["documents"][0],
-                results["metadatas"][0],
-                results["distances"][0]
-            ):
-                formatted_results.append({
-                    "content": doc,
-                    "metadata": meta,
-                    "distance": dist
-                })
+            List[Dict[str, Any]]: 搜索结果列表，包含 id, content, metadata, distance
+        """
+        return self.search_many(collection_name, [query_vector], n_results=n_results, where=where)[0]
+    
+    def search_many(
+        self,
+        collection_name: str,
+        query_vectors: Sequence[List[float]],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        include: Sequence[str] = DEFAULT_INCLUDE
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        一次查询多个向量（按后端最大批次拆分），只返回 include 中指定的字段
+        
+        Args:
+            collection_name: 集合名称
+            query_vectors: 查询向量列表
+            n_results: 每个查询返回的结果数量
+            where: 过滤条件，作用于所有查询
+            include: 需要返回的字段，可选 documents、metadatas、distances、embeddings；
+                     不需要文本或向量时省略对应字段可以减少传输量
+            
+        Returns:
+            List[List[Dict[str, Any]]]: 与 query_vectors 顺序一致的结果列表，每个结果包含 id，
+                以及 include 对应的 content、metadata、distance、vector
+        """
+        unknown = set(include) - set(self.SEARCH_FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的返回字段: {sorted(unknown)}，可选 {list(self.SEARCH_FIELDS)}")
+        if not query_vectors:
+            return []
+        # 先写出该集合的缓冲文档，保证能查到已提交的写入；版本号在查询之前读取
+        version = self.collection_version(collection_name)
+        
+        formatted_results: List[Optional[List[Dict[str, Any]]]] = [None] * len(query_vectors)
+        keys: List[Optional[str]] = [None] * len(query_vectors)
+        if self.query_cache is not None:
+            for i, vector in enumerate(query_vectors):
+                keys[i] = QueryCache.make_key("vector", collection_name, QueryCache.vector_digest(vector),
+                                              n_results, where, sorted(include))
+                formatted_results[i] = self.query_cache.get(keys[i], version)
+        # 只查询未命中缓存的向量
+        pending = [i for i, hits in enumerate(formatted_results) if hits is None]
+        for start in range(0, len(pending), self.max_batch_size):
+            batch = pending[start:start + self.max_batch_size]
+            results = self.backend.query(collection_name, [query_vectors[i] for i in batch], n_results, where, list(include))
+            fields = [(key, results[field]) for field, key in self.SEARCH_FIELDS.items()
+                      if field in include and results.get(field) is not None]
+            for i, ids in enumerate(results["ids"]):
+                hits = []
+                for j, doc_id in enumerate(ids):
+                    hit = {"id": doc_id}
+                    for key, values in fields:
+                        hit[key] = values[i][j]
+                    hits.append(hit)
+                formatted_results[batch[i]] = hits
+                if self.query_cache is not None:
+                    self.query_cache.put(keys[batch[i]], collection_name, version, hits)
         return formatted_results
     
+    # get_documents 的 include 可选字段
+    GET_FIELDS = ("documents", "metadatas", "embeddings")
+    
+    def get_documents(
+        self,
+        collection_name: str,
+        ids: Sequence[str],
+        include: Sequence[str] = ("documents", "metadatas")
+    ) -> List[Dict[str, Any]]:
+        """
+        按ID取出文档（不需要查询向量）
+        
+        Args:
+            collection_name: 集合名称
+            ids: 文档ID列表
+            include: 需要返回的字段，可选 documents、metadatas、embeddings
+            
+        Returns:
+            List[Dict[str, Any]]: 与 ids 顺序一致的文档，包含 id 以及 include 对应的 content、metadata、vector；
+                不存在的ID被跳过
+        """
+        unknown = set(include) - set(self.GET_FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的返回字段: {sorted(unknown)}，可选 {list(self.GET_FIELDS)}")
+        if not ids:
+            return []
+        self.flush(collection_name)
+        found: Dict[str, Dict[str, Any]] = {}
+        ids = list(ids)
+        for start in range(0, len(ids), self.max_batch_size):
+            results = self.backend.get(collection_name, ids[start:start + self.max_batch_size], list(include))
+            for doc in self._format_get(results, include):
+                found[doc["id"]] = doc
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+    
+    def stored_ids(self, collection_name: str, ids: Sequence[str]) -> Set[str]:
+        """
+        返回其中已写入后端的文档ID（写缓冲区中尚未写出的文档不算，也不会触发写出）
+        
+        Args:
+            collection_name: 集合名称
+            ids: 文档ID列表
+            
+        Returns:
+            Set[str]: 已写入的文档ID
+        """
+        ids = list(dict.fromkeys(ids))
+        found: Set[str] = set()
+        for start in range(0, len(ids), self.max_batch_size):
+            results = self.backend.get(collection_name, ids[start:start + self.max_batch_size], [])
+            found.update(results["ids"])
+        return found
+    
+    def stored_metadatas(self, collection_name: str, ids: Sequence[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        返回已写入后端的文档的元数据（不触发写缓冲区的写出，可以在写出回调中调用）
+        
+        Args:
+            collection_name: 集合名称
+            ids: 文档ID列表
+            
+        Returns:
+            Dict[str, Optional[Dict[str, Any]]]: 文档ID -> 元数据，不存在的ID不出现
+        """
+        ids = list(dict.fromkeys(ids))
+        found: Dict[str, Optional[Dict[str, Any]]] = {}
+        for start in range(0, len(ids), self.max_batch_size):
+            results = self.backend.get(collection_name, ids[start:start + self.max_batch_size], ["metadatas"])
+            found.update(zip(results["ids"], results["metadatas"]))
+        return found
+    
+    def update_metadatas(self, collection_name: str, metadatas: Dict[str, Dict[str, Any]]) -> int:
+        """
+        替换已写入文档的元数据，文本和向量不变（后端没有单独更新元数据的接口，取出后重新写入）
+        
+        Args:
+            collection_name: 集合名称
+            metadatas: 文档ID -> 新的元数据
+            
+        Returns:
+            int: 更新的文档数（不存在的ID被跳过）
+        """
+        ids = list(metadatas)
+        records = []
+        for start in range(0, len(ids), self.max_batch_size):
+            results = self.backend.get(collection_name, ids[start:start + self.max_batch_size], ["documents", "embeddings"])
+            records.extend(
+                (doc_id, text, metadatas[doc_id] or None, vector)
+                for doc_id, text, vector in zip(results["ids"], results["documents"], results["embeddings"])
+            )
+        if records:
+            self._write(collection_name, records)
+        return len(records)
+    
+    def iter_documents(
+        self,
+        collection_name: str,
+        batch_size: int = 1000,
+        include: Sequence[str] = ("documents", "metadatas")
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        按写入顺序分批取出集合中的全部文档（用于重建派生索引、导出）；遍历期间不应写入该集合
+        
+        Args:
+            collection_name: 集合名称
+            batch_size: 每批的文档数
+            include: 需要返回的字段，可选 documents、metadatas、embeddings
+            
+        Yields:
+            List[Dict[str, Any]]: 一批文档，格式与 get_documents 相同
+        """
+        self.flush(collection_name)
+        batch_size = max(1, min(batch_size, self.max_batch_size))
+        offset = 0
+        while True:
+            results = self.backend.get(collection_name, None, list(include), limit=batch_size, offset=offset)
+            documents = self._format_get(results, include)
+            if not documents:
+                return
+            yield documents
+            offset += len(documents)
+    
+    def _format_get(self, results: Dict[str, Any], include: Sequence[str]) -> List[Dict[str, Any]]:
+        fields = [(key, results[field]) for field, key in self.SEARCH_FIELDS.items()
+                  if field in include and results.get(field) is not None]
+        documents = []
+        for i, doc_id in enumerate(results["ids"]):
+            doc = {"id": doc_id}
+            for key, values in fields:
+                doc[key] = values[i]
+            documents.append(doc)
+        return documents
+    
+    def export_snapshot(self, collection_name: str, path: str, dtype: str = "float32", batch_size: int = 5000) -> Dict[str, Any]:
+        """
+        把集合导出为快照目录（向量矩阵 + 文本 + 元数据，格式见 SnapshotWriter），用于迁移或重置后恢复；
+        导出期间不应写入该集合
+        
+        Args:
+            collection_name: 集合名称
+            path: 快照目录，不能已存在
+            dtype: 向量的存储类型: float16（体积减半）或 float32（无损）
+            batch_size: 每批读取的文档数
+            
+        Returns:
+            Dict[str, Any]: 快照的 manifest（collection、count、dim、dtype）
+        """
+        writer = SnapshotWriter(path, collection_name, dtype)
+        try:
+            for documents in self.iter_documents(collection_name, batch_size, include=self.GET_FIELDS):
+                writer.write(
+                    [doc["id"] for doc in documents],
+                    [doc["content"] for doc in documents],
+                    [doc.get("metadata") for doc in documents],
+                    [doc["vector"] for doc in documents]
+                )
+        except BaseException:
+            writer.abort()
+            raise
+        manifest = writer.close()
+        print(f"已把集合 '{collection_name}' 的 {manifest['count']} 个文档导出到 {path}")
+        return manifest
+    
+    def import_snapshot(self, path: str, collection_name: Optional[str] = None, batch_size: int = 5000) -> int:
+        """
+        从快照目录流式分批导入文档（不需要重新向量化）；集合不存在时创建，已有的同ID文档被覆盖
+        
+        Args:
+            path: export_snapshot 生成的快照目录
+            collection_name: 目标集合名称，默认使用快照中记录的集合名称
+            batch_size: 每批写入的文档数
+            
+        Returns:
+            int: 导入的文档数
+        """
+        collection_name = collection_name or read_manifest(path)["collection"]
+        self.create_collection(collection_name)
+        # 先写出缓冲中的旧文档，避免它们覆盖快照中的同ID文档
+        self.flush(collection_name)
+        imported = 0
+        for ids, texts, metadatas, vectors in read_snapshot(path, min(batch_size, self.max_batch_size)):
+            self._write(collection_name, list(zip(ids, texts, [metadata or None for metadata in metadatas], vectors.tolist())))
+            imported += len(ids)
+        print(f"已从 {path} 向集合 '{collection_name}' 导入 {imported} 个文档")
+        return imported
+    
+    def delete_documents(self, collection_name: str, ids: List[str]) -> None:
+        """
+        按ID删除文档
+        
+        Args:
+            collection_name: 集合名称
+            ids: 待删除的文档ID列表
+        """
+        if not ids:
+            return
+        # 先写出该集合的缓冲文档，避免删除之后又被写入
+        self.flush(collection_name)
+        self.backend.delete(collection_name, ids)
+        self._bump_version(collection_name)
+        for observer in self._observers:
+            observer.on_delete(collection_name, ids)
+        print(f"已从集合 '{collection_name}' 删除 {len(ids)} 个文档。")
+    
+    def count(self, collection_name: str) -> int:
+        """
+        统计集合中的文档数量
+        
+        Args:
+            collection_name: 集合名称
+            
+        Returns:
+            int: 文档数量
+        """
+        return self.backend.count(collection_name)
+    
     def delete_collection(self, collection_name: str) -> None:
         """
         删除集合
@@ -128,7 +605,12 @@ class VectorStore:
         Args:
             collection_name: 集合名称
         """
-        self.client.delete_collection(collection_name)
+        with self._lock:
+            self._discard_buffer(collection_name)
+        self.backend.delete_collection(collection_name)
+        self._bump_version(collection_name)
+        for observer in self._observers:
+            observer.on_drop(collection_name)
         print(f"集合 '{collection_name}' 已删除。")
     
     def list_collections(self) -> List[str]:
@@ -138,11 +620,25 @@ class VectorStore:
         Returns:
             List[str]: 集合名称列表
         """
-        return [c.name for c in self.client.list_collections()]
+        return self.backend.list_collections()
     
     def reset_db(self) -> None:
         """
-        重置ChromaDB数据库，删除所有集合。
+        重置向量数据库，删除所有集合。
         """
-        self.client.reset()
-        print("ChromaDB数据库已重置。") 
\ No newline at end of file
+        with self._lock:
+            for name in list(self._buffer):
+                self._discard_buffer(name)
+        names = self.backend.list_collections()
+        self.backend.reset()
+        for name in names:
+            self._bump_version(name)
+            for observer in self._observers:
+                observer.on_drop(name)
+        print("向量数据库已重置。")
+    
+    def _discard_buffer(self, collection_name: str) -> None:
+        """丢弃集合的缓冲文档（集合被删除时），不调用回调"""
+        records = self._buffer.pop(collection_name, [])
+        self._callbacks.pop(collection_name, None)
+        self._buffered_count -= len(records) 
\ No newline at end of file
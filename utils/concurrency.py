@@ -0,0 +1,324 @@
+import asyncio
+import random
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar, Union
+
+try:
+    import httpx
+    _TRANSPORT_ERRORS: Tuple[type, ...] = (httpx.TransportError,)
+except ImportError:
+    _TRANSPORT_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 可以重试的 HTTP 状态码：限流和服务端错误
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """取出异常中的 HTTP 状态码（ollama.ResponseError.status_code 或 httpx 的 response.status_code），没有时返回 None"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) and status > 0 else None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    判断错误是否是暂时性的（重试可能成功）：连接错误、超时，以及 408/429/5xx 响应。
+    4xx 响应（模型不存在、输入无效等）和本地的参数错误重试也不会成功，不属于暂时性错误。
+
+    Args:
+        error: 异常
+
+    Returns:
+        bool: 是否是暂时性错误
+    """
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError) + _TRANSPORT_ERRORS):
+        return True
+    status = error_status(error)
+    return status is not None and status in _TRANSIENT_STATUS
+
+class AdaptiveLimiter:
+    """基于 AIMD（加性增、乘性减）的自适应并发窗口。
+
+    每个请求成功且延迟低于目标值时窗口约每轮增加 1；出现暂时性错误或延迟超过目标值时窗口乘以
+    decrease_factor，且同一冷却期内只收缩一次，避免一批同时超时的请求把窗口压到最小。
+    非暂时性错误（例如 4xx 响应）不说明服务端过载，不参与窗口调整。
+    """
+
+    def __init__(self,
+                 initial_limit: int = 4,
+                 min_limit: int = 1,
+                 max_limit: int = 64,
+                 target_latency: float = 2.0,
+                 decrease_factor: float = 0.5):
+        """
+        初始化并发窗口
+
+        Args:
+            initial_limit: 初始并发数
+            min_limit: 最小并发数
+            max_limit: 最大并发数
+            target_latency: 目标延迟（秒），超过视为过载
+            decrease_factor: 过载时窗口的收缩系数
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError(f"并发窗口参数无效: min={min_limit}, initial={initial_limit}, max={max_limit}")
+        if not 0 < decrease_factor < 1:
+            raise ValueError(f"decrease_factor 必须在 (0, 1) 之间: {decrease_factor}")
+
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """等待直到在途请求数小于当前窗口"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, error: bool = False, observe: bool = True) -> None:
+        """
+        释放一个并发名额并根据观测结果调整窗口
+
+        Args:
+            latency: 本次请求耗时（秒）
+            error: 本次请求是否失败
+            observe: 是否用本次结果调整窗口（请求被取消时为 False）
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if not observe:
+                pass
+            elif error or latency > self.target_latency:
+                self.failures += 1 if error else 0
+                # 冷却期取目标延迟，保证每轮最多收缩一次
+                if now - self._last_decrease >= self.target_latency:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.debug(f"并发窗口收缩至 {self.limit:.2f} (延迟={latency:.3f}s, 错误={error})")
+            else:
+                self.successes += 1
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        占用一个并发名额，退出时自动记录延迟和是否出错；被取消或因非暂时性错误失败的请求不参与窗口调整
+        """
+        await self.acquire()
+        start = time.perf_counter()
+        error = False
+        observe = True
+        try:
+            yield
+        except Exception as e:
+            if is_transient_error(e):
+                error = True
+            else:
+                observe = False
+            raise
+        except BaseException:
+            observe = False
+            raise
+        finally:
+            await self.release(time.perf_counter() - start, error=error, observe=observe)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取窗口统计信息
+
+        Returns:
+            Dict[str, Any]: 当前窗口、在途请求数及成功/失败次数
+        """
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+def _backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """full jitter：在 [0, min(max_delay, base * 2^n)] 内随机等待，避免重试风暴"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+async def retry_async(func: Callable[[], Awaitable[T]],
+                      max_retries: int = 3,
+                      base_delay: float = 0.5,
+                      max_delay: float = 8.0,
+                      retry_if: Callable[[BaseException], bool] = is_transient_error) -> T:
+    """
+    带抖动指数退避的异步重试，默认只重试暂时性错误
+
+    Args:
+        func: 无参协程工厂，每次重试都会重新调用
+        max_retries: 最大重试次数（不含首次调用）
+        base_delay: 退避基准时长（秒）
+        max_delay: 单次退避上限（秒）
+        retry_if: 判断异常是否需要重试的函数
+
+    Returns:
+        T: func 的返回值
+
+    Raises:
+        最后一次调用抛出的异常
+    """
+    attempt = 0
+    while True:
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= max_retries or not retry_if(e):
+                raise
+            delay = _backoff_delay(attempt, base_delay, max_delay)
+            attempt += 1
+            logger.warning(f"请求失败，{delay:.2f}s 后进行第 {attempt}/{max_retries} 次重试: {e}")
+            await asyncio.sleep(delay)
+
+
+def retry_sync(func: Callable[[], T],
+               max_retries: int = 3,
+               base_delay: float = 0.5,
+               max_delay: float = 8.0,
+               retry_if: Callable[[BaseException], bool] = is_transient_error) -> T:
+    """
+    retry_async 的同步版本，在当前线程中等待退避时间
+
+    Args:
+        func: 无参函数，每次重试都会重新调用
+        max_retries: 最大重试次数（不含首次调用）
+        base_delay: 退避基准时长（秒）
+        max_delay: 单次退避上限（秒）
+        retry_if: 判断异常是否需要重试的函数
+
+    Returns:
+        T: func 的返回值
+
+    Raises:
+        最后一次调用抛出的异常
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not retry_if(e):
+                raise
+            delay = _backoff_delay(attempt, base_delay, max_delay)
+            attempt += 1
+            logger.warning(f"请求失败，{delay:.2f}s 后进行第 {attempt}/{max_retries} 次重试: {e}")
+            time.sleep(delay)
+
+
+class MicroBatcher(Generic[T, R]):
+    """把短时间内并发提交的请求合并为一次批量调用。
+
+    第一个请求到达后最多等待 max_wait 秒（或攒满 max_batch_size 个）再调用 handler，
+    handler 按输入顺序返回结果，某一项的结果为异常实例时只有该请求失败；handler 整体抛出异常时该批请求全部失败。
+    负载低时每个请求最多增加 max_wait 的延迟，负载高时每批包含更多请求，下游调用次数不随请求数线性增长。
+    必须在同一个事件循环中使用。
+    """
+
+    def __init__(self, handler: Callable[[List[T]], Awaitable[Sequence[Union[R, BaseException]]]],
+                 max_batch_size: int = 32, max_wait: float = 0.005):
+        """
+        Args:
+            handler: 批量处理函数，接收一批请求，返回与之等长的结果列表
+            max_batch_size: 每批的最大请求数
+            max_wait: 第一个请求的最长等待时间（秒）
+        """
+        if max_batch_size <= 0:
+            raise ValueError(f"max_batch_size 必须为正整数: {max_batch_size}")
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, item: T) -> R:
+        """
+        提交一个请求并等待其结果
+
+        Args:
+            item: 请求
+
+        Returns:
+            R: handler 为该请求返回的结果
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        task = asyncio.ensure_future(self._run(batch))
+        # 保留任务的引用，避免执行中被垃圾回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"批量处理返回 {len(results)} 个结果，与请求数 {len(batch)} 不一致")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # 已取消（例如请求超时）的请求直接丢弃结果
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取批处理统计信息
+
+        Returns:
+            Dict[str, Any]: 批次数、请求数、平均和最大批大小
+        """
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
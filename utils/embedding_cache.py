@@ -0,0 +1,247 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+import unicodedata
+import logging
+from array import array
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """基于 SQLite 的持久化嵌入缓存。
+
+    以 (嵌入模型, 规范化文本哈希) 为键存储 float32 向量，按最近访问时间做 LRU 淘汰，
+    条目数超过 max_entries 时删除最久未访问的条目。
+    """
+
+    # SQLite 单条语句允许的参数个数有限，批量查询时按此大小分段
+    _QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, path: str, max_entries: int = 1_000_000):
+        """
+        初始化嵌入缓存
+
+        Args:
+            path: SQLite 数据库文件路径
+            max_entries: 最大缓存条目数，超过后按 LRU 淘汰
+        """
+        if max_entries <= 0:
+            raise ValueError(f"max_entries 必须为正整数: {max_entries}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access INTEGER NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"嵌入缓存已打开: {path}，现有条目 {self._entries}")
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """
+        计算规范化文本的哈希值（NFC 规范化、统一换行符并去除首尾空白）
+
+        Args:
+            text: 原始文本
+
+        Returns:
+            str: 十六进制 SHA-256 摘要
+        """
+        normalized = unicodedata.normalize("NFC", text).replace("\r\n", "\n").strip()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        批量查询缓存
+
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+
+        Returns:
+            List[Optional[List[float]]]: 与输入顺序一致的向量，未命中为 None
+        """
+        hashes = [self.text_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        now = time.time_ns()
+
+        with self._lock:
+            for start in range(0, len(unique_hashes), self._QUERY_CHUNK_SIZE):
+                part = unique_hashes[start:start + self._QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *part]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[text_hash] = vector.tolist()
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        查询单条缓存
+
+        Args:
+            model: 嵌入模型名称
+            text: 文本
+
+        Returns:
+            Optional[List[float]]: 命中时返回向量，否则返回 None
+        """
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        批量写入缓存
+
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+            vectors: 与 texts 一一对应的向量
+        """
+        if len(texts) != len(vectors):
+            raise ValueError(f"文本数 {len(texts)} 与向量数 {len(vectors)} 不一致")
+        now = time.time_ns()
+        rows = [
+            (model, self.text_hash(text), self._to_blob(vector), now)
+            for text, vector in zip(texts, vectors)
+            if vector is not None and len(vector) > 0
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._entries += self._conn.total_changes - before
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    @staticmethod
+    def _to_blob(vector: Sequence[float]) -> bytes:
+        """将向量序列化为 float32 字节串，NumPy 数组直接转换以避免逐元素迭代"""
+        if hasattr(vector, "astype"):
+            return vector.astype("<f4").tobytes()
+        return array("f", vector).tobytes()
+
+    def put(self, model: str, text: str, vector: Sequence[float]) -> None:
+        """
+        写入单条缓存
+
+        Args:
+            model: 嵌入模型名称
+            text: 文本
+            vector: 嵌入向量
+        """
+        self.put_many(model, [text], [vector])
+
+    def _evict(self) -> None:
+        """淘汰最久未访问的条目，使条目数回落到上限的 90%，避免每次写入都触发淘汰。调用方需持有锁。"""
+        target = int(self.max_entries * 0.9)
+        excess = self._entries - target
+        before = self._conn.total_changes
+        self._conn.execute(
+            """
+            DELETE FROM embeddings WHERE (model, text_hash) IN (
+                SELECT model, text_hash FROM embeddings ORDER BY last_access LIMIT ?
+            )
+            """,
+            (excess,)
+        )
+        evicted = self._conn.total_changes - before
+        self._entries -= evicted
+        logger.info(f"嵌入缓存淘汰 {evicted} 个条目，剩余 {self._entries}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 包含 hits、misses、hit_rate、entries 的字典
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": self._entries,
+            }
+
+    def clear(self) -> None:
+        """清空缓存并重置计数器"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._entries = 0
+            self.hits = 0
+            self.misses = 0
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+_shared_caches: Dict[str, EmbeddingCache] = {}
+_shared_caches_lock = threading.Lock()
+
+def get_shared_cache(path: str, max_entries: int = 1_000_000) -> EmbeddingCache:
+    """
+    获取进程内共享的嵌入缓存实例，同一路径只打开一次数据库连接
+
+    Args:
+        path: SQLite 数据库文件路径
+        max_entries: 最大缓存条目数（仅在首次打开时生效）
+
+    Returns:
+        EmbeddingCache: 缓存实例
+    """
+    key = os.path.abspath(path)
+    with _shared_caches_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(path, max_entries=max_entries)
+            _shared_caches[key] = cache
+        return cache
@@ -0,0 +1,134 @@
+import time
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Mapping, Optional, Tuple
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+class GenerationStats(BaseModel):
+    """单次生成调用的延迟统计"""
+    model: str = Field("", description="生成模型名称")
+    time_to_first_token: Optional[float] = Field(None, description="从发出请求到收到首个 token 的耗时（秒）")
+    total_latency: float = Field(0.0, description="从发出请求到生成结束的总耗时（秒）")
+    output_tokens: int = Field(0, description="生成的 token 数")
+    prompt_tokens: Optional[int] = Field(None, description="提示词 token 数（由服务端返回）")
+    tokens_per_second: Optional[float] = Field(None, description="生成速度（token/秒）")
+
+    def summary(self) -> str:
+        """返回便于日志输出的单行摘要"""
+        ttft = f"{self.time_to_first_token * 1000:.0f}ms" if self.time_to_first_token is not None else "-"
+        speed = f"{self.tokens_per_second:.1f}" if self.tokens_per_second is not None else "-"
+        return (f"模型={self.model}, 首token={ttft}, 总耗时={self.total_latency:.2f}s, "
+                f"输出tokens={self.output_tokens}, 速度={speed} tokens/s")
+
+
+class _StreamRecorder:
+    """记录流式响应的时间点和 token 计数，供同步和异步流共用"""
+
+    def __init__(self, model: str):
+        self.stats = GenerationStats(model=model)
+        self.parts: List[str] = []
+        self._started = time.perf_counter()
+        self._first_token_at: Optional[float] = None
+        self._chunk_count = 0
+
+    def on_chunk(self, chunk: Mapping[str, Any]) -> str:
+        """处理一个响应块，返回其中的增量文本"""
+        delta = chunk.get("response", "") or ""
+        if delta:
+            if self._first_token_at is None:
+                self._first_token_at = time.perf_counter()
+                self.stats.time_to_first_token = self._first_token_at - self._started
+            self._chunk_count += 1
+            self.parts.append(delta)
+
+        if chunk.get("done"):
+            # Ollama 在最后一个块中返回服务端统计，eval_duration 单位为纳秒
+            eval_count = chunk.get("eval_count")
+            eval_duration = chunk.get("eval_duration")
+            if eval_count:
+                self.stats.output_tokens = eval_count
+                if eval_duration:
+                    self.stats.tokens_per_second = eval_count / (eval_duration / 1e9)
+            self.stats.prompt_tokens = chunk.get("prompt_eval_count")
+        return delta
+
+    def finish(self) -> GenerationStats:
+        """结束计时并补全服务端未返回的统计项"""
+        finished = time.perf_counter()
+        self.stats.total_latency = finished - self._started
+        if not self.stats.output_tokens:
+            # 服务端未返回 eval_count 时，以增量块数近似 token 数
+            self.stats.output_tokens = self._chunk_count
+        if self.stats.tokens_per_second is None and self._first_token_at is not None:
+            decode_time = finished - self._first_token_at
+            if decode_time > 0:
+                self.stats.tokens_per_second = self.stats.output_tokens / decode_time
+        logger.info(f"LLM流式生成完成: {self.stats.summary()}")
+        return self.stats
+
+
+class GenerationStream:
+    """同步流式生成结果。迭代产出增量文本，迭代结束后可通过 stats 获取延迟统计。"""
+
+    def __init__(self, model: str, open_stream: Callable[[], Iterator[Mapping[str, Any]]]):
+        """
+        Args:
+            model: 生成模型名称
+            open_stream: 发出请求并返回响应块迭代器的函数，在开始迭代时才调用
+        """
+        self._model = model
+        self._open_stream = open_stream
+        self._recorder: Optional[_StreamRecorder] = None
+        self.stats: Optional[GenerationStats] = None
+
+    def __iter__(self) -> Iterator[str]:
+        if self._recorder is not None:
+            raise RuntimeError("GenerationStream 只能迭代一次")
+        self._recorder = _StreamRecorder(self._model)
+        for chunk in self._open_stream():
+            delta = self._recorder.on_chunk(chunk)
+            if delta:
+                yield delta
+        self.stats = self._recorder.finish()
+
+    @property
+    def text(self) -> str:
+        """已收到的完整文本"""
+        return "".join(self._recorder.parts) if self._recorder else ""
+
+
+class AsyncGenerationStream:
+    """异步流式生成结果。异步迭代产出增量文本，迭代结束后可通过 stats 获取延迟统计。"""
+
+    def __init__(self, model: str,
+                 open_stream: Callable[[], Awaitable[Tuple[Optional[Mapping[str, Any]], AsyncIterator[Mapping[str, Any]]]]]):
+        """
+        Args:
+            model: 生成模型名称
+            open_stream: 发出请求并返回 (首个响应块, 剩余响应块异步迭代器) 的协程函数，在开始迭代时才调用
+        """
+        self._model = model
+        self._open_stream = open_stream
+        self._recorder: Optional[_StreamRecorder] = None
+        self.stats: Optional[GenerationStats] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        if self._recorder is not None:
+            raise RuntimeError("AsyncGenerationStream 只能迭代一次")
+        self._recorder = _StreamRecorder(self._model)
+        first, rest = await self._open_stream()
+        if first is not None:
+            delta = self._recorder.on_chunk(first)
+            if delta:
+                yield delta
+            async for chunk in rest:
+                delta = self._recorder.on_chunk(chunk)
+                if delta:
+                    yield delta
+        self.stats = self._recorder.finish()
+
+    @property
+    def text(self) -> str:
+        """已收到的完整文本"""
+        return "".join(self._recorder.parts) if self._recorder else ""
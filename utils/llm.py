@@ -1,12 +1,40 @@
-import os
-from typing import Dict, Any, Optional, List
-from pydantic import BaseModel, Field, model_validator
-import tomli
+import asyncio
+import time
+from typing import Dict, Any, Optional, List, Tuple
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 import ollama
 import logging
+import numpy as np
+
+from utils.embedding_cache import EmbeddingCache, get_shared_cache
+from utils.concurrency import AdaptiveLimiter, error_status, is_transient_error, retry_async, retry_sync
+from utils.local_embedder import LocalEmbedder
+from utils.settings import ConcurrencySettings, get_settings
+from utils.generation import GenerationStream, AsyncGenerationStream
 
 logger = logging.getLogger(__name__)
 
+def _retry_items(error: BaseException) -> bool:
+    """
+    整批嵌入失败后是否值得逐条重新请求以定位失败的条目。
+    暂时性错误在整批请求时已经按 [llm.concurrency] 的设置重试过，鉴权失败、模型不存在对每一条都一样，
+    这些情况下逐条请求只会重复失败。
+    """
+    return not is_transient_error(error) and error_status(error) not in (401, 403, 404)
+
+
+class EmbeddingBatch(BaseModel):
+    """批量嵌入结果。embeddings 与输入文本顺序一一对应，失败项为 None，失败原因记录在 errors 中。
+    Ollama 后端返回 List[float]，本地后端返回 float32 NumPy 行向量。"""
+    embeddings: List[Optional[Any]] = Field(default_factory=list, description="按输入顺序排列的嵌入向量")
+    errors: Dict[int, str] = Field(default_factory=dict, description="失败项的输入下标及错误信息")
+
+    @property
+    def failed_indices(self) -> List[int]:
+        """返回嵌入失败的输入下标（升序）。"""
+        return sorted(self.errors)
+
+
 class LLM(BaseModel):
     """语言模型接口抽象类。"""
     # 这些字段将从 config.toml 中填充
@@ -20,9 +48,20 @@ class LLM(BaseModel):
     embedding_model: str = Field("", description="用于文本嵌入的LLM模型名称")
     embedding_base_url: str = Field("", description="嵌入API基础URL")
     embedding_api_key: str = Field("ollama", description="嵌入API Key")
+    embedding_batch_size: int = Field(32, description="单次批量嵌入请求包含的最大文本数")
+    embedding_backend: str = Field("ollama", description="嵌入后端: ollama 或 sentence_transformers")
+    local_embedder: Optional[LocalEmbedder] = Field(None, exclude=True)
 
     ollama_gen_client: Optional[ollama.Client] = Field(None, exclude=True)
     ollama_embed_client: Optional[ollama.Client] = Field(None, exclude=True)
+    embedding_cache: Optional[EmbeddingCache] = Field(None, exclude=True)
+
+    # 异步客户端设置，将从 [llm.concurrency] 中填充
+    concurrency: ConcurrencySettings = Field(default_factory=ConcurrencySettings, description="异步请求的并发窗口与重试设置")
+    ollama_async_gen_client: Optional[ollama.AsyncClient] = Field(None, exclude=True)
+    ollama_async_embed_client: Optional[ollama.AsyncClient] = Field(None, exclude=True)
+    async_limiter: Optional[AdaptiveLimiter] = Field(None, exclude=True)
+    _async_loop: Optional[asyncio.AbstractEventLoop] = PrivateAttr(None)
 
     class Config:
         arbitrary_types_allowed = True
@@ -30,25 +69,51 @@ class LLM(BaseModel):
     @model_validator(mode="after")
     def initialize_llm_clients(self) -> "LLM":
         """初始化LLM实例，从配置加载参数并初始化Ollama客户端。"""
-        # 加载全局配置
-        config_data = self._load_global_config()
+        # 读取进程内共享的全局配置，不会重复解析配置文件
+        llm_config = get_settings().llm
 
         # 填充主LLM设置
-        llm_config = config_data.get("llm", {})
-        self.model = llm_config.get("model", self.model)
-        self.base_url = llm_config.get("base_url", self.base_url)
-        self.api_key = llm_config.get("api_key", self.api_key)
-        self.max_tokens = llm_config.get("max_tokens", self.max_tokens)
-        self.temperature = llm_config.get("temperature", self.temperature)
+        self.model = llm_config.model or self.model
+        self.base_url = llm_config.base_url or self.base_url
+        self.api_key = llm_config.api_key
+        self.max_tokens = llm_config.max_tokens
+        self.temperature = llm_config.temperature
+        self.concurrency = llm_config.concurrency
 
         # 填充嵌入LLM设置
-        embedding_config = llm_config.get("embedding", {})
-        self.embedding_model = embedding_config.get("model", self.embedding_model)
-        self.embedding_base_url = embedding_config.get("base_url", self.embedding_base_url)
-        self.embedding_api_key = embedding_config.get("api_key", self.embedding_api_key)
+        embedding_config = llm_config.embedding
+        self.embedding_model = embedding_config.model or self.embedding_model
+        self.embedding_base_url = embedding_config.base_url or self.embedding_base_url
+        self.embedding_api_key = embedding_config.api_key
+        self.embedding_batch_size = embedding_config.batch_size
+        self.embedding_backend = embedding_config.backend
+
+        # 本地 sentence-transformers 后端，嵌入模型名称改用本地模型（同时作为嵌入缓存的键）
+        if self.embedding_backend == "sentence_transformers":
+            local_config = embedding_config.local
+            if self.local_embedder is None:
+                self.local_embedder = LocalEmbedder(
+                    model_name=local_config.model,
+                    device=local_config.device,
+                    num_threads=local_config.num_threads,
+                    batch_size=local_config.batch_size,
+                    normalize=local_config.normalize,
+                    trust_remote_code=local_config.trust_remote_code
+                )
+            self.embedding_model = self.local_embedder.model_name
+        elif self.embedding_backend != "ollama":
+            raise ValueError(f"不支持的嵌入后端: {self.embedding_backend}")
+
+        # 初始化持久化嵌入缓存
+        cache_config = embedding_config.cache
+        if self.embedding_cache is None and cache_config.enabled:
+            self.embedding_cache = get_shared_cache(
+                path=cache_config.path,
+                max_entries=cache_config.max_entries
+            )
 
         logger.info(f"初始化LLM: 模型={self.model}, URL={self.base_url}")
-        logger.info(f"初始化嵌入LLM: 模型={self.embedding_model}, URL={self.embedding_base_url}")
+        logger.info(f"初始化嵌入LLM: 后端={self.embedding_backend}, 模型={self.embedding_model}, URL={self.embedding_base_url}")
 
         # 如果提供了 base_url，初始化 Ollama 生成客户端
         if self.base_url:
@@ -60,18 +125,6 @@ class LLM(BaseModel):
         
         return self
 
-    def _load_global_config(self) -> Dict[str, Any]:
-        """加载全局配置文件。"""
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.join(script_dir, "..") # 从 'utils' 目录向上到项目根目录
-        config_path = os.path.join(root_dir, "config", "config.toml")
-
-        if not os.path.exists(config_path):
-            raise FileNotFoundError(f"配置文件未找到: {config_path}。请确保它存在。")
-
-        with open(config_path, "rb") as f:
-            return tomli.load(f)
-
     def generate(self, prompt: str, **kwargs) -> str:
         """
         根据给定的提示生成响应。
@@ -85,31 +138,110 @@ class LLM(BaseModel):
             raise RuntimeError("Ollama 生成客户端未初始化。请检查 LLM 配置。")
         
         logger.debug(f"LLM生成请求: 模型={self.model}, 提示={prompt[:100]}...")
+        started = time.perf_counter()
         try:
             response = self.ollama_gen_client.generate(
                 model=self.model,
                 prompt=prompt,
-                options={
-                    "temperature": kwargs.get("temperature", self.temperature),
-                    "num_predict": kwargs.get("max_tokens", self.max_tokens)
-                }
+                options=self._generate_options(**kwargs)
             )
             generated_text = response.get("response", "")
-            logger.debug(f"LLM生成响应 (部分): {generated_text[:100]}...")
-            logger.info(f"LLM生成响应 (完整): {generated_text}")
+            logger.info(f"LLM生成完成: 模型={self.model}, 耗时={time.perf_counter() - started:.2f}s, 输出tokens={response.get('eval_count')}")
+            logger.debug(f"LLM生成响应 (完整): {generated_text}")
             return generated_text
         except Exception as e:
             logger.error(f"LLM生成失败: {e}")
             raise RuntimeError(f"LLM生成失败: {e}")
 
+    def _generate_options(self, **kwargs) -> Dict[str, Any]:
+        """构造生成请求的 options 参数。"""
+        return {
+            "temperature": kwargs.get("temperature", self.temperature),
+            "num_predict": kwargs.get("max_tokens", self.max_tokens)
+        }
+
+    def generate_stream(self, prompt: str, **kwargs) -> GenerationStream:
+        """
+        流式生成响应。请求在开始迭代时发出，迭代产出增量文本，
+        迭代结束后可从返回对象的 stats 读取首 token 耗时、生成速度和总耗时。
+        Args:
+            prompt: 输入提示。
+            **kwargs: 额外参数（例如：temperature, max_tokens）。
+        Returns:
+            GenerationStream: 增量文本的同步迭代器。
+        """
+        if not self.ollama_gen_client:
+            raise RuntimeError("Ollama 生成客户端未初始化。请检查 LLM 配置。")
+
+        logger.debug(f"LLM流式生成请求: 模型={self.model}, 提示={prompt[:100]}...")
+        return GenerationStream(self.model, lambda: self.ollama_gen_client.generate(
+            model=self.model,
+            prompt=prompt,
+            options=self._generate_options(**kwargs),
+            stream=True
+        ))
+
+    def agenerate_stream(self, prompt: str, **kwargs) -> AsyncGenerationStream:
+        """
+        generate_stream 的异步版本。建立连接并收到首个响应块的过程在自适应并发窗口内执行，
+        以首 token 耗时作为窗口调整依据，失败时按退避策略重试。
+        Args:
+            prompt: 输入提示。
+            **kwargs: 额外参数（例如：temperature, max_tokens）。
+        Returns:
+            AsyncGenerationStream: 增量文本的异步迭代器。
+        """
+        async def open_stream():
+            self._ensure_async_clients()
+            if not self.ollama_async_gen_client:
+                raise RuntimeError("Ollama 生成客户端未初始化。请检查 LLM 配置。")
+
+            async def first_chunk():
+                iterator = (await self.ollama_async_gen_client.generate(
+                    model=self.model,
+                    prompt=prompt,
+                    options=self._generate_options(**kwargs),
+                    stream=True
+                )).__aiter__()
+                try:
+                    return await iterator.__anext__(), iterator
+                except StopAsyncIteration:
+                    return None, iterator
+
+            return await self._acall(first_chunk)
+
+        logger.debug(f"LLM异步流式生成请求: 模型={self.model}, 提示={prompt[:100]}...")
+        return AsyncGenerationStream(self.model, open_stream)
+
     def embed(self, text: str) -> List[float]:
         """
-        生成文本的嵌入向量。
+        生成文本的嵌入向量，优先从嵌入缓存读取。
+        Args:
+            text: 输入文本。
+        Returns:
+            文本的嵌入向量。
+        """
+        if self.embedding_cache is not None:
+            cached = self.embedding_cache.get(self.embedding_model, text)
+            if cached is not None:
+                return cached
+
+        embedding = self._embed_uncached(text)
+        if self.embedding_cache is not None and len(embedding) > 0:
+            self.embedding_cache.put(self.embedding_model, text, embedding)
+        return embedding
+
+    def _embed_uncached(self, text: str) -> List[float]:
+        """
+        直接请求 Ollama 生成文本的嵌入向量（不经过缓存）。
         Args:
             text: 输入文本。
         Returns:
             文本的嵌入向量。
         """
+        if self.local_embedder is not None:
+            return self.local_embedder.encode([text])[0]
+
         if not self.ollama_embed_client:
             raise RuntimeError("Ollama 嵌入客户端未初始化。请检查嵌入配置。")
         
@@ -125,4 +257,297 @@ class LLM(BaseModel):
             return embedding
         except Exception as e:
             logger.error(f"LLM嵌入失败: {e}")
-            raise RuntimeError(f"LLM嵌入失败: {e}") 
\ No newline at end of file
+            raise RuntimeError(f"LLM嵌入失败: {e}")
+
+    def embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> EmbeddingBatch:
+        """
+        批量生成文本的嵌入向量，使用 Ollama 的多输入 embed 接口，每批只需一次 HTTP 往返。
+        已在嵌入缓存中的文本不会再次请求，批内重复的文本只请求一次。
+        Args:
+            texts: 输入文本列表。
+            batch_size: 每次请求包含的最大文本数，默认使用 [llm.embedding].batch_size。
+        Returns:
+            EmbeddingBatch: 与输入顺序一致的嵌入结果。暂时性错误（连接错误、超时、429/5xx）按抖动指数退避重试整批请求；
+            因输入问题整批失败时逐条请求以定位失败的条目；鉴权失败、模型不存在或重试用尽时整批失败。
+            失败的条目在 embeddings 中为 None，并在 errors 中记录原因。
+        """
+        result, missing = self._lookup_cached(texts)
+        if not missing:
+            return result
+        missing_texts = list(missing)
+        computed = self._embed_batch_uncached(missing_texts, batch_size)
+        return self._merge_computed(result, missing, computed)
+
+    def embed_array(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        批量生成嵌入向量并返回 float32 NumPy 矩阵，适合批量入库等不需要 Python 列表的场景。
+        Args:
+            texts: 输入文本列表。
+            batch_size: 每次请求包含的最大文本数。
+        Returns:
+            np.ndarray: 形状为 (len(texts), 向量维度) 的矩阵，行顺序与输入一致。
+        Raises:
+            RuntimeError: 任一文本嵌入失败时抛出。
+        """
+        batch = self.embed_batch(texts, batch_size)
+        if batch.errors:
+            raise RuntimeError(f"LLM批量嵌入失败: {len(batch.errors)} 个文本嵌入失败，例如: {next(iter(batch.errors.values()))}")
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray(batch.embeddings, dtype=np.float32)
+
+    def _lookup_cached(self, texts: List[str]) -> Tuple[EmbeddingBatch, Dict[str, List[int]]]:
+        """
+        从嵌入缓存中查找文本向量。
+        Args:
+            texts: 输入文本列表。
+        Returns:
+            (部分填充的结果, 未命中文本到其输入下标列表的映射)；未命中文本已按内容去重。
+        """
+        if self.embedding_cache is None:
+            embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        else:
+            embeddings = self.embedding_cache.get_many(self.embedding_model, texts)
+
+        missing: Dict[str, List[int]] = {}
+        for index, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(texts[index], []).append(index)
+        if self.embedding_cache is not None:
+            logger.debug(f"LLM批量嵌入缓存命中 {len(texts) - sum(len(v) for v in missing.values())}/{len(texts)}")
+        return EmbeddingBatch(embeddings=embeddings), missing
+
+    def _merge_computed(self, result: EmbeddingBatch, missing: Dict[str, List[int]],
+                        computed: EmbeddingBatch) -> EmbeddingBatch:
+        """
+        将未命中文本的嵌入结果合并回原结果，并写入嵌入缓存。
+        Args:
+            result: _lookup_cached 返回的部分结果。
+            missing: _lookup_cached 返回的未命中映射，computed 按其键顺序排列。
+            computed: 未命中文本的嵌入结果。
+        Returns:
+            EmbeddingBatch: 合并后的完整结果。
+        """
+        missing_texts = list(missing)
+        for text, embedding in zip(missing_texts, computed.embeddings):
+            for index in missing[text]:
+                result.embeddings[index] = embedding
+        for missing_index, error in computed.errors.items():
+            for index in missing[missing_texts[missing_index]]:
+                result.errors[index] = error
+
+        if self.embedding_cache is not None:
+            succeeded = [
+                (text, embedding) for text, embedding in zip(missing_texts, computed.embeddings)
+                if embedding is not None and len(embedding) > 0
+            ]
+            if succeeded:
+                self.embedding_cache.put_many(
+                    self.embedding_model,
+                    [text for text, _ in succeeded],
+                    [embedding for _, embedding in succeeded]
+                )
+        return result
+
+    def _embed_batch_uncached(self, texts: List[str], batch_size: Optional[int] = None) -> EmbeddingBatch:
+        """
+        直接请求嵌入后端批量生成嵌入向量（不经过缓存），参数与返回值同 embed_batch。
+        """
+        if self.local_embedder is not None:
+            result = EmbeddingBatch()
+            result.embeddings = list(self.local_embedder.encode(texts))
+            return result
+
+        if not self.ollama_embed_client:
+            raise RuntimeError("Ollama 嵌入客户端未初始化。请检查嵌入配置。")
+
+        batch_size = batch_size or self.embedding_batch_size
+        if batch_size <= 0:
+            raise ValueError(f"batch_size 必须为正整数: {batch_size}")
+
+        result = EmbeddingBatch(embeddings=[None] * len(texts))
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            logger.debug(f"LLM批量嵌入请求: 模型={self.embedding_model}, 范围=[{start}, {start + len(batch)})")
+            try:
+                response = retry_sync(
+                    lambda: self.ollama_embed_client.embed(model=self.embedding_model, input=batch),
+                    max_retries=self.concurrency.max_retries,
+                    base_delay=self.concurrency.retry_base_delay,
+                    max_delay=self.concurrency.retry_max_delay
+                )
+                vectors = response.get("embeddings", [])
+                if len(vectors) != len(batch):
+                    raise ValueError(f"返回向量数 {len(vectors)} 与输入数 {len(batch)} 不一致")
+                for offset, vector in enumerate(vectors):
+                    result.embeddings[start + offset] = vector
+            except Exception as e:
+                if not _retry_items(e):
+                    logger.error(f"LLM批量嵌入失败 (范围=[{start}, {start + len(batch)})): {e}")
+                    for offset in range(len(batch)):
+                        result.errors[start + offset] = str(e)
+                    continue
+                # 整批因输入问题失败时逐条请求，以便定位具体失败的条目
+                logger.warning(f"LLM批量嵌入失败 (范围=[{start}, {start + len(batch)})): {e}，改为逐条嵌入")
+                for offset, text in enumerate(batch):
+                    try:
+                        result.embeddings[start + offset] = self._embed_uncached(text)
+                    except Exception as item_error:
+                        result.errors[start + offset] = str(item_error)
+
+        if result.errors:
+            logger.error(f"LLM批量嵌入: {len(result.errors)}/{len(texts)} 个文本嵌入失败")
+        return result
+
+    def _ensure_async_clients(self) -> None:
+        """
+        为当前事件循环准备异步客户端和并发窗口。
+        异步客户端和 asyncio 同步原语都绑定在事件循环上，事件循环变化时重新创建，
+        并沿用上一次学习到的并发窗口大小。
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is loop:
+            return
+
+        if self.base_url:
+            self.ollama_async_gen_client = ollama.AsyncClient(host=self.base_url)
+        if self.embedding_base_url:
+            self.ollama_async_embed_client = ollama.AsyncClient(host=self.embedding_base_url)
+
+        previous_limit = self.async_limiter.limit if self.async_limiter else None
+        min_limit = self.concurrency.min_limit
+        max_limit = self.concurrency.max_limit
+        initial_limit = self.concurrency.initial_limit
+        if previous_limit is not None:
+            initial_limit = min(max_limit, max(min_limit, int(previous_limit)))
+        self.async_limiter = AdaptiveLimiter(
+            initial_limit=initial_limit,
+            min_limit=min_limit,
+            max_limit=max_limit,
+            target_latency=self.concurrency.target_latency,
+            decrease_factor=self.concurrency.decrease_factor
+        )
+        self._async_loop = loop
+
+    async def _acall(self, request):
+        """
+        在并发窗口内执行异步请求，暂时性错误（连接错误、超时、429/5xx）按抖动指数退避重试，其他错误直接抛出。
+        Args:
+            request: 无参协程工厂。
+        Returns:
+            请求结果。
+        """
+        async def limited():
+            async with self.async_limiter.slot():
+                return await request()
+
+        return await retry_async(
+            limited,
+            max_retries=self.concurrency.max_retries,
+            base_delay=self.concurrency.retry_base_delay,
+            max_delay=self.concurrency.retry_max_delay
+        )
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """
+        generate 的异步版本，不阻塞事件循环。
+        Args:
+            prompt: 输入提示。
+            **kwargs: 额外参数（例如：temperature, max_tokens）。
+        Returns:
+            生成的文本响应。
+        """
+        self._ensure_async_clients()
+        if not self.ollama_async_gen_client:
+            raise RuntimeError("Ollama 生成客户端未初始化。请检查 LLM 配置。")
+
+        logger.debug(f"LLM异步生成请求: 模型={self.model}, 提示={prompt[:100]}...")
+        try:
+            response = await self._acall(lambda: self.ollama_async_gen_client.generate(
+                model=self.model,
+                prompt=prompt,
+                options=self._generate_options(**kwargs)
+            ))
+            generated_text = response.get("response", "")
+            logger.debug(f"LLM异步生成响应 (部分): {generated_text[:100]}...")
+            return generated_text
+        except Exception as e:
+            logger.error(f"LLM异步生成失败: {e}")
+            raise RuntimeError(f"LLM生成失败: {e}")
+
+    async def aembed(self, text: str) -> List[float]:
+        """
+        embed 的异步版本，优先从嵌入缓存读取。
+        Args:
+            text: 输入文本。
+        Returns:
+            文本的嵌入向量。
+        """
+        batch = await self.aembed_batch([text])
+        if batch.errors:
+            raise RuntimeError(f"LLM嵌入失败: {batch.errors[0]}")
+        return batch.embeddings[0]
+
+    async def aembed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> EmbeddingBatch:
+        """
+        embed_batch 的异步版本。各批请求在自适应并发窗口内并发发出。
+        Args:
+            texts: 输入文本列表。
+            batch_size: 每次请求包含的最大文本数，默认使用 [llm.embedding].batch_size。
+        Returns:
+            EmbeddingBatch: 与输入顺序一致的嵌入结果。
+        """
+        if self.local_embedder is not None:
+            # 本地推理是 CPU 密集型操作，放到线程中执行以免阻塞事件循环
+            return await asyncio.to_thread(self.embed_batch, texts, batch_size)
+
+        self._ensure_async_clients()
+        if not self.ollama_async_embed_client:
+            raise RuntimeError("Ollama 嵌入客户端未初始化。请检查嵌入配置。")
+
+        batch_size = batch_size or self.embedding_batch_size
+        if batch_size <= 0:
+            raise ValueError(f"batch_size 必须为正整数: {batch_size}")
+
+        result, missing = self._lookup_cached(texts)
+        if not missing:
+            return result
+
+        missing_texts = list(missing)
+        computed = EmbeddingBatch(embeddings=[None] * len(missing_texts))
+
+        async def embed_one(index: int) -> None:
+            try:
+                response = await self._acall(lambda: self.ollama_async_embed_client.embed(
+                    model=self.embedding_model,
+                    input=missing_texts[index]
+                ))
+                computed.embeddings[index] = response.get("embeddings", [[]])[0]
+            except Exception as e:
+                computed.errors[index] = str(e)
+
+        async def embed_range(start: int) -> None:
+            batch = missing_texts[start:start + batch_size]
+            try:
+                response = await self._acall(lambda: self.ollama_async_embed_client.embed(
+                    model=self.embedding_model,
+                    input=batch
+                ))
+                vectors = response.get("embeddings", [])
+                if len(vectors) != len(batch):
+                    raise ValueError(f"返回向量数 {len(vectors)} 与输入数 {len(batch)} 不一致")
+                computed.embeddings[start:start + len(batch)] = vectors
+            except Exception as e:
+                if not _retry_items(e):
+                    # 暂时性错误已由 _acall 重试过 max_retries 次
+                    logger.error(f"LLM异步批量嵌入失败 (范围=[{start}, {start + len(batch)})): {e}")
+                    for offset in range(len(batch)):
+                        computed.errors[start + offset] = str(e)
+                    return
+                logger.warning(f"LLM异步批量嵌入失败 (范围=[{start}, {start + len(batch)})): {e}，改为逐条嵌入")
+                await asyncio.gather(*(embed_one(start + offset) for offset in range(len(batch))))
+
+        await asyncio.gather(*(embed_range(start) for start in range(0, len(missing_texts), batch_size)))
+        if computed.errors:
+            logger.error(f"LLM异步批量嵌入: {len(computed.errors)}/{len(missing_texts)} 个文本嵌入失败")
+        return self._merge_computed(result, missing, computed)
@@ -0,0 +1,104 @@
+import threading
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class LocalEmbedder:
+    """进程内 sentence-transformers 嵌入后端。
+
+    输入按长度排序后分桶，每个桶内文本长度相近，批量推理时的填充最少；
+    结果按原始顺序写回 float32 NumPy 矩阵，避免 HTTP 往返和 JSON 序列化。
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 device: str = "cpu",
+                 num_threads: int = 0,
+                 batch_size: int = 64,
+                 normalize: bool = False,
+                 trust_remote_code: bool = False):
+        """
+        初始化本地嵌入后端，模型在首次使用时加载
+
+        Args:
+            model_name: sentence-transformers 模型名称或本地路径
+            device: 推理设备，例如 "cpu"
+            num_threads: torch 线程数，0 表示使用 torch 默认值
+            batch_size: 每个长度桶的文本数
+            normalize: 是否对输出向量做 L2 归一化
+            trust_remote_code: 是否允许加载模型仓库中的自定义代码
+        """
+        if batch_size <= 0:
+            raise ValueError(f"batch_size 必须为正整数: {batch_size}")
+        self.model_name = model_name
+        self.device = device
+        self.num_threads = num_threads
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.trust_remote_code = trust_remote_code
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """延迟加载的 SentenceTransformer 模型"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    # torch 与 sentence-transformers 导入开销较大，只在选用本地后端时加载
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+
+                    if self.num_threads > 0:
+                        torch.set_num_threads(self.num_threads)
+                    logger.info(f"加载本地嵌入模型: {self.model_name} (设备={self.device}, 线程数={torch.get_num_threads()})")
+                    self._model = SentenceTransformer(
+                        self.model_name,
+                        device=self.device,
+                        trust_remote_code=self.trust_remote_code
+                    )
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        """嵌入向量维度"""
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        批量生成嵌入向量
+
+        Args:
+            texts: 输入文本列表
+            batch_size: 每个长度桶的文本数，默认使用初始化时的设置
+
+        Returns:
+            np.ndarray: 形状为 (len(texts), dimension) 的 float32 矩阵，行顺序与输入一致
+        """
+        batch_size = batch_size or self.batch_size
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+
+        model = self.model
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        output: Optional[np.ndarray] = None
+
+        import torch
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                bucket = order[start:start + batch_size]
+                vectors = model.encode(
+                    [texts[i] for i in bucket],
+                    batch_size=len(bucket),
+                    convert_to_numpy=True,
+                    normalize_embeddings=self.normalize,
+                    show_progress_bar=False
+                )
+                if output is None:
+                    output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                output[bucket] = vectors
+        logger.debug(f"本地嵌入完成: {len(texts)} 个文本, {(len(order) + batch_size - 1) // batch_size} 个长度桶")
+        return output
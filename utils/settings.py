@@ -0,0 +1,318 @@
+import os
+import threading
+import logging
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel, Field
+import tomli
+
+logger = logging.getLogger(__name__)
+
+# 默认配置文件：项目根目录下的 config/config.toml，可通过环境变量 RAG_APP_CONFIG 覆盖
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "config.toml")
+CONFIG_PATH_ENV = "RAG_APP_CONFIG"
+# 配置项环境变量覆盖前缀，层级之间用双下划线分隔，例如 RAG_APP__LLM__EMBEDDING__MODEL=bge-m3
+ENV_OVERRIDE_PREFIX = "RAG_APP__"
+
+
+class _Section(BaseModel):
+    """配置节基类，保留配置文件中未声明的键"""
+
+    class Config:
+        extra = "allow"
+
+
+class ConcurrencySettings(_Section):
+    """[llm.concurrency] 异步请求并发窗口与重试设置"""
+    initial_limit: int = Field(4, description="初始并发数")
+    min_limit: int = Field(1, description="最小并发数")
+    max_limit: int = Field(32, description="最大并发数")
+    target_latency: float = Field(5.0, description="目标延迟（秒），超过视为过载")
+    decrease_factor: float = Field(0.5, description="过载时窗口的收缩系数")
+    max_retries: int = Field(3, description="最大重试次数")
+    retry_base_delay: float = Field(0.5, description="退避基准时长（秒）")
+    retry_max_delay: float = Field(8.0, description="单次退避上限（秒）")
+
+
+class EmbeddingCacheSettings(_Section):
+    """[llm.embedding.cache] 持久化嵌入缓存设置"""
+    enabled: bool = Field(False, description="是否启用嵌入缓存")
+    path: str = Field("data/embedding_cache.sqlite", description="缓存数据库路径")
+    max_entries: int = Field(1_000_000, description="最大缓存条目数")
+
+
+class LocalEmbeddingSettings(_Section):
+    """[llm.embedding.local] 本地 sentence-transformers 后端设置"""
+    model: str = Field("sentence-transformers/all-MiniLM-L6-v2", description="模型名称或本地路径")
+    device: str = Field("cpu", description="推理设备")
+    num_threads: int = Field(0, description="torch 线程数，0 表示默认值")
+    batch_size: int = Field(64, description="每个长度桶的文本数")
+    normalize: bool = Field(False, description="是否对输出向量做 L2 归一化")
+    trust_remote_code: bool = Field(False, description="是否允许加载模型仓库中的自定义代码")
+
+
+class EmbeddingSettings(_Section):
+    """[llm.embedding] 嵌入模型设置"""
+    model: str = Field("", description="嵌入模型名称")
+    base_url: str = Field("", description="嵌入API基础URL")
+    api_key: str = Field("ollama", description="嵌入API Key")
+    batch_size: int = Field(32, description="单次批量嵌入请求包含的最大文本数")
+    backend: str = Field("ollama", description="嵌入后端: ollama 或 sentence_transformers")
+    cache: EmbeddingCacheSettings = Field(default_factory=EmbeddingCacheSettings)
+    local: LocalEmbeddingSettings = Field(default_factory=LocalEmbeddingSettings)
+
+
+class LLMSettings(_Section):
+    """[llm] 生成模型设置"""
+    api_type: str = Field("ollama", description="API 类型")
+    model: str = Field("", description="生成模型名称")
+    base_url: str = Field("", description="LLM API基础URL")
+    api_key: str = Field("ollama", description="LLM API Key")
+    max_tokens: int = Field(4096, description="最大生成tokens")
+    temperature: float = Field(0.0, description="生成温度")
+    concurrency: ConcurrencySettings = Field(default_factory=ConcurrencySettings)
+    embedding: EmbeddingSettings = Field(default_factory=EmbeddingSettings)
+
+
+class DocumentSettings(_Section):
+    """[rag.document] 文档处理设置"""
+    supported_formats: List[str] = Field(default_factory=lambda: ["pdf", "txt", "md", "docx"], description="支持的文档格式")
+    max_file_size: int = Field(104857600, description="最大文件大小（字节）")
+    document_directory: str = Field("data/documents", description="待处理文档目录")
+
+
+class SplitterSettings(_Section):
+    """[rag.splitter] 文本切分设置"""
+    max_chunk_size: int = Field(1000, description="文本块的最大字符数")
+    min_chunk_size: int = Field(200, description="文本块的最小字符数（打包模式下过短的块并入前一块）")
+    sentence_threshold: int = Field(500, description="段落超过该字符数时按句子切分")
+    packing: bool = Field(False, description="是否按 token 预算合并相邻的段落和句子")
+    max_tokens: int = Field(512, description="打包模式下每个文本块的 token 预算，应不超过嵌入模型的上下文长度")
+    overlap_tokens: int = Field(0, description="打包模式下相邻文本块重叠的 token 数")
+    tokenizer: str = Field("", description="计数用的 Hugging Face 分词器名称或路径；为空时 sentence_transformers 后端使用嵌入模型的分词器，其他后端使用近似计数")
+
+
+class IngestSettings(_Section):
+    """[rag.ingest] 目录入库设置"""
+    mode: str = Field("serial", description="入库模式: serial 或 pipelined")
+    incremental: bool = Field(True, description="是否根据入库清单跳过未变化的文件")
+    read_workers: int = Field(0, description="读取/切分进程数，0 表示使用 CPU 核数")
+    embed_workers: int = Field(4, description="并发向量化线程数")
+    write_batch_size: int = Field(256, description="每次写入向量数据库的文档数")
+    queue_size: int = Field(16, description="阶段间队列的最大长度")
+    max_inflight_bytes: int = Field(256 * 1024 * 1024, description="流水线中在途文本的最大字节数")
+
+
+class VectorStoreSettings(_Section):
+    """[rag.vector_store] 向量数据库写入设置"""
+    write_buffer_size: int = Field(1000, description="写缓冲区的文档数上限，达到后自动写出")
+    flush_interval: float = Field(2.0, description="缓冲文档的最长等待时间（秒），0 表示只按数量写出")
+    max_batch_size: int = Field(0, description="单次写入的最大文档数，0 表示使用后端允许的上限")
+    shards: int = Field(1, description="每个集合的分片数，大于 1 时写入按文档ID路由、查询并行发往所有分片")
+
+
+class FaissSettings(_Section):
+    """[rag.faiss] FAISS 后端索引设置（vector_store_type = "faiss" 时生效）"""
+    index_type: str = Field("hnsw", description="索引类型: flat、hnsw 或 ivf")
+    metric: str = Field("l2", description="距离度量: l2、ip 或 cosine")
+    hnsw_m: int = Field(32, description="HNSW 每个节点的邻居数")
+    ef_construction: int = Field(200, description="HNSW 建索引时的候选列表长度")
+    ef_search: int = Field(64, description="HNSW 查询时的候选列表长度，越大召回越高、越慢")
+    nlist: int = Field(1024, description="IVF 聚类中心数")
+    nprobe: int = Field(16, description="IVF 查询时访问的聚类数，越大召回越高、越慢")
+    compact_ratio: float = Field(0.2, description="已删除向量超过该比例时重建索引")
+    save_interval: int = Field(10000, description="新增多少向量后保存一次索引文件")
+
+
+class NumpySettings(_Section):
+    """[rag.numpy] 内存映射精确检索后端设置（vector_store_type = "numpy" 时生效）"""
+    dtype: str = Field("float16", description="向量矩阵的存储类型: float32、float16 或 int8")
+    metric: str = Field("l2", description="距离度量: l2、ip 或 cosine")
+    rescore: bool = Field(True, description="另存 float32 原始向量并对候选重新打分")
+    rescore_factor: int = Field(4, description="重新打分的候选数为结果数的倍数")
+    compact_ratio: float = Field(0.2, description="已删除的空槽位超过该比例时压缩矩阵")
+
+
+class SearchSettings(_Section):
+    """[rag.search] 检索设置"""
+    mode: str = Field("hybrid", description="默认检索模式: dense、lexical 或 hybrid")
+    lexical_index: bool = Field(True, description="入库时维护 BM25 词法索引（lexical、hybrid 模式需要）")
+    rrf_k: int = Field(60, description="倒数排名融合的平滑常数")
+    candidates: int = Field(50, description="hybrid 模式每一路的候选数")
+    bm25_k1: float = Field(1.2, description="BM25 词频饱和参数")
+    bm25_b: float = Field(0.75, description="BM25 文档长度归一化参数")
+
+
+class QueryCacheSettings(_Section):
+    """[rag.query_cache] 查询结果缓存设置"""
+    enabled: bool = Field(True, description="是否缓存检索结果")
+    max_entries: int = Field(1024, description="最大缓存条目数，超过后按 LRU 淘汰")
+    ttl: float = Field(300.0, description="条目有效时间（秒），0 表示不过期")
+
+
+class QuerySettings(_Section):
+    """[rag.query] 问答设置（main.py、QueryEngine）"""
+    n_results: int = Field(5, description="检索的文本块数")
+    mode: str = Field("", description="检索模式，为空时使用 [rag.search].mode")
+    max_context_tokens: int = Field(3000, description="拼入提示词的上下文 token 预算")
+    prompt_file: str = Field("prompts/rag_answer.txt", description="提示词模板文件，包含 {context} 和 {question}")
+
+
+class RAGSettings(_Section):
+    """[rag] 检索增强设置"""
+    vector_store_type: str = Field("chroma", description="向量数据库类型: chroma、faiss 或 numpy")
+    collection_name: str = Field("documents", description="集合名称")
+    persist_directory: str = Field("data/vector_store", description="向量数据库持久化目录")
+    use_local_splitter: bool = Field(True, description="是否使用本地文本切分")
+    document: DocumentSettings = Field(default_factory=DocumentSettings)
+    splitter: SplitterSettings = Field(default_factory=SplitterSettings)
+    ingest: IngestSettings = Field(default_factory=IngestSettings)
+    vector_store: VectorStoreSettings = Field(default_factory=VectorStoreSettings)
+    faiss: FaissSettings = Field(default_factory=FaissSettings)
+    numpy: NumpySettings = Field(default_factory=NumpySettings)
+    search: SearchSettings = Field(default_factory=SearchSettings)
+    query_cache: QueryCacheSettings = Field(default_factory=QueryCacheSettings)
+    query: QuerySettings = Field(default_factory=QuerySettings)
+
+
+class ReaderSettings(_Section):
+    """[reader] 文件读取器设置"""
+    supported_types: Dict[str, str] = Field(default_factory=dict, description="文件类型到读取器类名的映射")
+    default_encoding: str = Field("utf-8", description="默认编码")
+    recursive: bool = Field(True, description="是否递归读取子目录")
+    skip_hidden: bool = Field(True, description="是否跳过隐藏文件")
+    block_size: int = Field(1024 * 1024, description="流式读取时每块的字符数")
+
+
+class AgentsSettings(_Section):
+    """[agents] 代理设置"""
+    supported_agents: Dict[str, Dict[str, str]] = Field(default_factory=dict, description="代理类型到模块和类名的映射")
+
+
+class ServerSettings(_Section):
+    """[server] HTTP 问答服务设置（server.py）"""
+    host: str = Field("127.0.0.1", description="监听地址")
+    port: int = Field(8000, description="监听端口")
+    max_concurrency: int = Field(64, description="同时处理的检索/问答请求数")
+    max_pending: int = Field(256, description="排队等待的请求数上限，超出时返回 503")
+    request_timeout: float = Field(60.0, description="单个请求的超时时间（秒），超时返回 504")
+    batch_max_size: int = Field(32, description="合并为一批的最大并发请求数")
+    batch_max_wait_ms: float = Field(5.0, description="第一个请求等待合并的最长时间（毫秒）")
+    max_body_bytes: int = Field(1024 * 1024, description="请求体的最大字节数")
+
+
+class Settings(_Section):
+    """全局配置，对应 config.toml 的完整内容"""
+    llm: LLMSettings = Field(default_factory=LLMSettings)
+    rag: RAGSettings = Field(default_factory=RAGSettings)
+    reader: ReaderSettings = Field(default_factory=ReaderSettings)
+    agents: AgentsSettings = Field(default_factory=AgentsSettings)
+    server: ServerSettings = Field(default_factory=ServerSettings)
+    config_path: Optional[str] = Field(None, description="配置文件的绝对路径", exclude=True)
+
+
+_settings_cache: Dict[str, Settings] = {}
+_settings_lock = threading.Lock()
+
+
+def _resolve_config_path(config_path: Optional[str]) -> str:
+    """确定配置文件的绝对路径：显式参数 > 环境变量 RAG_APP_CONFIG > 默认路径"""
+    path = config_path or os.environ.get(CONFIG_PATH_ENV) or DEFAULT_CONFIG_PATH
+    return os.path.abspath(path)
+
+
+def _parse_env_value(raw: str) -> Any:
+    """按 TOML 字面量解析环境变量值（数字、布尔、数组等），解析失败时按字符串处理"""
+    try:
+        return tomli.loads(f"value = {raw}")["value"]
+    except tomli.TOMLDecodeError:
+        return raw
+
+
+def _apply_env_overrides(data: Dict[str, Any], environ: Dict[str, str]) -> Dict[str, Any]:
+    """
+    将 RAG_APP__SECTION__KEY 形式的环境变量覆盖到配置字典上
+
+    Args:
+        data: 从配置文件解析出的字典（会被原地修改）
+        environ: 环境变量
+
+    Returns:
+        Dict[str, Any]: 覆盖后的配置字典
+    """
+    for name, raw in environ.items():
+        if not name.startswith(ENV_OVERRIDE_PREFIX):
+            continue
+        keys = [key.lower() for key in name[len(ENV_OVERRIDE_PREFIX):].split("__") if key]
+        if not keys:
+            continue
+        section = data
+        for key in keys[:-1]:
+            section = section.setdefault(key, {})
+            if not isinstance(section, dict):
+                raise ValueError(f"环境变量 {name} 无法覆盖非表类型的配置项: {key}")
+        section[keys[-1]] = _parse_env_value(raw)
+        logger.info(f"配置项 {'.'.join(keys)} 已被环境变量 {name} 覆盖")
+    return data
+
+
+def load_settings(config_path: Optional[str] = None) -> Settings:
+    """
+    读取并解析配置文件（不使用缓存）
+
+    Args:
+        config_path: 配置文件路径，默认依次使用环境变量 RAG_APP_CONFIG 和 config/config.toml
+
+    Returns:
+        Settings: 应用了环境变量覆盖的配置对象
+
+    Raises:
+        FileNotFoundError: 配置文件不存在
+    """
+    path = _resolve_config_path(config_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"配置文件未找到: {path}。请确保它存在。")
+
+    with open(path, "rb") as f:
+        data = tomli.load(f)
+    settings = Settings(**_apply_env_overrides(data, dict(os.environ)))
+    settings.config_path = path
+    logger.debug(f"配置文件已加载: {path}")
+    return settings
+
+
+def get_settings(config_path: Optional[str] = None) -> Settings:
+    """
+    获取进程内共享的配置对象，每个配置文件只解析一次
+
+    Args:
+        config_path: 配置文件路径，默认依次使用环境变量 RAG_APP_CONFIG 和 config/config.toml
+
+    Returns:
+        Settings: 缓存的配置对象，调用方不应修改
+    """
+    path = _resolve_config_path(config_path)
+    settings = _settings_cache.get(path)
+    if settings is None:
+        with _settings_lock:
+            settings = _settings_cache.get(path)
+            if settings is None:
+                settings = load_settings(path)
+                _settings_cache[path] = settings
+    return settings
+
+
+def reload_settings(config_path: Optional[str] = None) -> Settings:
+    """
+    重新读取配置文件并替换缓存。已创建的对象仍持有旧配置，需要重新创建才能生效。
+
+    Args:
+        config_path: 配置文件路径
+
+    Returns:
+        Settings: 新的配置对象
+    """
+    path = _resolve_config_path(config_path)
+    with _settings_lock:
+        settings = load_settings(path)
+        _settings_cache[path] = settings
+    return settings